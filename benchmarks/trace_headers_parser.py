@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# Timing and equivalence check of the ffmpeg trace_headers log parsing of tcval.py.
+#
+# Runs check_stream of the current tcval.py (TraceHeadersParser) and of a baseline revision (by default the one before
+# the per-codec field tables, which matched each log line against every field name) on generated AVC and HEVC
+# trace_headers logs. ffmpeg is replaced by a process reading the generated log, and check_stream is stopped when it
+# starts reading the MPD, once all the header checks but those of the SEI messages are done. These are checked
+# afterwards for the current tcval.py, as check_stream does after the fragments. The test results of every TestContent
+# field, the number of SPS and PPS and the slice types must be the same for both, the time taken by each is printed.
+#
+# Usage: python benchmarks/trace_headers_parser.py [--frames N] [--repeat N] [--baseline <git revision>]
+# The baseline is read with git show, so the script runs from a clone of the repository. lxml, isodate and psutil are
+# not used by the code paths checked, they are replaced by empty modules when they are not installed.
+
+import argparse
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import time
+import types
+
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_REVISION = '9805893'  # Last revision with the line by line trace_headers matching in check_stream
+FRAME_RATE_FAMILY = '25'  # TS_LOCATION_FRAME_RATES_50
+TRACE_PREFIX = '[trace_headers @ 0x55d0c0a0b0c0] '
+
+
+class MpdReached(Exception):
+	# Raised when check_stream starts reading the MPD, the trace_headers log was read completely by then
+	pass
+
+
+class StopAtMpd:
+	# Stands in for lxml.etree in the loaded tcval modules
+	def parse(self, *args, **kwargs):
+		raise MpdReached()
+
+
+class GeneratedTraceProcess:
+	# Stands in for the ffmpeg Popen, its stderr is the generated trace_headers log
+	def __init__(self, log):
+		self.stderr = io.BytesIO(log)
+		self.returncode = 0
+
+	def wait(self):
+		return 0
+
+	def poll(self):
+		return 0
+
+	def kill(self):
+		pass
+
+
+def stub_missing_modules():
+	for module_name in ['isodate', 'psutil', 'lxml']:
+		try:
+			__import__(module_name)
+		except ImportError:
+			sys.modules[module_name] = types.ModuleType(module_name)
+	if not hasattr(sys.modules['lxml'], 'etree'):
+		etree = types.ModuleType('lxml.etree')
+		etree.XPath = lambda *args, **kwargs: None
+		sys.modules['lxml'].etree = etree
+		sys.modules['lxml.etree'] = etree
+
+
+def load_tcval(source, module_name):
+	module = types.ModuleType(module_name)
+	module.__file__ = module_name + '.py'
+	exec(compile(source, module.__file__, 'exec'), module.__dict__)
+	module.etree = StopAtMpd()
+	module.tc_matrix = Path('benchmark')
+	module.time_of_analysis = '0'
+	module.HEADER_PARSER = 'ffmpeg'
+	if hasattr(module, 'TIMING_PARSER'):
+		module.TIMING_PARSER = 'ffmpeg'
+	return module
+
+
+def field_line(name, value, bit_position=0):
+	return TRACE_PREFIX + str(bit_position).ljust(12) + name.ljust(50) + format(value, 'b') + ' = ' + str(value) + '\n'
+
+
+def header_line(name):
+	return TRACE_PREFIX + name + '\n'
+
+
+def avc_trace_log(frames, gop_size):
+	lines = ["Input #0, dash, from 'stream.mpd':\n",
+			 '  Stream #0:0: Video: h264 (High) (avc1 / 0x31637661), yuv420p(tv, bt709, progressive), 1920x1080 '
+			 '[SAR 1:1 DAR 16:9], 4000 kb/s, 25 fps, 25 tbr, 90k tbn (default)\n']
+	for frame in range(frames):
+		if frame % gop_size == 0:
+			lines += [header_line('Access Unit Delimiter'), field_line('primary_pic_type', 0)]
+			lines += [header_line('Sequence Parameter Set'), field_line('forbidden_zero_bit', 0), field_line('nal_ref_idc', 3),
+					  field_line('nal_unit_type', 7), field_line('profile_idc', 100), field_line('constraint_set0_flag', 0),
+					  field_line('level_idc', 40), field_line('seq_parameter_set_id', 0),
+					  field_line('chroma_format_idc', 1), field_line('log2_max_frame_num_minus4', 0),
+					  field_line('pic_order_cnt_type', 0), field_line('max_num_ref_frames', 4),
+					  field_line('pic_width_in_mbs_minus1', 119), field_line('pic_height_in_map_units_minus1', 67),
+					  field_line('frame_mbs_only_flag', 1), field_line('frame_cropping_flag', 1),
+					  field_line('vui_parameters_present_flag', 1), field_line('aspect_ratio_info_present_flag', 1),
+					  field_line('aspect_ratio_idc', 1), field_line('overscan_info_present_flag', 0),
+					  field_line('video_signal_type_present_flag', 1), field_line('video_format', 5),
+					  field_line('video_full_range_flag', 0), field_line('colour_description_present_flag', 1),
+					  field_line('colour_primaries', 1), field_line('transfer_characteristics', 1),
+					  field_line('matrix_coefficients', 1), field_line('chroma_loc_info_present_flag', 0),
+					  field_line('timing_info_present_flag', 1), field_line('num_units_in_tick', 1),
+					  field_line('time_scale', 50), field_line('fixed_frame_rate_flag', 1),
+					  field_line('nal_hrd_parameters_present_flag', 0), field_line('vcl_hrd_parameters_present_flag', 0),
+					  field_line('pic_struct_present_flag', 1), field_line('bitstream_restriction_flag', 1)]
+			lines += [header_line('Picture Parameter Set'), field_line('forbidden_zero_bit', 0), field_line('nal_ref_idc', 3),
+					  field_line('nal_unit_type', 8), field_line('pic_parameter_set_id', 0),
+					  field_line('entropy_coding_mode_flag', 1), field_line('num_ref_idx_l0_default_active_minus1', 0)]
+		lines += [header_line('Supplemental Enhancement Information'), field_line('forbidden_zero_bit', 0),
+				  field_line('nal_ref_idc', 0), field_line('nal_unit_type', 6), field_line('last_payload_type_byte', 1),
+				  field_line('last_payload_size_byte', 1), header_line('Picture Timing'), field_line('pic_struct', 0)]
+		idr = frame % gop_size == 0
+		lines += [header_line('Slice Header'), field_line('forbidden_zero_bit', 0), field_line('nal_ref_idc', 3 if idr else 2),
+				  field_line('nal_unit_type', 5 if idr else 1), field_line('first_mb_in_slice', 0),
+				  field_line('slice_type', 7 if idr else (5 if frame % 3 == 0 else 6)), field_line('pic_parameter_set_id', 0),
+				  field_line('frame_num', frame % 16), field_line('pic_order_cnt_lsb', (2 * frame) % 256),
+				  field_line('slice_qp_delta', 2)]
+	lines += ['frame= ' + str(frames) + ' fps=0.0 q=-1.0 Lsize=N/A time=00:00:' + str(frames // 25).zfill(2)
+			  + '.00 bitrate=N/A speed= 250x\n', 'video:1kB audio:0kB subtitle:0kB other streams:0kB\n']
+	return ''.join(lines).encode('utf-8')
+
+
+def hevc_trace_log(frames, gop_size):
+	lines = ["Input #0, dash, from 'stream.mpd':\n",
+			 '  Stream #0:0: Video: hevc (Main 10) (hvc1 / 0x31637668), yuv420p10le(tv, bt2020nc/bt2020/smpte2084), '
+			 '3840x2160 [SAR 1:1 DAR 16:9], 15000 kb/s, 25 fps, 25 tbr, 90k tbn (default)\n']
+	for frame in range(frames):
+		if frame % gop_size == 0:
+			lines += [header_line('Access Unit Delimiter'), field_line('pic_type', 0)]
+			lines += [header_line('Video Parameter Set'), field_line('forbidden_zero_bit', 0), field_line('nal_unit_type', 32),
+					  field_line('vps_video_parameter_set_id', 0), field_line('general_profile_idc', 2),
+					  field_line('general_level_idc', 120)]
+			lines += [header_line('Sequence Parameter Set'), field_line('forbidden_zero_bit', 0), field_line('nal_unit_type', 33),
+					  field_line('nuh_layer_id', 0), field_line('nuh_temporal_id_plus1', 1),
+					  field_line('sps_video_parameter_set_id', 0), field_line('general_profile_space', 0),
+					  field_line('general_tier_flag', 0), field_line('general_profile_idc', 2),
+					  field_line('general_progressive_source_flag', 1), field_line('general_level_idc', 120),
+					  field_line('sps_seq_parameter_set_id', 0), field_line('chroma_format_idc', 1),
+					  field_line('pic_width_in_luma_samples', 3840), field_line('pic_height_in_luma_samples', 2160),
+					  field_line('bit_depth_luma_minus8', 2), field_line('vui_parameters_present_flag', 1),
+					  field_line('aspect_ratio_info_present_flag', 1), field_line('aspect_ratio_idc', 1),
+					  field_line('overscan_info_present_flag', 0), field_line('video_signal_type_present_flag', 1),
+					  field_line('video_format', 5), field_line('video_full_range_flag', 0),
+					  field_line('colour_description_present_flag', 1), field_line('colour_primaries', 9),
+					  field_line('transfer_characteristics', 16), field_line('matrix_coefficients', 9),
+					  field_line('chroma_loc_info_present_flag', 0), field_line('frame_field_info_present_flag', 0),
+					  field_line('vui_timing_info_present_flag', 1), field_line('vui_num_units_in_tick', 1),
+					  field_line('vui_time_scale', 25), field_line('vui_poc_proportional_to_timing_flag', 0),
+					  field_line('vui_hrd_parameters_present_flag', 0), field_line('bitstream_restriction_flag', 0)]
+			lines += [header_line('Picture Parameter Set'), field_line('forbidden_zero_bit', 0), field_line('nal_unit_type', 34),
+					  field_line('pps_pic_parameter_set_id', 0), field_line('init_qp_minus26', 0)]
+			lines += [header_line('Prefix Supplemental Enhancement Information'), field_line('forbidden_zero_bit', 0),
+					  field_line('nal_unit_type', 39), field_line('last_payload_type_byte', 137),
+					  header_line('Mastering Display Colour Volume'),
+					  field_line('display_primaries_x[0]', 13250), field_line('display_primaries_y[0]', 34500),
+					  field_line('display_primaries_x[1]', 7500), field_line('display_primaries_y[1]', 3000),
+					  field_line('display_primaries_x[2]', 34000), field_line('display_primaries_y[2]', 16000),
+					  field_line('white_point_x', 15635), field_line('white_point_y', 16450),
+					  field_line('max_display_mastering_luminance', 10000000), field_line('min_display_mastering_luminance', 50),
+					  field_line('last_payload_type_byte', 144), header_line('Content Light Level Information'),
+					  field_line('max_content_light_level', 1000), field_line('max_pic_average_light_level', 400)]
+		irap = frame % gop_size == 0
+		lines += [header_line('Slice Segment Header'), field_line('forbidden_zero_bit', 0),
+				  field_line('nal_unit_type', 19 if irap else 1), field_line('nuh_layer_id', 0),
+				  field_line('nuh_temporal_id_plus1', 1), field_line('first_slice_segment_in_pic_flag', 1),
+				  field_line('slice_pic_parameter_set_id', 0),
+				  field_line('slice_type', 2 if irap else (1 if frame % 3 == 0 else 0)),
+				  field_line('slice_pic_order_cnt_lsb', frame % 256), field_line('slice_qp_delta', 1)]
+	lines += ['frame= ' + str(frames) + ' fps=0.0 q=-1.0 Lsize=N/A time=00:00:' + str(frames // 25).zfill(2)
+			  + '.00 bitrate=N/A speed= 180x\n', 'video:1kB audio:0kB subtitle:0kB other streams:0kB\n']
+	return ''.join(lines).encode('utf-8')
+
+
+def expected_test_content(tcval, codec_name):
+	# Expected values as in a test content matrix, some of them chosen to fail so that both outcomes are compared
+	if codec_name == 'h264':
+		return tcval.TestContent(test_stream_id='t1', test_file_path='benchmark', codec_name='avc', codec_profile='High',
+								 codec_level='4.0', codec_tier='', file_brand='cfhd', sample_entry_type='avc1',
+								 picture_timing_sei_present=True, vui_timing_present=True, vui_primaries_mcoeffs=1,
+								 vui_transfer_characteristics=1, resolution=tcval.VideoResolution(1920, 1080),
+								 pixel_aspect_ratio='1:1', frame_rate=0.5, bitrate=4000, duration=60)
+	return tcval.TestContent(test_stream_id='t1', test_file_path='benchmark', codec_name='hevc', codec_profile='Main10',
+							 codec_level='4.0', codec_tier='Main', file_brand='chd1', sample_entry_type='hvc1',
+							 picture_timing_sei_present=False, vui_timing_present=True, vui_primaries_mcoeffs=9,
+							 vui_transfer_characteristics=16, sei_pref_transfer_characteristics=18,
+							 resolution=tcval.VideoResolution(3840, 2160), pixel_aspect_ratio='1:1', frame_rate=0.5,
+							 bitrate=16000, duration=60)
+
+
+def run_check_stream(tcval, codec_name, sample_entry_type, trace_log):
+	# Returns the TestContent, the SPS and PPS counts and slice types, and the time taken up to the MPD checks
+	test_content = expected_test_content(tcval, codec_name)
+	init_segment_info = tcval.InitSegmentInfo()
+	init_segment_info.codec_name = codec_name
+	init_segment_info.sample_entry_type = sample_entry_type
+	init_segment_info.width = test_content.resolution[0].horizontal
+	init_segment_info.height = test_content.resolution[0].vertical
+	tcval.start_stream_trace = lambda *args, **kwargs: GeneratedTraceProcess(trace_log)
+
+	start_time = time.perf_counter()
+	with contextlib.redirect_stdout(io.StringIO()):
+		try:
+			tcval.check_stream(test_content, FRAME_RATE_FAMILY, [], init_segment_info)
+			sys.exit("check_stream of " + tcval.__name__ + " completed without reading the MPD.")
+		except MpdReached as e:
+			traceback = e.__traceback__
+			while traceback.tb_frame.f_code.co_name != 'check_stream':
+				traceback = traceback.tb_next
+			check_stream_locals = traceback.tb_frame.f_locals
+		# The SEI messages read by TraceHeadersParser are checked after the fragments, as those read natively
+		if check_stream_locals.get('trace_headers_parser') is not None:
+			tcval.check_sei_messages(test_content, check_stream_locals['sei_info'], codec_name)
+	elapsed_time = time.perf_counter() - start_time
+	return (test_content, (check_stream_locals['file_sps_count'], check_stream_locals['file_pps_count'],
+						   check_stream_locals['nal_slice_types']), elapsed_time)
+
+
+def compare(codec_name, sample_entry_type, trace_log, baseline, current, repeat):
+	print("## " + codec_name + ": " + str(len(trace_log.splitlines())) + " log lines, " + str(len(trace_log)) + " bytes")
+	results = {}
+	for tcval in [baseline, current]:
+		elapsed_times = []
+		for i in range(repeat):
+			test_content, parameter_sets, elapsed_time = run_check_stream(tcval, codec_name, sample_entry_type, trace_log)
+			elapsed_times.append(elapsed_time)
+		results[tcval.__name__] = (json.loads(json.dumps(test_content, cls=tcval.TestContentFullEncoder)), parameter_sets)
+		print("#  " + tcval.__name__ + ": best " + str(round(min(elapsed_times), 3)) + "s of " + str(repeat) + " runs")
+
+	(baseline_json, baseline_counts), (current_json, current_counts) = results[baseline.__name__], results[current.__name__]
+	mismatches = []
+	for field_name, baseline_field in baseline_json.items():
+		if isinstance(baseline_field, dict) and 'test_result' in baseline_field:
+			current_field = current_json[field_name]
+			if baseline_field['test_result'] != current_field['test_result']:
+				mismatches.append(field_name + ": " + baseline_field['test_result'] + " (" + str(baseline_field['detected'])
+								  + ") != " + current_field['test_result'] + " (" + str(current_field['detected']) + ")")
+			else:
+				print("#  " + field_name + " = " + current_field['test_result'])
+	for name, baseline_value, current_value in zip(['SPS count', 'PPS count', 'slice types'], baseline_counts, current_counts):
+		if baseline_value != current_value:
+			mismatches.append(name + " differ")
+		else:
+			print("#  " + name + " = " + (str(current_value) if name != 'slice types' else str(len(current_value)) + " slices"))
+	print()
+	return mismatches
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Compare the trace_headers parsing of tcval.py with a baseline revision.")
+	parser.add_argument('--frames', type=int, default=15000, help="Frames of each generated log (default 15000).")
+	parser.add_argument('--gop', type=int, default=50, help="Frames between parameter sets (default 50).")
+	parser.add_argument('--repeat', type=int, default=3, help="Runs of each parser, the best time is kept (default 3).")
+	parser.add_argument('--baseline', default=BASELINE_REVISION, help="git revision of the baseline tcval.py.")
+	args = parser.parse_args()
+
+	stub_missing_modules()
+	baseline_source = subprocess.run(['git', 'show', args.baseline + ':tcval.py'], cwd=str(REPO_ROOT),
+									 capture_output=True, text=True, check=True).stdout
+	baseline = load_tcval(baseline_source, 'tcval_' + args.baseline)
+	current = load_tcval((REPO_ROOT / 'tcval.py').read_text(encoding='utf-8'), 'tcval')
+
+	mismatches = []
+	for codec_name, sample_entry_type, trace_log in [('h264', 'avc1', avc_trace_log(args.frames, args.gop)),
+													 ('hevc', 'hvc1', hevc_trace_log(args.frames, args.gop))]:
+		mismatches += [codec_name + " " + mismatch
+					   for mismatch in compare(codec_name, sample_entry_type, trace_log, baseline, current, args.repeat)]
+	if mismatches:
+		sys.exit("Test results differ:\n" + '\n'.join(mismatches))
+	print("Same test results for the baseline and current trace_headers parsing.")
+
+
+if __name__ == "__main__":
+	main()
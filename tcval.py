@@ -1,28 +1,42 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
 import collections
+import concurrent.futures
+import contextlib
 import copy
 import csv
 import errno
+import io
+import itertools
 import isodate
 import json
+import mmap
+import multiprocessing
 import os
 import psutil
+import queue
 import shutil
 import socket
+import sqlite3
 import string
+import struct
 import subprocess
 import sys
+import threading
 import time
+import traceback
 import urllib.request
 import zipfile
 
+from abc import ABC, abstractmethod
 from collections import Counter
 from collections import OrderedDict
 from datetime import datetime
 from decimal import *
 from enum import Enum
+from fractions import Fraction
 from json import JSONEncoder
 from lxml import etree
 from pathlib import Path
@@ -483,6 +497,110 @@ class TestContentFullEncoder(JSONEncoder):
 		return JSONEncoder.default(self, o)
 
 
+test_content_enum_fields = {'cmaf_initialisation_constraints': CmafInitConstraints,
+							'chunks_per_fragment': CmafChunksPerFragment}
+
+
+def test_content_from_json(tc_json):
+	# Test stream read back from its TestContentFullEncoder JSON, e.g. when handed over through the work queue
+	tc = TestContent(test_stream_id=tc_json['test_stream_id'], test_file_path=tc_json['test_file_path'])
+	tc.conformance_test_result = tc_json['conformance_test_result']
+	for a, v in tc_json.items():
+		if a != 'conformance_test_result' and isinstance(v, dict) and 'test_result' in v:
+			if a == 'resolution':
+				setattr(tc, a, [VideoResolution(**v['expected']), VideoResolution(**v['detected']), TestResult(v['test_result'])])
+			elif a in test_content_enum_fields:
+				# The checks compare these with the enum members, which are written as their str value
+				setattr(tc, a, [test_content_enum_fields[a](v[k]) if v[k] != '' else '' for k in ['expected', 'detected']]
+						+ [TestResult(v['test_result'])])
+			else:
+				setattr(tc, a, [v['expected'], v['detected'], TestResult(v['test_result'])])
+	return tc
+
+
+class TestResultTally:
+	# Number of test results of each kind and of DASH conformance verdicts.
+	# Tallies filled separately, e.g. by parallel workers, add up in any order with merge() or +.
+	def __init__(self):
+		self.test_results = Counter()
+		self.conformance_verdicts = Counter()
+	
+	def add_test_result(self, test_result):
+		if test_result in TS_RESULTS_COUNTED:
+			self.test_results[TestResult(test_result)] += 1
+	
+	def add_conformance_test_result(self, conformance_test_result):
+		if conformance_test_result != '' and conformance_test_result['verdict'] in ['PASS', 'FAIL']:
+			self.conformance_verdicts[conformance_test_result['verdict']] += 1
+		else:
+			self.conformance_verdicts['UNKNOWN'] += 1
+	
+	def add_test_content(self, tc):
+		self.add_conformance_test_result(tc.conformance_test_result)
+		for a, v in tc.__dict__.items():
+			if len(v) == 3:
+				self.add_test_result(v[2])
+	
+	def add_test_content_json(self, tc_json):
+		# Test stream read back from a results file
+		self.add_conformance_test_result(tc_json['conformance_test_result'])
+		for a, v in tc_json.items():
+			if isinstance(v, dict) and 'test_result' in v:
+				self.add_test_result(v['test_result'])
+	
+	def add_switching_set(self, ss):
+		self.add_conformance_test_result(ss.conformance_test_result)
+		for a, v in ss.__dict__.items():
+			if len(v) == 3:
+				if isinstance(v[0], list):
+					for i in range(0, len(v[0])):
+						self.add_test_result(v[2][i])
+				else:
+					self.add_test_result(v[2])
+	
+	def merge(self, other):
+		self.test_results.update(other.test_results)
+		self.conformance_verdicts.update(other.conformance_verdicts)
+		return self
+	
+	def __add__(self, other):
+		return TestResultTally().merge(self).merge(other)
+	
+	def summary(self):
+		return ', '.join(test_result.value + ' ' + str(self.test_results[test_result]) for test_result in TS_RESULTS_COUNTED) \
+			+ ' | Conformance ' + ', '.join(verdict + ' ' + str(self.conformance_verdicts[verdict])
+											 for verdict in TS_CONFORMANCE_VERDICTS)
+
+
+class TestResultTotals:
+	# Test result tallies per frame rate family and brand, from which family, brand and grand totals are derived.
+	# Totals merge associatively, so they come out the same whichever way the analysis was split.
+	def __init__(self):
+		self.tallies = {}
+	
+	def tally(self, frame_rate_family, brand):
+		return self.tallies.setdefault((frame_rate_family, brand), TestResultTally())
+	
+	def merge(self, other):
+		for (frame_rate_family, brand), other_tally in other.tallies.items():
+			self.tally(frame_rate_family, brand).merge(other_tally)
+		return self
+	
+	def __add__(self, other):
+		return TestResultTotals().merge(self).merge(other)
+	
+	def total(self, frame_rate_family=None, brand=None):
+		total_tally = TestResultTally()
+		for (tally_family, tally_brand), tally in self.tallies.items():
+			if frame_rate_family in [None, tally_family] and brand in [None, tally_brand]:
+				total_tally.merge(tally)
+		return total_tally
+	
+	def brands(self, frame_rate_family=None):
+		return sorted(set(tally_brand for tally_family, tally_brand in self.tallies
+						  if frame_rate_family in [None, tally_family]))
+
+
 class SwitchingSetTestContent:
 	switching_set_id = ''
 	test_stream_ids = [[''], [''], [TestResult.NOT_TESTED]]
@@ -585,6 +703,7 @@ TS_DEFINITION_ROW_OFFSET = 3  # Number of rows from 'Test stream' root to actual
 TS_LOCATION_FRAME_RATES_50 = '12.5_25_50'
 TS_LOCATION_FRAME_RATES_59_94 = '14.985_29.97_59.94'
 TS_LOCATION_FRAME_RATES_60 = '15_30_60'
+TS_LOCATION_FRAME_RATES = [TS_LOCATION_FRAME_RATES_60, TS_LOCATION_FRAME_RATES_59_94, TS_LOCATION_FRAME_RATES_50]  # Order of analysis
 TS_LOCATION_SETS_POST = '_sets'
 
 # Test vector constants
@@ -605,6 +724,7 @@ TS_INIT_SEGMENT_NAME = 'init.mp4'
 TS_FIRST_SEGMENT_NAME = '0.m4s'
 TS_FIRST_CHUNKED_SEGMENT_NAME = '0_0.m4s'
 TS_METADATA_POSTFIX = '_info.xml'
+TS_STREAM_DUMP_NAME = 'stream.mp4'  # Scratch concatenation of the init segment and segments for a batched MP4Box dump
 
 # Switching set constants
 SS_PREFIX_DEFAULT = 'ss'
@@ -634,6 +754,11 @@ h264_slice_type = {'0': 'P slice', '1': 'B slice', '2': 'I slice',
 				'8': 'SP slice', '9': 'SI slice'}
 h265_profile = {'1': 'Main', '2': 'Main10'}
 h265_tier = {'0': 'Main', '1': 'High'}
+h266_profile = {'1': 'Main10', '17': 'Multilayer Main10', '33': 'Main10 4:4:4', '49': 'Multilayer Main10 4:4:4',
+				'65': 'Main10 Still Picture', '97': 'Main10 4:4:4 Still Picture'}
+h266_tier = {'0': 'Main', '1': 'High'}
+av1_profile = {'0': 'Main', '1': 'High', '2': 'Professional'}
+av1_tier = {'0': 'Main', '1': 'High'}  # seq_tier
 # For codec_name ffmpeg uses the ISO/IEC MPEG naming convention except for AVC
 codec_names = {'h264': 'avc'}  # Convert codec_name using ITU-T naming convention to ISO/IEC MPEG naming convention
 cmaf_brand_codecs = {'cfhd': 'avc', 'chdf': 'avc',
@@ -652,14 +777,11 @@ transfer_characteristics_values = {"SDR BT.709": 1, "SDR BT.2020": 14, "PQ10": 1
 sample_flag_values =  {'not set': False, 'set': True}
 
 # Test results
-TS_RESULTS_TOTAL_PASS = 0
-TS_RESULTS_TOTAL_FAIL = 0
-TS_RESULTS_TOTAL_NOT_TESTABLE = 0
-TS_RESULTS_TOTAL_NOT_TESTED = 0
-TS_RESULTS_TOTAL_NOT_APPLICABLE = 0
-TS_CONFORMANCE_TOTAL_PASS = 0
-TS_CONFORMANCE_TOTAL_FAIL = 0
-TS_CONFORMANCE_TOTAL_UNKNOWN = 0
+TS_RESULTS_COUNTED = [TestResult.PASS, TestResult.FAIL, TestResult.NOT_TESTED, TestResult.NOT_TESTABLE,
+					  TestResult.NOT_APPLICABLE]
+TS_CONFORMANCE_VERDICTS = ['PASS', 'FAIL', 'UNKNOWN']
+TS_SWITCHING_SET_BRAND = 'switching sets'  # Brand under which switching set results are counted
+TEST_RESULT_TOTALS = TestResultTotals()  # Totals of all frame rate families analysed so far
 
 # DASH conformance tool
 CONFORMANCE_TOOL_DOCKER_CONTAINER_ID = ''
@@ -669,135 +791,511 @@ DETECTED_IP = '127.0.0.1'
 PORT = 9090
 HTTPD_PATH = ''
 
+# Parallel analysis
+JOBS = 1  # Number of test streams analysed in parallel
+PARALLEL_FAMILIES = False  # Analyse all frame rate families concurrently on the same worker processes
+CONFORMANCE_JOBS = 2  # Number of DASH conformance tool runs executed concurrently in the Docker container
+CONFORMANCE_EXECUTOR = None  # Queue of DASH conformance tool runs, only used by the main process
+SEGMENT_DUMP_WORKERS = 4  # Number of MP4Box segment box metadata dumps run concurrently within one stream
+MP4BOX_BATCH = False  # Dump the init segment and all segments of a stream in a single MP4Box run
+PIPE_READ_SIZE = 65536  # Bytes read at once from the stderr pipe of ffmpeg by its drain thread
+DEBUG_ZIP_LOCK = None  # Serialises access to the debug zip file when streams are analysed in parallel
+PIPELINE_STAGE_DISCOVERY = 'discovery'
+PIPELINE_STAGE_TOOLS = 'tools'
+PIPELINE_STAGE_ANALYSIS = 'analysis'
+PIPELINE_STAGE_CONFORMANCE = 'conformance'
+PIPELINE_STAGE_REPORT = 'report'
+PIPELINE_STAGE_WORKERS = {}  # Number of worker threads per pipeline stage, overriding the defaults
+PIPELINE_STATS = False  # Print queue depth and utilisation of the pipeline stages
+SHARD = None  # (shard index, number of shards) when this run only analyses its share of the test streams
+SHARD_STREAMS = None  # (frame rate family, test content index) pairs analysed by this shard
+BOX_PARSER_NATIVE = 'native'
+BOX_PARSER_MP4BOX = 'mp4box'
+BOX_PARSER = BOX_PARSER_NATIVE  # Reads init and media segment boxes natively, or with ffprobe and MP4Box
+HEADER_PARSER_NATIVE = 'native'
+HEADER_PARSER_FFMPEG = 'ffmpeg'
+HEADER_PARSER = HEADER_PARSER_NATIVE  # Decodes AVC and HEVC headers natively, or from the ffmpeg trace_headers log
+TIMING_PARSER_FFMPEG = 'ffmpeg'
+TIMING_PARSER_FFPROBE = 'ffprobe'
+TIMING_PARSER = TIMING_PARSER_FFMPEG  # Frame rate, bitrate and duration from the ffmpeg log, or from ffprobe packets
+QUEUE_PATH = None  # SQLite work queue shared by a coordinator and workers on several machines
+QUEUE_ROLE_COORDINATOR = 'coordinator'
+QUEUE_ROLE_WORKER = 'worker'
+QUEUE_ROLE = QUEUE_ROLE_COORDINATOR
+QUEUE_LEASE = 120  # Seconds after which the job of a worker that stopped renewing its lease is claimed again
+QUEUE_LOCK_TIMEOUT = 60  # Seconds to wait for the work queue database lock
+QUEUE_POLL_INTERVAL = 5  # Seconds between checks of the work queue
+QUEUE_MAX_ATTEMPTS = 3  # Number of times the analysis of a test stream is attempted before giving up
+QUEUE_JOB_QUEUED = 'queued'
+QUEUE_JOB_LEASED = 'leased'
+QUEUE_JOB_DONE = 'done'
+QUEUE_JOB_FAILED = 'failed'
+
 # Default parameter values
 codec = 'avc'
 mezzanine_version = 1
 
 
-def check_and_analyse_v(test_content, tc_vectors_folder, frame_rate_family, debug_folder):
-	global TS_RESULTS_TOTAL_PASS
-	global TS_RESULTS_TOTAL_FAIL
-	global TS_RESULTS_TOTAL_NOT_TESTABLE
-	global TS_RESULTS_TOTAL_NOT_TESTED
-	global TS_RESULTS_TOTAL_NOT_APPLICABLE
-	global TS_CONFORMANCE_TOTAL_PASS
-	global TS_CONFORMANCE_TOTAL_FAIL
-	global TS_CONFORMANCE_TOTAL_UNKNOWN
+def trace_headers_filename(test_content, frame_rate_family):
+	# Scratch file names are unique per stream so that streams can be analysed in parallel
+	return str(Path(str(tc_matrix.stem)+'_'+frame_rate_family+'_'+test_content.file_brand[0]+'_'
+					+ test_content.test_stream_id+'_trace_headers_init_'+time_of_analysis+'.txt'))
+
+
+def box_dump_folder(test_content, frame_rate_family):
+	# MP4Box XML dumps are written to a scratch folder unique per stream rather than next to the segments, so that
+	# the test vectors folder can be read only and shared by concurrent runs
+	return str(Path(str(tc_matrix.stem)+'_'+frame_rate_family+'_'+test_content.file_brand[0]+'_'
+					+ test_content.test_stream_id+'_box_dumps_'+time_of_analysis))
+
+
+def box_dump_filepath(test_content, frame_rate_family, segment_name):
+	return str(Path(box_dump_folder(test_content, frame_rate_family)+sep+segment_name.split('.')[0]+TS_METADATA_POSTFIX))
+
+
+def analysis_worker_settings():
+	# Module level settings that are only set when running as a script and that analyse_stream depends on
+	return {
+		'tc_matrix': tc_matrix,
+		'time_of_analysis': time_of_analysis,
+		'local_ip': local_ip,
+		'CONFORMANCE_TOOL_DOCKER_CONTAINER_ID': CONFORMANCE_TOOL_DOCKER_CONTAINER_ID,
+		'HTTPD_PATH': HTTPD_PATH,
+		'PORT': PORT,
+		'SEGMENT_DUMP_WORKERS': SEGMENT_DUMP_WORKERS,
+		'BOX_PARSER': BOX_PARSER,
+		'HEADER_PARSER': HEADER_PARSER,
+		'TIMING_PARSER': TIMING_PARSER
+	}
+
+
+def init_analysis_worker(settings):
+	globals().update(settings)
+
+
+def check_stream_worker(test_content, frame_rate_family, seg_files, init_segment_info, stream_tool_output):
+	# Buffer the analysis log so that streams analysed in parallel do not interleave their output
+	stream_log = io.StringIO()
+	try:
+		with contextlib.redirect_stdout(stream_log):
+			# The ffmpeg log is already in the trace_headers file, it is not copied again
+			check_stream(test_content, frame_rate_family, seg_files, init_segment_info, False,
+						 stream_tool_output.stream_processes())
+	except BaseException:
+		sys.stdout.write(stream_log.getvalue())
+		raise
+	return test_content, stream_log.getvalue()
+
+
+class VectorAnalysisBatch:
+	# Test streams of one frame rate family, with the analyses still running in the pipeline
+	# and the DASH conformance tool runs still queued
+	def __init__(self, test_content, frame_rate_family):
+		self.test_content = test_content
+		self.frame_rate_family = frame_rate_family
+		self.skipped_tc_index = []
+		self.pipeline_jobs = []
+		self.totals = TestResultTotals()
+		self.pending_conformance = {}
+		self.uncounted_tc_index = []
+
+
+class StreamJob:
+	# A test stream travelling through the stages of the analysis pipeline
+	def __init__(self, analysis_batch, tc_index, tc_vectors_folder, debug_folder):
+		self.analysis_batch = analysis_batch
+		self.tc_index = tc_index
+		self.test_content = analysis_batch.test_content[tc_index]
+		self.frame_rate_family = analysis_batch.frame_rate_family
+		self.tc_vectors_folder = tc_vectors_folder
+		self.debug_folder = debug_folder
+		self.seg_files = []
+		self.init_segment_info = None
+		self.stream_tool_output = None
+		self.conformance_test_result = ''
+		self.log = io.StringIO()
+		self.error = None
+		self.priority = (0, 0)  # Lowest first, stays in submission order until the cost of the stream is known
+		self.pending_branches = 1  # The conformance test runs on a separate branch of the pipeline
+		self.lock = threading.Lock()
+		self.done = threading.Event()
+
+
+class ThreadStdoutRouter(io.TextIOBase):
+	# Sends the output of each pipeline worker thread to the log of the stream it is working on
+	def __init__(self, stdout):
+		self.stdout = stdout
+		self.local = threading.local()
 	
-	if frame_rate_family not in [TS_LOCATION_FRAME_RATES_50, TS_LOCATION_FRAME_RATES_59_94, TS_LOCATION_FRAME_RATES_60]:
-		return
+	def write(self, s):
+		target = getattr(self.local, 'target', None)
+		if target is None:
+			target = self.stdout
+		return target.write(s)
 	
-	skipped_tc_index = []
-	for tc in test_content:
-		ts_id_prefix = ''
-		if not tc.test_stream_id.startswith(TS_SPLICING_ID_MAIN) and not tc.test_stream_id.startswith(TS_SPLICING_ID_AD):
-			ts_id_prefix = TS_DEFAULT_PREFIX
-		else:
-			if not (frame_rate_family == TS_LOCATION_FRAME_RATES_50):
-				# Skip non-25fps-family splicing content (WAVE splicing tests specifically use 25fps-family content)
-				skipped_tc_index.append(tc)
-				continue
-		test_stream_dir = Path(str(tc_vectors_folder)+sep+tc.file_brand[0]+TS_LOCATION_SETS_POST+sep
-							+ frame_rate_family+sep+ts_id_prefix+tc.test_stream_id+sep)
+	def flush(self):
+		self.stdout.flush()
+
+
+class PipelineStage:
+	# Worker threads taking the jobs of one stage from its queue by priority, with counters for reporting
+	def __init__(self, name, workers, process):
+		self.name = name
+		self.workers = workers
+		self.process = process
+		self.queue = queue.PriorityQueue()
+		self.sequence = itertools.count()  # Keeps jobs of equal priority in submission order
+		self.threads = []
+		self.lock = threading.Lock()
+		self.processed = 0
+		self.busy_time = 0
+		self.max_queue_depth = 0
+		self.queue_depth_total = 0
+		self.queue_depth_samples = 0
+	
+	def put(self, stream_job):
+		self.queue.put((stream_job.priority, next(self.sequence), stream_job))
+		self.sample_queue_depth()
+	
+	def stop(self):
+		# Queued after all jobs, one per worker thread
+		for stage_thread in self.threads:
+			self.queue.put(((float('inf'), float('inf')), next(self.sequence), None))
+	
+	def sample_queue_depth(self):
+		queue_depth = self.queue.qsize()
+		with self.lock:
+			self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+			self.queue_depth_total += queue_depth
+			self.queue_depth_samples += 1
+
+
+class AnalysisPipeline:
+	# Streams flow through discovery -> tools (ffmpeg, ffprobe and MP4Box runs, init segment) -> analysis (checks of
+	# the tool output) -> report, with the DASH conformance test as a parallel branch after discovery. Each stage has its own queue and workers,
+	# so that I/O-bound stages and the CPU-bound analysis overlap across streams. After discovery, the queues
+	# serve the streams with the most segments and bytes first (longest job first).
+	def __init__(self, stage_workers):
+		global DEBUG_ZIP_LOCK
 		
-		if os.path.isdir(test_stream_dir):
-			print("Found test stream folder \""+str(test_stream_dir)+"\"...")
-			date_dirs = next(os.walk(str(test_stream_dir)))[1]
-			if len(date_dirs) > 0:
-				date_dirs.sort()
-				most_recent_date = date_dirs[len(date_dirs)-1]
-			else:
-				tc.test_file_path = 'release (YYYY-MM-DD) folder missing'
-				print('No test streams releases found for '+ts_id_prefix+tc.test_stream_id+'.')
-				print()
-				continue
-			test_stream_date_dir = Path(str(test_stream_dir)+sep+most_recent_date+sep)
-			if os.path.isdir(test_stream_date_dir):
-				print(str(test_stream_date_dir)+' OK')
-			else:
-				tc.test_file_path = 'release (YYYY-MM-DD) folder missing'
-				print('Test stream folder \"'+str(test_stream_date_dir)+'\" does not exist.')
-				print()
-				continue
-			test_stream_path = Path(str(test_stream_date_dir)+sep+TS_MPD_NAME)
-			if os.path.isfile(test_stream_path):
-				print(str(test_stream_path)+' OK')
-				tc.test_file_path = str(test_stream_path)
-			else:
-				tc.test_file_path = TS_MPD_NAME+' file missing'
-				print(str(test_stream_path)+' does not exist.')
-				print()
-				continue
-			test_stream_path = Path(str(test_stream_date_dir)+sep+'1'+sep+TS_INIT_SEGMENT_NAME)
+		self.stages = OrderedDict()
+		for name, process in [(PIPELINE_STAGE_DISCOVERY, self.discover), (PIPELINE_STAGE_TOOLS, self.run_tools),
+							  (PIPELINE_STAGE_ANALYSIS, self.analyse), (PIPELINE_STAGE_CONFORMANCE, self.test_conformance),
+							  (PIPELINE_STAGE_REPORT, self.report)]:
+			self.stages[name] = PipelineStage(name, stage_workers[name], process)
+		
+		# Parsing the tool output is CPU-bound, run it in worker processes. They are spawned rather than forked, as
+		# they are started on demand from the stage threads while the other threads may hold locks.
+		self.analysis_executor = concurrent.futures.ProcessPoolExecutor(
+			max_workers=stage_workers[PIPELINE_STAGE_ANALYSIS], mp_context=multiprocessing.get_context('spawn'),
+			initializer=init_analysis_worker, initargs=(analysis_worker_settings(),))
+		DEBUG_ZIP_LOCK = threading.Lock()
+		
+		self.stdout = sys.stdout
+		self.stdout_router = ThreadStdoutRouter(self.stdout)
+		sys.stdout = self.stdout_router
+		self.start_time = time.time()
+		for stage in self.stages.values():
+			for i in range(stage.workers):
+				stage_thread = threading.Thread(target=self.run_stage, args=(stage,), daemon=True)
+				stage_thread.start()
+				stage.threads.append(stage_thread)
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, exc_traceback):
+		self.shutdown()
+		return False
+	
+	def submit(self, stream_job):
+		self.stages[PIPELINE_STAGE_DISCOVERY].put(stream_job)
+	
+	def run_stage(self, stage):
+		while True:
+			_, _, stream_job = stage.queue.get()
+			if stream_job is None:
+				break
+			stage.sample_queue_depth()
+			start_time = time.time()
+			self.stdout_router.local.target = stream_job.log
+			try:
+				next_stages = stage.process(stream_job)
+			except BaseException as e:
+				stream_job.error = e
+				next_stages = []
+			finally:
+				self.stdout_router.local.target = None
+			with stage.lock:
+				stage.processed += 1
+				stage.busy_time += time.time() - start_time
+			
+			for next_stage in next_stages:
+				self.stages[next_stage].put(stream_job)
+			if not next_stages:
+				# This branch of the pipeline is finished for the stream
+				with stream_job.lock:
+					stream_job.pending_branches -= 1
+					if stream_job.pending_branches == 0:
+						stream_job.done.set()
+	
+	def discover(self, stream_job):
+		if not find_test_stream(stream_job.test_content, stream_job.tc_vectors_folder, stream_job.frame_rate_family):
+			return []
+		# Dispatch the most expensive streams first so that a long stream does not start last and stretch the run
+		segment_count, segment_bytes = estimate_stream_cost(stream_job.test_content.test_file_path)
+		stream_job.priority = (-segment_count, -segment_bytes)
+		print('Estimated cost: '+str(segment_count)+' segments, '+str(segment_bytes)+' bytes')
+		if CONFORMANCE_TOOL_DOCKER_CONTAINER_ID != '':
+			stream_job.pending_branches = 2
+			return [PIPELINE_STAGE_TOOLS, PIPELINE_STAGE_CONFORMANCE]
+		return [PIPELINE_STAGE_TOOLS]
+	
+	def run_tools(self, stream_job):
+		# Print test content id
+		print('## Testing '+stream_job.test_content.test_stream_id)
+		stream_job.seg_files = list_segment_files(stream_job.test_content)
+		# ffmpeg and ffprobe run over the full stream concurrently with the segment tools. Their output is kept for
+		# the analysis stage: the ffmpeg log is written to the trace_headers file as it comes.
+		stream_processes = start_stream_processes(stream_job.test_content)
+		output_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+		try:
+			stream_tool_output = output_executor.submit(
+				stream_processes.save_output, trace_headers_filename(stream_job.test_content, stream_job.frame_rate_family))
+			stream_job.init_segment_info = asyncio.run(run_stream_tools(
+				stream_job.test_content, stream_job.frame_rate_family, stream_job.seg_files))
+			stream_job.stream_tool_output = stream_tool_output.result()
+		finally:
+			stream_processes.kill()
+			output_executor.shutdown()
+		return [PIPELINE_STAGE_ANALYSIS]
+	
+	def analyse(self, stream_job):
+		stream_job.test_content, stream_log = self.analysis_executor.submit(
+			check_stream_worker, stream_job.test_content, stream_job.frame_rate_family,
+			stream_job.seg_files, stream_job.init_segment_info, stream_job.stream_tool_output).result()
+		print(stream_log, end='')
+		return [PIPELINE_STAGE_REPORT]
+	
+	def test_conformance(self, stream_job):
+		stream_job.conformance_test_result = run_conformance_tool(stream_job.test_content.test_file_path)
+		return []
+	
+	def report(self, stream_job):
+		finish_stream_logs(stream_job.test_content, stream_job.frame_rate_family, stream_job.debug_folder,
+						   stream_job.seg_files)
+		return []
+	
+	def shutdown(self):
+		# The stage threads route sys.stdout until then, it is restored even when a stage cannot be stopped cleanly
+		try:
+			for stage in self.stages.values():
+				stage.stop()
+				for stage_thread in stage.threads:
+					stage_thread.join()
+			self.analysis_executor.shutdown()
+		finally:
+			sys.stdout = self.stdout
+	
+	def print_statistics(self):
+		elapsed_time = time.time() - self.start_time
+		print("### PIPELINE STAGE STATISTICS (" + str(round(elapsed_time, 1)) + "s elapsed):")
+		for stage in self.stages.values():
+			utilisation = stage.busy_time / (stage.workers * elapsed_time) if elapsed_time > 0 else 0
+			mean_queue_depth = stage.queue_depth_total / stage.queue_depth_samples if stage.queue_depth_samples > 0 else 0
+			print("#  - " + stage.name + ": " + str(stage.workers) + " worker(s), "
+				  + str(stage.processed) + " stream(s) processed, "
+				  + str(round(utilisation * 100, 1)) + "% utilisation, "
+				  + "queue depth max " + str(stage.max_queue_depth) + " mean " + str(round(mean_queue_depth, 1)))
+		print()
+
+
+def estimate_stream_cost(test_file_path):
+	# Number of segments and total size of the files of a test stream, the analysis time grows with both
+	segment_count = 0
+	segment_bytes = 0
+	with os.scandir(str(Path(test_file_path + sep + '1' + sep))) as seg_entries:
+		for seg_entry in seg_entries:
+			if seg_entry.is_file():
+				if seg_entry.name.endswith('.m4s'):
+					segment_count += 1
+				segment_bytes += seg_entry.stat().st_size
+	return segment_count, segment_bytes
+
+
+def find_test_stream(tc, tc_vectors_folder, frame_rate_family):
+	# Locate the most recent release of a test stream and check the files necessary for analysis are present
+	ts_id_prefix = ''
+	if not tc.test_stream_id.startswith(TS_SPLICING_ID_MAIN) and not tc.test_stream_id.startswith(TS_SPLICING_ID_AD):
+		ts_id_prefix = TS_DEFAULT_PREFIX
+	test_stream_dir = Path(str(tc_vectors_folder)+sep+tc.file_brand[0]+TS_LOCATION_SETS_POST+sep
+						+ frame_rate_family+sep+ts_id_prefix+tc.test_stream_id+sep)
+	
+	if os.path.isdir(test_stream_dir):
+		print("Found test stream folder \""+str(test_stream_dir)+"\"...")
+		date_dirs = next(os.walk(str(test_stream_dir)))[1]
+		if len(date_dirs) > 0:
+			date_dirs.sort()
+			most_recent_date = date_dirs[len(date_dirs)-1]
+		else:
+			tc.test_file_path = 'release (YYYY-MM-DD) folder missing'
+			print('No test streams releases found for '+ts_id_prefix+tc.test_stream_id+'.')
+			print()
+			return False
+		test_stream_date_dir = Path(str(test_stream_dir)+sep+most_recent_date+sep)
+		if os.path.isdir(test_stream_date_dir):
+			print(str(test_stream_date_dir)+' OK')
+		else:
+			tc.test_file_path = 'release (YYYY-MM-DD) folder missing'
+			print('Test stream folder \"'+str(test_stream_date_dir)+'\" does not exist.')
+			print()
+			return False
+		test_stream_path = Path(str(test_stream_date_dir)+sep+TS_MPD_NAME)
+		if os.path.isfile(test_stream_path):
+			print(str(test_stream_path)+' OK')
+			tc.test_file_path = str(test_stream_path)
+		else:
+			tc.test_file_path = TS_MPD_NAME+' file missing'
+			print(str(test_stream_path)+' does not exist.')
+			print()
+			return False
+		test_stream_path = Path(str(test_stream_date_dir)+sep+'1'+sep+TS_INIT_SEGMENT_NAME)
+		if os.path.isfile(test_stream_path):
+			print(str(test_stream_path)+' OK')
+		else:
+			tc.test_file_path = TS_INIT_SEGMENT_NAME+' file missing'
+			print(str(test_stream_path)+' does not exist.')
+			print()
+			return False
+		test_stream_path = Path(str(test_stream_date_dir)+sep+'1'+sep+TS_FIRST_SEGMENT_NAME)
+		if os.path.isfile(test_stream_path):
+			print(str(test_stream_path)+" OK")
+			tc.test_file_path = str(test_stream_date_dir)
+		else:
+			test_stream_path = Path(str(test_stream_date_dir) + sep + '1' + sep + TS_FIRST_CHUNKED_SEGMENT_NAME)
 			if os.path.isfile(test_stream_path):
-				print(str(test_stream_path)+' OK')
+				print(str(test_stream_path) + " OK")
+				tc.test_file_path = str(test_stream_date_dir)
 			else:
-				tc.test_file_path = TS_INIT_SEGMENT_NAME+' file missing'
+				tc.test_file_path = TS_FIRST_SEGMENT_NAME+' file missing'
 				print(str(test_stream_path)+' does not exist.')
 				print()
+				return False
+		return True
+	else:
+		tc.test_file_path = 'folder missing'
+		print('Test stream folder \"'+str(test_stream_dir)+'\" does not exist.')
+		print()
+	return False
+
+
+def check_and_analyse_v(test_content, tc_vectors_folder, frame_rate_family, debug_folder, pipeline=None):
+	analysis_batch = submit_analysis_v(test_content, tc_vectors_folder, frame_rate_family, debug_folder, pipeline)
+	if analysis_batch is not None:
+		complete_analysis_v(analysis_batch)
+
+
+def submit_analysis_v(test_content, tc_vectors_folder, frame_rate_family, debug_folder, pipeline=None):
+	if frame_rate_family not in [TS_LOCATION_FRAME_RATES_50, TS_LOCATION_FRAME_RATES_59_94, TS_LOCATION_FRAME_RATES_60]:
+		return None
+	
+	analysis_batch = VectorAnalysisBatch(test_content, frame_rate_family)
+	for tc_index, tc in enumerate(test_content):
+		if tc.test_stream_id.startswith(TS_SPLICING_ID_MAIN) or tc.test_stream_id.startswith(TS_SPLICING_ID_AD):
+			if not (frame_rate_family == TS_LOCATION_FRAME_RATES_50):
+				# Skip non-25fps-family splicing content (WAVE splicing tests specifically use 25fps-family content)
+				analysis_batch.skipped_tc_index.append(tc)
 				continue
-			test_stream_path = Path(str(test_stream_date_dir)+sep+'1'+sep+TS_FIRST_SEGMENT_NAME)
-			if os.path.isfile(test_stream_path):
-				print(str(test_stream_path)+" OK")
-				tc.test_file_path = str(test_stream_date_dir)
-			else:
-				test_stream_path = Path(str(test_stream_date_dir) + sep + '1' + sep + TS_FIRST_CHUNKED_SEGMENT_NAME)
-				if os.path.isfile(test_stream_path):
-					print(str(test_stream_path) + " OK")
-					tc.test_file_path = str(test_stream_date_dir)
-				else:
-					tc.test_file_path = TS_FIRST_SEGMENT_NAME+' file missing'
-					print(str(test_stream_path)+' does not exist.')
-					print()
-					continue
-			# Necessary files are present, run analysis
+		if SHARD_STREAMS is not None and (frame_rate_family, tc_index) not in SHARD_STREAMS:
+			# Analysed by another shard
+			continue
+		
+		if pipeline is not None:
+			# Discovery, analysis and conformance test are run by the pipeline stages
+			stream_job = StreamJob(analysis_batch, tc_index, tc_vectors_folder, debug_folder)
+			analysis_batch.pipeline_jobs.append(stream_job)
+			analysis_batch.uncounted_tc_index.append(tc_index)
+			pipeline.submit(stream_job)
+			continue
+		
+		if find_test_stream(tc, tc_vectors_folder, frame_rate_family):
+			# Necessary files are present, queue the DASH conformance tool run and run analysis meanwhile
+			if CONFORMANCE_EXECUTOR is not None:
+				print('Queue DASH conformance tool run for '+tc.test_stream_id)
+				analysis_batch.pending_conformance[tc_index] = \
+					CONFORMANCE_EXECUTOR.submit(run_conformance_tool, tc.test_file_path)
 			analyse_stream(tc, frame_rate_family, debug_folder)
-		else:
-			tc.test_file_path = 'folder missing'
-			print('Test stream folder \"'+str(test_stream_dir)+'\" does not exist.')
-			print()
+			if tc_index in analysis_batch.pending_conformance:
+				# Count results once the conformance test result is known
+				analysis_batch.uncounted_tc_index.append(tc_index)
+				continue
 		
 		# Count results
-		if tc.conformance_test_result != '':
-			if tc.conformance_test_result['verdict'] == 'PASS':
-				TS_CONFORMANCE_TOTAL_PASS += 1
-			elif tc.conformance_test_result['verdict'] == 'FAIL':
-				TS_CONFORMANCE_TOTAL_FAIL += 1
-			else:
-				TS_CONFORMANCE_TOTAL_UNKNOWN += 1
-		else:
-			TS_CONFORMANCE_TOTAL_UNKNOWN += 1
-		for a, v in tc.__dict__.items():
-			if len(v) == 3:
-				if v[2] == TestResult.PASS:
-					TS_RESULTS_TOTAL_PASS += 1
+		analysis_batch.totals.tally(frame_rate_family, tc.file_brand[0]).add_test_content(tc)
 	
-				elif v[2] == TestResult.FAIL:
-					TS_RESULTS_TOTAL_FAIL += 1
+	return analysis_batch
+
+
+def complete_analysis_v(analysis_batch):
+	test_content = analysis_batch.test_content
+	frame_rate_family = analysis_batch.frame_rate_family
+	skipped_tc_index = analysis_batch.skipped_tc_index
 	
-				elif v[2] == TestResult.NOT_TESTED:
-					TS_RESULTS_TOTAL_NOT_TESTED += 1
+	# Merge results of streams analysed by the pipeline back in matrix order
+	for stream_job in analysis_batch.pipeline_jobs:
+		stream_job.done.wait()
+		print(stream_job.log.getvalue(), end='')
+		if stream_job.error is not None:
+			raise stream_job.error
+		test_content[stream_job.tc_index] = stream_job.test_content
+		if stream_job.conformance_test_result != '':
+			stream_job.test_content.conformance_test_result = stream_job.conformance_test_result
+			print("DASH conformance test result for "+stream_job.test_content.test_stream_id+": "
+				  + stream_job.conformance_test_result['verdict'])
 	
-				elif v[2] == TestResult.NOT_TESTABLE:
-					TS_RESULTS_TOTAL_NOT_TESTABLE += 1
+	# Join DASH conformance test results as they become available
+	for tc_index, conformance_run in analysis_batch.pending_conformance.items():
+		test_content[tc_index].conformance_test_result = conformance_run.result()
+		print("DASH conformance test result for "+test_content[tc_index].test_stream_id+": "
+			  + test_content[tc_index].conformance_test_result['verdict'])
 	
-				elif v[2] == TestResult.NOT_APPLICABLE:
-					TS_RESULTS_TOTAL_NOT_APPLICABLE += 1
+	for tc_index in analysis_batch.uncounted_tc_index:
+		analysis_batch.totals.tally(frame_rate_family, test_content[tc_index].file_brand[0]) \
+			.add_test_content(test_content[tc_index])
+	TEST_RESULT_TOTALS.merge(analysis_batch.totals)
 	
 	# Remove skipped test cases (non-25fps-family splicing content)
+	tc_indexes = [tc_index for tc_index, tc in enumerate(test_content) if tc not in skipped_tc_index]
 	for stc in skipped_tc_index:
 		test_content.remove(stc)
 		
-	# Save metadata to JSON file
-	tc_res_filepath = Path(str(tc_matrix.stem)+'_'+frame_rate_family+'_test_results_'+time_of_analysis+'.json')
+	# Save metadata to JSON file, or to a partial results file to be merged with those of the other shards
+	if SHARD is None:
+		tc_res_filepath = Path(str(tc_matrix.stem)+'_'+frame_rate_family+'_test_results_'+time_of_analysis+'.json')
+		save_test_results(tc_res_filepath,
+						  [(test_result_name(tc, frame_rate_family), tc) for tc in test_content])
+	else:
+		tc_res_filepath = Path(str(tc_matrix.stem)+'_'+frame_rate_family+'_test_results_'+time_of_analysis
+							   + '_shard'+str(SHARD[0]+1)+'of'+str(SHARD[1])+'.json')
+		save_shard_results(tc_res_filepath, frame_rate_family, tc_indexes, test_content)
+	
+	print_results_summary()
+	print("Test results stored in: " + str(tc_res_filepath))
+	print()
+
+
+def test_result_name(tc, frame_rate_family):
+	if 'missing' in tc.test_file_path:
+		return tc.file_brand[0]+TS_LOCATION_SETS_POST+'_'+frame_rate_family+'_'+tc.test_stream_id+' (missing)'
+	return '_'.join(tc.test_file_path.split('\\')[-4:])
+
+
+def save_test_results(tc_res_filepath, tc_results):
+	# tc_results is a list of (result name, TestContent or its JSON data) in test content matrix order
 	tc_res_file = open(str(tc_res_filepath), "w", encoding='utf8')
 	tc_res_json = '{\n'
-	tc_nb_results = len(test_content)
-	for i, tc in enumerate(test_content):
-		if 'missing' in tc.test_file_path:
-			result_name = tc.file_brand[0]+TS_LOCATION_SETS_POST+'_'+frame_rate_family+'_'+tc.test_stream_id+' (missing)'
-		else:
-			result_name = '_'.join(tc.test_file_path.split('\\')[-4:])
+	tc_nb_results = len(tc_results)
+	for i, (result_name, tc) in enumerate(tc_results):
 		tc_res_json += "\""+result_name+"\":" + json.dumps(tc, indent=4, cls=TestContentFullEncoder, ensure_ascii=False)
 		if i<tc_nb_results-1:
 			tc_res_json += ",\n"
@@ -805,279 +1303,500 @@ def check_and_analyse_v(test_content, tc_vectors_folder, frame_rate_family, debu
 			tc_res_json += "\n}\n"
 	tc_res_file.write(tc_res_json)
 	tc_res_file.close()
-	
+
+
+def save_shard_results(tc_res_filepath, frame_rate_family, tc_indexes, test_content):
+	# Keep the matrix index of each result so that the shards can be merged back in matrix order
+	shard_results = {
+		'shard': str(SHARD[0]+1)+'/'+str(SHARD[1]),
+		'matrix': str(tc_matrix.stem),
+		'frame_rate_family': frame_rate_family,
+		'time_of_analysis': time_of_analysis,
+		'family_indexes': tc_indexes,
+		'results': [{'index': tc_index, 'name': test_result_name(tc, frame_rate_family), 'result': tc}
+					for tc_index, tc in zip(tc_indexes, test_content)
+					if (frame_rate_family, tc_index) in SHARD_STREAMS]
+	}
+	with open(str(tc_res_filepath), "w", encoding='utf8') as tc_res_file:
+		json.dump(shard_results, tc_res_file, indent=4, cls=TestContentFullEncoder, ensure_ascii=False)
+
+
+def print_results_summary():
+	grand_total = TEST_RESULT_TOTALS.total()
 	print("### SUMMARY OF TEST RESULTS:")
 	print("#  ")
 	print("#  DASH conformance check using https://github.com/Dash-Industry-Forum/DASH-IF-Conformance")
 	print("#  CLI: php Process_cli.php --cmaf --ctawave --segments <MPD location>")
-	print("#  - Total Conformance PASS: " + str(TS_CONFORMANCE_TOTAL_PASS))
-	print("#  - Total Conformance FAIL: " + str(TS_CONFORMANCE_TOTAL_FAIL))
-	print("#  - Total Conformance UNKNOWN: " + str(TS_CONFORMANCE_TOTAL_UNKNOWN))
+	print("#  - Total Conformance PASS: " + str(grand_total.conformance_verdicts['PASS']))
+	print("#  - Total Conformance FAIL: " + str(grand_total.conformance_verdicts['FAIL']))
+	print("#  - Total Conformance UNKNOWN: " + str(grand_total.conformance_verdicts['UNKNOWN']))
 	print("#  ")
 	print("#  WAVE test content definition conformance check:")
-	print("#  - Total PASS: " + str(TS_RESULTS_TOTAL_PASS))
-	print("#  - Total FAIL: " + str(TS_RESULTS_TOTAL_FAIL))
-	print("#  - Total NOT TESTED: " + str(TS_RESULTS_TOTAL_NOT_TESTED))
-	print("#  - Total NOT TESTABLE: " + str(TS_RESULTS_TOTAL_NOT_TESTABLE))
-	print("#  - Total NOT APPLICABLE: " + str(TS_RESULTS_TOTAL_NOT_APPLICABLE))
+	print("#  - Total PASS: " + str(grand_total.test_results[TestResult.PASS]))
+	print("#  - Total FAIL: " + str(grand_total.test_results[TestResult.FAIL]))
+	print("#  - Total NOT TESTED: " + str(grand_total.test_results[TestResult.NOT_TESTED]))
+	print("#  - Total NOT TESTABLE: " + str(grand_total.test_results[TestResult.NOT_TESTABLE]))
+	print("#  - Total NOT APPLICABLE: " + str(grand_total.test_results[TestResult.NOT_APPLICABLE]))
+	print("#  ")
+	print("#  Totals per frame rate family and brand:")
+	for frame_rate_family in TS_LOCATION_FRAME_RATES:
+		if TEST_RESULT_TOTALS.brands(frame_rate_family):
+			print("#  - " + frame_rate_family + ": " + TEST_RESULT_TOTALS.total(frame_rate_family).summary())
+			for brand in TEST_RESULT_TOTALS.brands(frame_rate_family):
+				print("#    - " + brand + ": " + TEST_RESULT_TOTALS.total(frame_rate_family, brand).summary())
+	print("#  - All families:")
+	for brand in TEST_RESULT_TOTALS.brands():
+		print("#    - " + brand + ": " + TEST_RESULT_TOTALS.total(brand=brand).summary())
 	print()
 
-	print("Test results stored in: " + str(tc_res_filepath))
-	print()
 
+def find_stream_cost(tc, tc_vectors_folder, frame_rate_family):
+	# Cost of a test stream before it is analysed, (0, 0) when its files are missing
+	tc_copy = copy.deepcopy(tc)
+	with contextlib.redirect_stdout(io.StringIO()):
+		stream_found = find_test_stream(tc_copy, tc_vectors_folder, frame_rate_family)
+	return estimate_stream_cost(tc_copy.test_file_path) if stream_found else (0, 0)
 
-def check_and_analyse_ss(ss_test_content, test_content, tc_vectors_folder, frame_rate_family):
-	global TS_RESULTS_TOTAL_PASS
-	global TS_RESULTS_TOTAL_FAIL
-	global TS_RESULTS_TOTAL_NOT_TESTABLE
-	global TS_RESULTS_TOTAL_NOT_TESTED
-	global TS_RESULTS_TOTAL_NOT_APPLICABLE
-	global TS_CONFORMANCE_TOTAL_PASS
-	global TS_CONFORMANCE_TOTAL_FAIL
-	global TS_CONFORMANCE_TOTAL_UNKNOWN
+
+def assign_shards(test_content, tc_vectors_folder, shard_count):
+	# Split the (frame rate family, test stream) pairs across shards, longest streams first onto the least loaded
+	# shard. Every shard computes the same assignment as long as they see the same matrix and vectors folder.
+	stream_costs = []
+	for frame_rate_family in TS_LOCATION_FRAME_RATES:
+		for tc_index, tc in enumerate(test_content):
+			if tc.test_stream_id.startswith(TS_SPLICING_ID_MAIN) or tc.test_stream_id.startswith(TS_SPLICING_ID_AD):
+				if not (frame_rate_family == TS_LOCATION_FRAME_RATES_50):
+					continue
+			stream_costs.append((find_stream_cost(tc, tc_vectors_folder, frame_rate_family),
+								 TS_LOCATION_FRAME_RATES.index(frame_rate_family), tc_index))
+	stream_costs.sort(key=lambda sc: (-sc[0][0], -sc[0][1], sc[1], sc[2]))
 	
-	if frame_rate_family not in [TS_LOCATION_FRAME_RATES_50, TS_LOCATION_FRAME_RATES_59_94, TS_LOCATION_FRAME_RATES_60]:
-		return
+	shard_loads = [(0, 0)] * shard_count
+	stream_shards = {}
+	for stream_cost, family_index, tc_index in stream_costs:
+		shard_index = min(range(shard_count), key=lambda si: (shard_loads[si], si))
+		shard_loads[shard_index] = (shard_loads[shard_index][0] + stream_cost[0],
+									shard_loads[shard_index][1] + stream_cost[1])
+		stream_shards[(TS_LOCATION_FRAME_RATES[family_index], tc_index)] = shard_index
+	return stream_shards
+
+
+def merge_shard_results(shard_result_files):
+	# Combine the partial results files of all shards into one results file per frame rate family
+	shard_results_by_family = {}
+	for shard_result_file in shard_result_files:
+		if not os.path.isfile(shard_result_file):
+			sys.exit("Partial results file \""+shard_result_file+"\" does not exist.")
+		try:
+			with open(shard_result_file, encoding='utf8') as shard_file:
+				shard_results = json.load(shard_file)
+			shard_key = (shard_results['matrix'], shard_results['frame_rate_family'])
+		except (json.JSONDecodeError, KeyError, TypeError):
+			sys.exit("Failed to load partial results file \""+shard_result_file+"\". Is this a file written with --shard?")
+		shard_results_by_family.setdefault(shard_key, []).append(shard_results)
 	
-	ss_mpd_path = ''
-	for ss in ss_test_content:
-		# Print switching set id
-		print('## Testing ' + ss.switching_set_id)
-		ss_codec = 'unknown'
-		for tc in test_content:
-			if tc.test_stream_id == ss.test_stream_ids[0][0]:
-				ss_codec = cmaf_brand_codecs.get(tc.file_brand[0], 'unknown')
+	for (matrix_stem, frame_rate_family), family_shards in sorted(
+			shard_results_by_family.items(), key=lambda fs: (fs[0][0], TS_LOCATION_FRAME_RATES.index(fs[0][1]))):
+		shard_count = int(family_shards[0]['shard'].split('/')[1])
+		shard_ids = sorted(int(shard_results['shard'].split('/')[0]) for shard_results in family_shards)
+		if shard_ids != list(range(1, shard_count+1)) \
+				or any(int(shard_results['shard'].split('/')[1]) != shard_count for shard_results in family_shards):
+			sys.exit("Expected exactly one partial results file for each of the "+str(shard_count)+" shards of "
+					 + matrix_stem+" "+frame_rate_family+", found shards "+', '.join(map(str, shard_ids))+".")
 		
-		if ss_codec == 'avc':
-			ss_path = str(Path(
-				str(tc_vectors_folder) + sep + SS_LOCATION + sep + frame_rate_family + sep + ss.switching_set_id))
-		elif ss_codec == 'hevc':
-			ss_path = str(Path(
-				str(tc_vectors_folder) + sep + SS_LOCATION + sep + frame_rate_family + sep + ss.switching_set_id))
-		else:
-			return
+		merged_results = sorted([shard_result for shard_results in family_shards for shard_result in shard_results['results']],
+								key=lambda sr: sr['index'])
+		merged_indexes = [shard_result['index'] for shard_result in merged_results]
+		if merged_indexes != sorted(family_shards[0]['family_indexes']):
+			sys.exit("Partial results of "+matrix_stem+" "+frame_rate_family+" do not cover each test stream exactly once, "
+					 "were all shards run with the same matrix and vectors folder?")
 		
-		if os.path.isdir(ss_path):
-			print("Found test stream folder \""+str(ss_path)+"\"...")
-			date_dirs = next(os.walk(str(ss_path)))[1]
-			if len(date_dirs) > 0:
-				date_dirs.sort()
-				most_recent_date = date_dirs[len(date_dirs)-1]
-			else:
-				ss.test_file_paths[0][0] = ss_path
-				ss.test_file_paths[1][0] = 'release (YYYY-MM-DD) folder missing'
-				ss.test_file_paths[2][0] = TestResult.FAIL
-				print('No MPD releases found for '+ss.switching_set_id+'.')
-				print()
-				continue
-			test_stream_date_dir = Path(str(ss_path)+sep+most_recent_date+sep)
-			if os.path.isdir(test_stream_date_dir):
-				print(str(test_stream_date_dir)+' OK')
-			else:
-				ss.test_file_paths[0][0] = test_stream_date_dir
-				ss.test_file_paths[1][0] = 'release (YYYY-MM-DD) folder missing'
-				ss.test_file_paths[2][0] = TestResult.FAIL
-				print('Test stream folder \"'+str(test_stream_date_dir)+'\" does not exist.')
-				print()
-				continue
-			ss_mpd_path = Path(str(test_stream_date_dir)+sep+TS_MPD_NAME)
-			if os.path.isfile(ss_mpd_path):
-				print(str(ss_mpd_path)+' OK')
-				ss.test_file_paths[0][0] = str(ss_mpd_path)
-				ss.test_file_paths[1][0] = str(ss_mpd_path)
-				ss.test_file_paths[2][0] = TestResult.PASS
-			else:
-				ss.test_file_paths[0][0] = ss_mpd_path
-				ss.test_file_paths[1][0] = TS_MPD_NAME+' file missing'
-				ss.test_file_paths[2][0] = TestResult.FAIL
-				print(str(ss_mpd_path)+' does not exist.')
-				print()
-				ss_mpd_path = ''
-		else:
-			ss.test_file_paths[0][0] = ss_path
-			ss.test_file_paths[1][0] = 'folder missing'
-			ss.test_file_paths[2][0] = TestResult.FAIL
-			print('Test stream folder \"'+str(ss_path)+'\" does not exist.')
-			print()
+		family_totals = TestResultTotals()
+		for shard_result in merged_results:
+			family_totals.tally(frame_rate_family, shard_result['result']['file_brand']['expected']) \
+				.add_test_content_json(shard_result['result'])
+		TEST_RESULT_TOTALS.merge(family_totals)
 		
-		if ss_mpd_path == '':
-			return
+		time_of_first_shard = min(shard_results['time_of_analysis'] for shard_results in family_shards)
+		tc_res_filepath = Path(matrix_stem+'_'+frame_rate_family+'_test_results_'+time_of_first_shard+'.json')
+		save_test_results(tc_res_filepath, [(shard_result['name'], shard_result['result']) for shard_result in merged_results])
 		
-		# Extract necessary data from MPD
-		print('Extracting metadata from MPD...')
-		mpd_info = etree.parse(ss_mpd_path)
-		mpd_info_root = mpd_info.getroot()
-		mpd_representations = [element.get("id") for element in mpd_info_root.iter('{*}Representation')]
-		mpd_representations = sorted(mpd_representations, key=lambda x: x.split('/')[2])
+		print_results_summary()
+		print("Test results stored in: " + str(tc_res_filepath))
 		print()
+
+
+def open_work_queue(queue_path):
+	# The work queue is a SQLite database on storage shared by the coordinator and all workers.
+	# Transactions are started explicitly, BEGIN IMMEDIATE takes the database write lock so that a job is claimed once.
+	queue_connection = sqlite3.connect(queue_path, timeout=QUEUE_LOCK_TIMEOUT, isolation_level=None)
+	queue_connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+	queue_connection.execute(
+		'CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, frame_rate_family TEXT, tc_index INTEGER, '
+		'segment_count INTEGER, segment_bytes INTEGER, state TEXT, worker TEXT, lease_expiry REAL, '
+		'attempts INTEGER DEFAULT 0, payload TEXT, result TEXT, log TEXT, error TEXT)')
+	return queue_connection
+
+
+def run_queue_coordinator(queue_path, test_content, tc_vectors_folder):
+	# Enqueue every test stream of every frame rate family, wait for the workers to analyse them,
+	# then save the results of each family as a local run would
+	queue_connection = open_work_queue(queue_path)
+	if queue_connection.execute('SELECT COUNT(*) FROM jobs').fetchone()[0] > 0:
+		sys.exit("Work queue \"" + queue_path + "\" already contains jobs, use a new queue file for each validation.")
+	
+	analysis_batches = []
+	queue_connection.execute('BEGIN IMMEDIATE')
+	queue_connection.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', [
+		('matrix', str(tc_matrix.stem)), ('time_of_analysis', time_of_analysis), ('enqueued', 'false')])
+	for frame_rate_family in TS_LOCATION_FRAME_RATES:
+		analysis_batch = VectorAnalysisBatch(copy.deepcopy(test_content), frame_rate_family)
+		analysis_batches.append(analysis_batch)
+		for tc_index, tc in enumerate(analysis_batch.test_content):
+			if tc.test_stream_id.startswith(TS_SPLICING_ID_MAIN) or tc.test_stream_id.startswith(TS_SPLICING_ID_AD):
+				if not (frame_rate_family == TS_LOCATION_FRAME_RATES_50):
+					# Skip non-25fps-family splicing content (WAVE splicing tests specifically use 25fps-family content)
+					analysis_batch.skipped_tc_index.append(tc)
+					continue
+			segment_count, segment_bytes = find_stream_cost(tc, tc_vectors_folder, frame_rate_family)
+			queue_connection.execute(
+				'INSERT INTO jobs (frame_rate_family, tc_index, segment_count, segment_bytes, state, payload) '
+				'VALUES (?, ?, ?, ?, ?, ?)',
+				(frame_rate_family, tc_index, segment_count, segment_bytes, QUEUE_JOB_QUEUED,
+				 json.dumps(tc, cls=TestContentFullEncoder, ensure_ascii=False)))
+			analysis_batch.uncounted_tc_index.append(tc_index)
+	queue_connection.execute("UPDATE meta SET value = 'true' WHERE key = 'enqueued'")
+	queue_connection.execute('COMMIT')
+	nb_jobs = queue_connection.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+	print("Enqueued " + str(nb_jobs) + " test streams in " + queue_path + ", waiting for workers...")
+	
+	nb_jobs_done = -1
+	while True:
+		job_states = dict(queue_connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+		if job_states.get(QUEUE_JOB_FAILED, 0) > 0:
+			job_error = queue_connection.execute('SELECT frame_rate_family, tc_index, error FROM jobs WHERE state = ?',
+												 (QUEUE_JOB_FAILED,)).fetchone()
+			sys.exit("Analysis of test stream " + str(job_error[1]) + " (" + job_error[0] + ") failed on all attempts:\n"
+					 + job_error[2])
+		if job_states.get(QUEUE_JOB_DONE, 0) != nb_jobs_done:
+			nb_jobs_done = job_states.get(QUEUE_JOB_DONE, 0)
+			print(str(nb_jobs_done) + "/" + str(nb_jobs) + " test streams analysed, "
+				  + str(job_states.get(QUEUE_JOB_LEASED, 0)) + " in progress")
+		if nb_jobs_done == nb_jobs:
+			break
+		time.sleep(QUEUE_POLL_INTERVAL)
+	print()
+	
+	# Merge results back in matrix order
+	for analysis_batch in analysis_batches:
+		for tc_index, result, stream_log in queue_connection.execute(
+				'SELECT tc_index, result, log FROM jobs WHERE frame_rate_family = ? ORDER BY tc_index',
+				(analysis_batch.frame_rate_family,)):
+			print(stream_log, end='')
+			analysis_batch.test_content[tc_index] = test_content_from_json(json.loads(result))
+		complete_analysis_v(analysis_batch)
+	queue_connection.close()
+
+
+def run_queue_worker(queue_path, tc_vectors_folder, debug_folder):
+	# Claim jobs from the work queue until all test streams are analysed. The lease of the claimed job is renewed
+	# while it is analysed; when a worker crashes its lease expires and the job is claimed again by another worker.
+	global tc_matrix
+	global time_of_analysis
+	
+	while not os.path.isfile(queue_path):
+		print("Waiting for work queue " + queue_path + " to be created...")
+		time.sleep(QUEUE_POLL_INTERVAL)
+	queue_connection = open_work_queue(queue_path)
+	worker_id = socket.gethostname() + ':' + str(os.getpid())
+	print("Worker " + worker_id + " analysing test streams from " + queue_path)
+	
+	while True:
+		queue_meta = dict(queue_connection.execute('SELECT key, value FROM meta').fetchall())
+		if queue_meta.get('enqueued') != 'true':
+			time.sleep(QUEUE_POLL_INTERVAL)
+			continue
+		tc_matrix = Path(queue_meta['matrix'])
+		time_of_analysis = queue_meta['time_of_analysis']
 		
-		if len(mpd_representations) != len(ss.test_stream_ids[0]):
-			ss.test_stream_ids[2] = TestResult.FAIL \
-			+ ' (' + str(len(mpd_representations)) \
-			+ ' representations where ' + str(len(ss_test_content.test_stream_ids[0])) + ' expected)'
-		
-		# Check mezzanine version
-		try:
-			ss.mezzanine_version[1] = float(mpd_info_root[0][1].text.split(' ')[2])
-			ss.mezzanine_version[2] = TestResult.PASS \
-				if (ss.mezzanine_version[0] == ss.mezzanine_version[1]) \
-				else TestResult.FAIL
-		except ValueError:
-			ss.mezzanine_version[1] = 'not found where expected in MPD ('+mpd_info_root[0][1].text+')'
-			ss.mezzanine_version[2] = TestResult.UNKNOWN
-			raise
-		
-		# TODO: Check switching set init constraints
-		# Determine applicable use case
-		#
-		# Single initialization:
-		## Check ID presence : urn:mpeg:cmaf:siss
-		# 1) Common CMAF header in all tracks,
-		# containing sample entries sufficient to decode and display every track (i.e. with parameter sets)
-		# + fragments without in-band parameter sets (avc1).
-		#
-		# 2) Common CMAF header in all tracks,
-		# without sample entries (i.e. without parameter sets)
-		# + fragments with in-band parameter sets (avc3).
-		#
-		# 3) Common CMAF header in all tracks, containing sample entries sufficient to decode and display every track
-		# (i.e. with parameter sets)
-		# + fragments with in-band parameter sets (avc3).
-		#
-		# Multiple initialization:
-		#
-		# 4) Different CMAF header per track, containing sample entry sufficient to decode and display the track
-		# (i.e. with parameter sets)
-		# + fragments without in-band parameter sets (avc1).
-		#
-		# 5) Different CMAF header per track, without sample entry (i.e. without parameter sets)
-		# + fragments with in-band parameter sets (avc3).
-		
+		queue_connection.execute('BEGIN IMMEDIATE')
+		# A job whose lease expired on its last attempt, e.g. because it kills the worker analysing it, is not claimed again
+		claim_time = time.time()
+		queue_connection.execute(
+			'UPDATE jobs SET state = ?, error = ? WHERE state = ? AND lease_expiry < ? AND attempts >= ?',
+			(QUEUE_JOB_FAILED, "Lease expired, the worker analysing the test stream stopped responding.",
+			 QUEUE_JOB_LEASED, claim_time, QUEUE_MAX_ATTEMPTS))
+		queue_job = queue_connection.execute(
+			'SELECT id, frame_rate_family, payload FROM jobs '
+			'WHERE state = ? OR (state = ? AND lease_expiry < ? AND attempts < ?) '
+			'ORDER BY segment_count DESC, segment_bytes DESC, id LIMIT 1',
+			(QUEUE_JOB_QUEUED, QUEUE_JOB_LEASED, claim_time, QUEUE_MAX_ATTEMPTS)).fetchone()
+		if queue_job is not None:
+			queue_connection.execute(
+				'UPDATE jobs SET state = ?, worker = ?, lease_expiry = ?, attempts = attempts + 1 WHERE id = ?',
+				(QUEUE_JOB_LEASED, worker_id, time.time() + QUEUE_LEASE, queue_job[0]))
+		queue_connection.execute('COMMIT')
 		
+		if queue_job is None:
+			if queue_connection.execute('SELECT COUNT(*) FROM jobs WHERE state IN (?, ?)',
+										(QUEUE_JOB_QUEUED, QUEUE_JOB_LEASED)).fetchone()[0] == 0:
+				break
+			# Remaining jobs are leased by other workers, wait in case a lease expires
+			time.sleep(QUEUE_POLL_INTERVAL)
+			continue
 		
-		for i, tc_id in enumerate(ss.test_stream_ids[0]):
-			if tc_id == '':
-				ss.test_stream_ids[2][i] = TestResult.UNKNOWN
-			elif 't'+tc_id in mpd_representations[i].split('/'):
-				idx = mpd_representations[i].split('/').index('t'+tc_id)
-				ss.test_stream_ids[1][i] = mpd_representations[i].split('/')[idx][1:]
-				ss.test_stream_ids[2][i] = TestResult.PASS
-			else:
-				ss.test_stream_ids[2][i] = TestResult.FAIL
+		job_id, frame_rate_family, payload = queue_job
+		tc = test_content_from_json(json.loads(payload))
+		lease_renewal_stop = threading.Event()
+		lease_renewal = threading.Thread(target=renew_queue_lease,
+										 args=(queue_path, job_id, worker_id, lease_renewal_stop), daemon=True)
+		lease_renewal.start()
+		stream_log = io.StringIO()
+		try:
+			with contextlib.redirect_stdout(stream_log):
+				if find_test_stream(tc, tc_vectors_folder, frame_rate_family):
+					if CONFORMANCE_TOOL_DOCKER_CONTAINER_ID != '':
+						tc.conformance_test_result = run_conformance_tool(tc.test_file_path)
+						print("DASH conformance test result: " + tc.conformance_test_result['verdict'])
+					analyse_stream(tc, frame_rate_family, debug_folder)
+		except Exception:
+			print(stream_log.getvalue(), end='')
+			job_error = traceback.format_exc()
+			print(job_error)
+			lease_renewal_stop.set()
+			lease_renewal.join()
+			# Give the job to another attempt unless it failed too many times already
+			queue_connection.execute(
+				'UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ? WHERE id = ? AND worker = ?',
+				(QUEUE_MAX_ATTEMPTS, QUEUE_JOB_FAILED, QUEUE_JOB_QUEUED, job_error, job_id, worker_id))
+			continue
+		lease_renewal_stop.set()
+		lease_renewal.join()
+		print(stream_log.getvalue(), end='')
+		# Only the worker holding the lease stores its result, a worker whose lease expired lost the job
+		queue_connection.execute('UPDATE jobs SET state = ?, result = ?, log = ? WHERE id = ? AND worker = ? AND state = ?',
+								 (QUEUE_JOB_DONE, json.dumps(tc, cls=TestContentFullEncoder, ensure_ascii=False), stream_log.getvalue(), job_id, worker_id, QUEUE_JOB_LEASED))
+	
+	queue_connection.close()
+	print("No test streams left to analyse in " + queue_path)
+
+
+def renew_queue_lease(queue_path, job_id, worker_id, lease_renewal_stop):
+	# Own connection, SQLite connections are not shared between threads
+	queue_connection = open_work_queue(queue_path)
+	while not lease_renewal_stop.wait(QUEUE_LEASE / 3):
+		queue_connection.execute('UPDATE jobs SET lease_expiry = ? WHERE id = ? AND worker = ? AND state = ?',
+								 (time.time() + QUEUE_LEASE, job_id, worker_id, QUEUE_JOB_LEASED))
+	queue_connection.close()
+
+
+def check_and_analyse_ss(ss_test_content, test_content, tc_vectors_folder, frame_rate_family):
+	if frame_rate_family not in [TS_LOCATION_FRAME_RATES_50, TS_LOCATION_FRAME_RATES_59_94, TS_LOCATION_FRAME_RATES_60]:
+		return
+	
+	ss_mpd_path = ''
+	ss_totals = TestResultTotals()
+	# The switching sets counted so far are added to the totals even when the checks stop early
+	try:
+		for ss in ss_test_content:
+			# Print switching set id
+			print('## Testing ' + ss.switching_set_id)
+			ss_codec = 'unknown'
+			for tc in test_content:
+				if tc.test_stream_id == ss.test_stream_ids[0][0]:
+					ss_codec = cmaf_brand_codecs.get(tc.file_brand[0], 'unknown')
 			
-			test_stream_dir = Path(str(tc_vectors_folder) + sep + mpd_representations[i] + sep)
-			ss.test_file_paths[0][i] = str(test_stream_dir)
-			print("Expected test stream folder based on MPD: ")
-			print(str(test_stream_dir))
+			if ss_codec == 'avc':
+				ss_path = str(Path(
+					str(tc_vectors_folder) + sep + SS_LOCATION + sep + frame_rate_family + sep + ss.switching_set_id))
+			elif ss_codec == 'hevc':
+				ss_path = str(Path(
+					str(tc_vectors_folder) + sep + SS_LOCATION + sep + frame_rate_family + sep + ss.switching_set_id))
+			else:
+				return
 			
-			if os.path.isdir(test_stream_dir):
-				print("Found test stream folder \"" + str(test_stream_dir) + "\"...")
-				date_dirs = next(os.walk(str(test_stream_dir)))[1]
+			if os.path.isdir(ss_path):
+				print("Found test stream folder \""+str(ss_path)+"\"...")
+				date_dirs = next(os.walk(str(ss_path)))[1]
 				if len(date_dirs) > 0:
 					date_dirs.sort()
-					most_recent_date = date_dirs[len(date_dirs) - 1]
+					most_recent_date = date_dirs[len(date_dirs)-1]
 				else:
-					ss.test_file_paths[1][i] = 'release (YYYY-MM-DD) folder missing'
-					ss.test_file_paths[2][i] = TestResult.FAIL
-					print('No test streams releases found for ' + 't' + tc_id + '.')
+					ss.test_file_paths[0][0] = ss_path
+					ss.test_file_paths[1][0] = 'release (YYYY-MM-DD) folder missing'
+					ss.test_file_paths[2][0] = TestResult.FAIL
+					print('No MPD releases found for '+ss.switching_set_id+'.')
 					print()
 					continue
-				test_stream_date_dir = Path(str(test_stream_dir) + sep + most_recent_date + sep)
+				test_stream_date_dir = Path(str(ss_path)+sep+most_recent_date+sep)
 				if os.path.isdir(test_stream_date_dir):
-					print(str(test_stream_date_dir) + ' OK')
+					print(str(test_stream_date_dir)+' OK')
 				else:
-					ss.test_file_paths[1][i] = 'release (YYYY-MM-DD) folder missing'
-					ss.test_file_paths[2][i] = TestResult.FAIL
-					print('Test stream folder \"' + str(test_stream_date_dir) + '\" does not exist.')
+					ss.test_file_paths[0][0] = test_stream_date_dir
+					ss.test_file_paths[1][0] = 'release (YYYY-MM-DD) folder missing'
+					ss.test_file_paths[2][0] = TestResult.FAIL
+					print('Test stream folder \"'+str(test_stream_date_dir)+'\" does not exist.')
 					print()
 					continue
-				test_stream_path = Path(str(test_stream_date_dir) + sep + TS_MPD_NAME)
-				if os.path.isfile(test_stream_path):
-					print(str(test_stream_path) + ' OK')
-					ss.test_file_paths[1][i] = str(test_stream_path)
+				ss_mpd_path = Path(str(test_stream_date_dir)+sep+TS_MPD_NAME)
+				if os.path.isfile(ss_mpd_path):
+					print(str(ss_mpd_path)+' OK')
+					ss.test_file_paths[0][0] = str(ss_mpd_path)
+					ss.test_file_paths[1][0] = str(ss_mpd_path)
+					ss.test_file_paths[2][0] = TestResult.PASS
 				else:
-					ss.test_file_paths[1][i] = TS_MPD_NAME + ' file missing'
-					ss.test_file_paths[2][i] = TestResult.FAIL
-					print(str(test_stream_path) + ' does not exist.')
+					ss.test_file_paths[0][0] = ss_mpd_path
+					ss.test_file_paths[1][0] = TS_MPD_NAME+' file missing'
+					ss.test_file_paths[2][0] = TestResult.FAIL
+					print(str(ss_mpd_path)+' does not exist.')
 					print()
-					continue
-				test_stream_path = Path(str(test_stream_date_dir) + sep + '1' + sep + TS_INIT_SEGMENT_NAME)
-				if os.path.isfile(test_stream_path):
-					print(str(test_stream_path) + ' OK')
+					ss_mpd_path = ''
+			else:
+				ss.test_file_paths[0][0] = ss_path
+				ss.test_file_paths[1][0] = 'folder missing'
+				ss.test_file_paths[2][0] = TestResult.FAIL
+				print('Test stream folder \"'+str(ss_path)+'\" does not exist.')
+				print()
+			
+			if ss_mpd_path == '':
+				return
+			
+			# Extract necessary data from MPD
+			print('Extracting metadata from MPD...')
+			mpd_info = etree.parse(ss_mpd_path)
+			mpd_info_root = mpd_info.getroot()
+			mpd_representations = [element.get("id") for element in mpd_info_root.iter('{*}Representation')]
+			mpd_representations = sorted(mpd_representations, key=lambda x: x.split('/')[2])
+			print()
+			
+			if len(mpd_representations) != len(ss.test_stream_ids[0]):
+				ss.test_stream_ids[2] = TestResult.FAIL \
+				+ ' (' + str(len(mpd_representations)) \
+				+ ' representations where ' + str(len(ss_test_content.test_stream_ids[0])) + ' expected)'
+			
+			# Check mezzanine version
+			try:
+				ss.mezzanine_version[1] = float(mpd_info_root[0][1].text.split(' ')[2])
+				ss.mezzanine_version[2] = TestResult.PASS \
+					if (ss.mezzanine_version[0] == ss.mezzanine_version[1]) \
+					else TestResult.FAIL
+			except ValueError:
+				ss.mezzanine_version[1] = 'not found where expected in MPD ('+mpd_info_root[0][1].text+')'
+				ss.mezzanine_version[2] = TestResult.UNKNOWN
+				raise
+			
+			# TODO: Check switching set init constraints
+			# Determine applicable use case
+			#
+			# Single initialization:
+			## Check ID presence : urn:mpeg:cmaf:siss
+			# 1) Common CMAF header in all tracks,
+			# containing sample entries sufficient to decode and display every track (i.e. with parameter sets)
+			# + fragments without in-band parameter sets (avc1).
+			#
+			# 2) Common CMAF header in all tracks,
+			# without sample entries (i.e. without parameter sets)
+			# + fragments with in-band parameter sets (avc3).
+			#
+			# 3) Common CMAF header in all tracks, containing sample entries sufficient to decode and display every track
+			# (i.e. with parameter sets)
+			# + fragments with in-band parameter sets (avc3).
+			#
+			# Multiple initialization:
+			#
+			# 4) Different CMAF header per track, containing sample entry sufficient to decode and display the track
+			# (i.e. with parameter sets)
+			# + fragments without in-band parameter sets (avc1).
+			#
+			# 5) Different CMAF header per track, without sample entry (i.e. without parameter sets)
+			# + fragments with in-band parameter sets (avc3).
+			
+			
+			
+			for i, tc_id in enumerate(ss.test_stream_ids[0]):
+				if tc_id == '':
+					ss.test_stream_ids[2][i] = TestResult.UNKNOWN
+				elif 't'+tc_id in mpd_representations[i].split('/'):
+					idx = mpd_representations[i].split('/').index('t'+tc_id)
+					ss.test_stream_ids[1][i] = mpd_representations[i].split('/')[idx][1:]
+					ss.test_stream_ids[2][i] = TestResult.PASS
 				else:
-					ss.test_file_paths[1][i] = TS_INIT_SEGMENT_NAME + ' file missing'
-					ss.test_file_paths[2][i] = TestResult.FAIL
-					print(str(test_stream_path) + ' does not exist.')
-					print()
-					continue
-				test_stream_path = Path(str(test_stream_date_dir) + sep + '1' + sep + TS_FIRST_SEGMENT_NAME)
-				if os.path.isfile(test_stream_path):
-					print(str(test_stream_path) + " OK")
-					print()
-					ss.test_file_paths[1][i] = str(test_stream_date_dir)
-					if ss.test_file_paths[0][i] == ss.test_file_paths[1][i]:
-						ss.test_file_paths[2][i] = TestResult.PASS
+					ss.test_stream_ids[2][i] = TestResult.FAIL
+				
+				test_stream_dir = Path(str(tc_vectors_folder) + sep + mpd_representations[i] + sep)
+				ss.test_file_paths[0][i] = str(test_stream_dir)
+				print("Expected test stream folder based on MPD: ")
+				print(str(test_stream_dir))
+				
+				if os.path.isdir(test_stream_dir):
+					print("Found test stream folder \"" + str(test_stream_dir) + "\"...")
+					date_dirs = next(os.walk(str(test_stream_dir)))[1]
+					if len(date_dirs) > 0:
+						date_dirs.sort()
+						most_recent_date = date_dirs[len(date_dirs) - 1]
 					else:
+						ss.test_file_paths[1][i] = 'release (YYYY-MM-DD) folder missing'
 						ss.test_file_paths[2][i] = TestResult.FAIL
-						print('Incorrect test stream path.')
+						print('No test streams releases found for ' + 't' + tc_id + '.')
 						print()
+						continue
+					test_stream_date_dir = Path(str(test_stream_dir) + sep + most_recent_date + sep)
+					if os.path.isdir(test_stream_date_dir):
+						print(str(test_stream_date_dir) + ' OK')
+					else:
+						ss.test_file_paths[1][i] = 'release (YYYY-MM-DD) folder missing'
+						ss.test_file_paths[2][i] = TestResult.FAIL
+						print('Test stream folder \"' + str(test_stream_date_dir) + '\" does not exist.')
+						print()
+						continue
+					test_stream_path = Path(str(test_stream_date_dir) + sep + TS_MPD_NAME)
+					if os.path.isfile(test_stream_path):
+						print(str(test_stream_path) + ' OK')
+						ss.test_file_paths[1][i] = str(test_stream_path)
+					else:
+						ss.test_file_paths[1][i] = TS_MPD_NAME + ' file missing'
+						ss.test_file_paths[2][i] = TestResult.FAIL
+						print(str(test_stream_path) + ' does not exist.')
+						print()
+						continue
+					test_stream_path = Path(str(test_stream_date_dir) + sep + '1' + sep + TS_INIT_SEGMENT_NAME)
+					if os.path.isfile(test_stream_path):
+						print(str(test_stream_path) + ' OK')
+					else:
+						ss.test_file_paths[1][i] = TS_INIT_SEGMENT_NAME + ' file missing'
+						ss.test_file_paths[2][i] = TestResult.FAIL
+						print(str(test_stream_path) + ' does not exist.')
+						print()
+						continue
+					test_stream_path = Path(str(test_stream_date_dir) + sep + '1' + sep + TS_FIRST_SEGMENT_NAME)
+					if os.path.isfile(test_stream_path):
+						print(str(test_stream_path) + " OK")
+						print()
+						ss.test_file_paths[1][i] = str(test_stream_date_dir)
+						if ss.test_file_paths[0][i] == ss.test_file_paths[1][i]:
+							ss.test_file_paths[2][i] = TestResult.PASS
+						else:
+							ss.test_file_paths[2][i] = TestResult.FAIL
+							print('Incorrect test stream path.')
+							print()
+					else:
+						ss.test_file_paths[1][i] = TS_FIRST_SEGMENT_NAME + ' file missing'
+						ss.test_file_paths[2][i] = TestResult.FAIL
+						print(str(test_stream_path) + ' does not exist.')
+						print()
+						continue
 				else:
-					ss.test_file_paths[1][i] = TS_FIRST_SEGMENT_NAME + ' file missing'
+					ss.test_file_paths[1][i] = 'folder missing'
 					ss.test_file_paths[2][i] = TestResult.FAIL
-					print(str(test_stream_path) + ' does not exist.')
+					print('Test stream folder \"' + str(test_stream_dir) + '\" does not exist.')
 					print()
-					continue
-			else:
-				ss.test_file_paths[1][i] = 'folder missing'
-				ss.test_file_paths[2][i] = TestResult.FAIL
-				print('Test stream folder \"' + str(test_stream_dir) + '\" does not exist.')
-				print()
-		
-		# TODO: Perform conformance test
-		
-		# Count results
-		if ss.conformance_test_result != '':
-			if ss.conformance_test_result['verdict'] == 'PASS':
-				TS_CONFORMANCE_TOTAL_PASS += 1
-			elif ss.conformance_test_result['verdict'] == 'FAIL':
-				TS_CONFORMANCE_TOTAL_FAIL += 1
-			else:
-				TS_CONFORMANCE_TOTAL_UNKNOWN += 1
-		else:
-			TS_CONFORMANCE_TOTAL_UNKNOWN += 1
-		for a, v in ss.__dict__.items():
-			if len(v) == 3:
-				if isinstance(v[0], list):
-					for i in range(0, len(v[0])):
-						if v[2][i] == TestResult.PASS:
-							TS_RESULTS_TOTAL_PASS += 1
-		
-						elif v[2][i] == TestResult.FAIL:
-							TS_RESULTS_TOTAL_FAIL += 1
-		
-						elif v[2][i] == TestResult.NOT_TESTED:
-							TS_RESULTS_TOTAL_NOT_TESTED += 1
-		
-						elif v[2][i] == TestResult.NOT_TESTABLE:
-							TS_RESULTS_TOTAL_NOT_TESTABLE += 1
-		
-						elif v[2][i] == TestResult.NOT_APPLICABLE:
-							TS_RESULTS_TOTAL_NOT_APPLICABLE += 1
-				else:
-					if v[2] == TestResult.PASS:
-						TS_RESULTS_TOTAL_PASS += 1
-					
-					elif v[2] == TestResult.FAIL:
-						TS_RESULTS_TOTAL_FAIL += 1
-					
-					elif v[2] == TestResult.NOT_TESTED:
-						TS_RESULTS_TOTAL_NOT_TESTED += 1
-					
-					elif v[2] == TestResult.NOT_TESTABLE:
-						TS_RESULTS_TOTAL_NOT_TESTABLE += 1
-					
-					elif v[2] == TestResult.NOT_APPLICABLE:
-						TS_RESULTS_TOTAL_NOT_APPLICABLE += 1
+			
+			# TODO: Perform conformance test
+			
+			# Count results
+			ss_totals.tally(frame_rate_family, TS_SWITCHING_SET_BRAND).add_switching_set(ss)
+	finally:
+		TEST_RESULT_TOTALS.merge(ss_totals)
 
 
 	# Save metadata to JSON file
@@ -1088,64 +1807,68 @@ def check_and_analyse_ss(ss_test_content, test_content, tc_vectors_folder, frame
 	#tc_res_file.write('\n')
 	#tc_res_file.close()
 
-	print("### SUMMARY OF TEST RESULTS:")
-	print("#  ")
-	print("#  DASH conformance check using https://github.com/Dash-Industry-Forum/DASH-IF-Conformance")
-	print("#  CLI: php Process_cli.php --cmaf --ctawave --segments <MPD location>")
-	print("#  - Total Conformance PASS: " + str(TS_CONFORMANCE_TOTAL_PASS))
-	print("#  - Total Conformance FAIL: " + str(TS_CONFORMANCE_TOTAL_FAIL))
-	print("#  - Total Conformance UNKNOWN: " + str(TS_CONFORMANCE_TOTAL_UNKNOWN))
-	print("#  ")
-	print("#  WAVE test content definition conformance check:")
-	print("#  - Total PASS: " + str(TS_RESULTS_TOTAL_PASS))
-	print("#  - Total FAIL: " + str(TS_RESULTS_TOTAL_FAIL))
-	print("#  - Total NOT TESTED: " + str(TS_RESULTS_TOTAL_NOT_TESTED))
-	print("#  - Total NOT TESTABLE: " + str(TS_RESULTS_TOTAL_NOT_TESTABLE))
-	print("#  - Total NOT APPLICABLE: " + str(TS_RESULTS_TOTAL_NOT_APPLICABLE))
-	print()
-
+	print_results_summary()
 	print("Test results stored in: " + str(tc_res_filepath))
 	print()
 	
 
+def run_conformance_tool(test_file_path):
+	# Run DASH conformance tool
+	# Example using local server:
+	# docker exec -w /var/www/html/Utils/ 164bd9ff5c45 php Process_cli.php --cmaf --ctawave --segments
+	# http://127.0.0.1:9090/vectors/development/cfhd_sets/15_30_60/t1/2022-10-17/stream.mpd
+	
+	# Determine HTTP location of MPD based on file path
+	conformance_http_location = 'http://'+local_ip+':'+str(PORT)+str(Path(test_file_path+sep+TS_MPD_NAME))[len(HTTPD_PATH):].replace('\\', '/')
+	
+	ct_cli = ['docker', 'exec', '-w', '/var/www/html/Utils/', CONFORMANCE_TOOL_DOCKER_CONTAINER_ID,
+		 'php', 'Process_cli.php', '--cmaf', '--ctawave', '--segments', conformance_http_location]
+	if sys.platform == "win32":
+		ct_cli.insert(0, 'wsl')
+	conformance_tool_output = subprocess.check_output(ct_cli)
+	
+	json_conformance_tool_output = json.loads(conformance_tool_output)
+	
+	# Anonymize IP in results
+	json_conformance_tool_output['source'] = \
+		json_conformance_tool_output['source'].replace(json_conformance_tool_output['source'][:json_conformance_tool_output['source'].find(":",5)],'http://localhost')
+	
+	# Fix newline characters
+	json_conformance_tool_output['entries']['SEGMENT_VALIDATION']['MP4BoxValidator']['test'][0]['messages'][0] \
+		= json_conformance_tool_output['entries']['SEGMENT_VALIDATION']['MP4BoxValidator']['test'][0]['messages'][0].replace('\r','\n')
+	return json_conformance_tool_output
+
+
 def analyse_stream(test_content, frame_rate_family, debug_folder):
 	# Print test content id
 	print('## Testing '+test_content.test_stream_id)
 	
-	if CONFORMANCE_TOOL_DOCKER_CONTAINER_ID != '':
-		# Run DASH conformance tool
-		# Example using local server:
-		# docker exec -w /var/www/html/Utils/ 164bd9ff5c45 php Process_cli.php --cmaf --ctawave --segments
-		# http://127.0.0.1:9090/vectors/development/cfhd_sets/15_30_60/t1/2022-10-17/stream.mpd
-		
-		# Determine HTTP location of MPD based on file path
-		conformance_http_location = 'http://'+local_ip+':'+str(PORT)+str(Path(test_content.test_file_path+sep+TS_MPD_NAME))[len(HTTPD_PATH):].replace('\\', '/')
-		
-		print('Run DASH conformance tool: '+conformance_http_location)
-		ct_cli = ['docker', 'exec', '-w', '/var/www/html/Utils/', CONFORMANCE_TOOL_DOCKER_CONTAINER_ID,
-			 'php', 'Process_cli.php', '--cmaf', '--ctawave', '--segments', conformance_http_location]
-		if sys.platform == "win32":
-			ct_cli.insert(0, 'wsl')
-		conformance_tool_output = subprocess.check_output(ct_cli)
-		
-		json_conformance_tool_output = json.loads(conformance_tool_output)
-		
-		# Anonymize IP in results
-		json_conformance_tool_output['source'] = \
-			json_conformance_tool_output['source'].replace(json_conformance_tool_output['source'][:json_conformance_tool_output['source'].find(":",5)],'http://localhost')
-		
-		# Fix newline characters
-		json_conformance_tool_output['entries']['SEGMENT_VALIDATION']['MP4BoxValidator']['test'][0]['messages'][0] \
-			= json_conformance_tool_output['entries']['SEGMENT_VALIDATION']['MP4BoxValidator']['test'][0]['messages'][0].replace('\r','\n')
-		test_content.conformance_test_result = json_conformance_tool_output
-		print("DASH conformance test result: "+json_conformance_tool_output['verdict'])
+	# Start ffmpeg (and ffprobe with --timingparser ffprobe) over the full stream, then run ffprobe and MP4Box with
+	# --boxparser mp4box on the segments concurrently with them. The checks start once the segment tools completed
+	# and read the ffmpeg output, drained from its pipe by a thread, while it still runs.
+	seg_files = list_segment_files(test_content)
+	stream_processes = start_stream_processes(test_content)
+	try:
+		init_segment_info = asyncio.run(run_stream_tools(test_content, frame_rate_family, seg_files))
+		check_stream(test_content, frame_rate_family, seg_files, init_segment_info, debug_folder != '', stream_processes)
+	finally:
+		stream_processes.kill()
+	finish_stream_logs(test_content, frame_rate_family, debug_folder, seg_files)
+
+
+def list_segment_files(test_content):
+	return sorted(os.listdir(str(Path(test_content.test_file_path + sep + '1' + sep))), key=len)
+
+
+def check_stream(test_content, frame_rate_family, seg_files, init_segment_info, save_trace_headers=False,
+				 stream_processes=None):
+	trace_headers_filepath = trace_headers_filename(test_content, frame_rate_family)
+	# ffmpeg and ffprobe are started here when the caller did not start them already
+	if stream_processes is None:
+		stream_processes = start_stream_processes(test_content, init_segment_info.codec_name)
 	
-	# Read initial properties using ffprobe: codec name, sample entry / FourCC, resolution
-	source_videoproperties = subprocess.check_output(
-		['ffprobe', '-i', str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME)),
-		'-show_streams', '-select_streams', 'v', '-loglevel', '0', '-print_format', 'json'])
-	source_videoproperties_json = json.loads(source_videoproperties)
-	test_content.codec_name[1] = codec_names.get(source_videoproperties_json['streams'][0]['codec_name'], source_videoproperties_json['streams'][0]['codec_name'])
+	# Initial properties read from the init segment: codec name, sample entry / FourCC, resolution
+	test_content.codec_name[1] = codec_names.get(init_segment_info.codec_name, init_segment_info.codec_name)
 	if test_content.codec_name[0] == '':
 		test_content.codec_name[2] = TestResult.UNKNOWN
 	else:
@@ -1154,17 +1877,17 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 			else TestResult.FAIL
 	print('Codec = '+test_content.codec_name[1])
 	
-	test_content.sample_entry_type[1] = source_videoproperties_json['streams'][0]['codec_tag_string']
+	test_content.sample_entry_type[1] = init_segment_info.sample_entry_type
 	if test_content.sample_entry_type[0] == '':
 		test_content.sample_entry_type[2] = TestResult.UNKNOWN
 	else:
 		test_content.sample_entry_type[2] = TestResult.PASS \
 			if (test_content.sample_entry_type[0].lower() == test_content.sample_entry_type[1].lower()) \
 			else TestResult.FAIL
-	print('Sample Entry Type = '+source_videoproperties_json['streams'][0]['codec_tag_string'])
+	print('Sample Entry Type = '+init_segment_info.sample_entry_type)
 	
-	test_content.resolution[1].horizontal = source_videoproperties_json['streams'][0]['width']
-	test_content.resolution[1].vertical = source_videoproperties_json['streams'][0]['height']
+	test_content.resolution[1].horizontal = init_segment_info.width
+	test_content.resolution[1].vertical = init_segment_info.height
 	if test_content.resolution[0].horizontal == 0 or test_content.resolution[0].vertical == 0:
 		test_content.resolution[2] = TestResult.UNKNOWN
 	else:
@@ -1173,631 +1896,84 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 				and test_content.resolution[0].vertical == test_content.resolution[1].vertical) \
 			else TestResult.FAIL
 	print('Resolution = '
-		+ str(source_videoproperties_json['streams'][0]['width'])
-		+ 'x' + str(source_videoproperties_json['streams'][0]['height']))
-	
-	# Read detailed properties using ffmpeg
-	ffmpeg_cl = ['ffmpeg',
-		'-i', str(Path(test_content.test_file_path+sep+TS_MPD_NAME)),
-		'-c', 'copy',
-		'-bsf:v', 'trace_headers',
-		'-f', 'null', '-']
-	
-	print('Running ffmpeg trace_headers on full stream...')
-	with open(str(Path(str(tc_matrix.stem)+'_trace_headers_init_'+time_of_analysis+'.txt')), "w") as report_file:
-		subprocess.run(ffmpeg_cl, stderr=report_file)
-	report_file.close()
+		+ str(init_segment_info.width)
+		+ 'x' + str(init_segment_info.height))
 	
+	# Read detailed properties from ffmpeg trace_headers output
 	# Init variables for temp data from file
-	file_vui_timing_num_units_in_tick = 0
-	file_vui_timing_time_scale = 0
 	file_frame_rate = ''
-	file_duration = ''
-	file_codec_profile = ''
-	file_codec_tier = ''
-	file_codec_level = ''
 	file_chunks_per_fragment = 0
 	h264_detected = False
 	h265_detected = False
-	sps_detected = False
-	sps_processed = False
+	video_detected = False  # Any codec, the headers of other codecs than h264 and hevc are only read natively
 	file_sps_count = 0
 	file_pps_count = 0
-	vui_detected = False
-	sei_detected = False
-	pic_timing_sei_detected = False
-	aspect_ratio_info_detected = False
-	sar = 0
-	sar_width = 0
-	sar_height = 0
-	colour_description_detected = False
-	colour_primaries = 0
-	matrix_coeffs = 0
-	sei_content_light_level_max_cll = None
-	sei_content_light_level_max_fall = None
-	sei_display_mastering_px0 = None
-	sei_display_mastering_py0 = None
-	sei_display_mastering_px1 = None
-	sei_display_mastering_py1 = None
-	sei_display_mastering_px2 = None
-	sei_display_mastering_py2 = None
-	sei_display_mastering_wpx = None
-	sei_display_mastering_wpy = None
-	sei_display_mastering_max_lum = None
-	sei_display_mastering_min_lum = None
-	last_nal_unit_type = 0
 	nal_slice_types = []
 
-	# Open ffmpeg trace_headers output for analysis
+	# Read the SPS and VUI fields natively, the ffmpeg trace_headers log is then not checked for them
+	codec_analyser = None
+	if init_segment_info.codec_name in codec_analysers:
+		codec_analyser = codec_analysers[init_segment_info.codec_name](init_segment_info)
+	video_header_info = None
+	if HEADER_PARSER == HEADER_PARSER_NATIVE and codec_analyser is not None:
+		video_header_info = codec_analyser.read_video_header_info(test_content, seg_files)
+	# Parameter sets and frame types are read natively from the samples, not from the ffmpeg trace_headers log
+	scan_samples = native_header_codec(init_segment_info.codec_name)
+	file_stream_frame_types = Counter()
+	file_first_fragment_frame_types = None
+	sei_info = SeiInfo(codec_analyser.sei_payload_types if codec_analyser is not None else [], video_header_info)
+	# Otherwise the SPS, VUI, SEI and slice header fields are read from the ffmpeg trace_headers log
+	trace_headers_parser = None
+	if not scan_samples and init_segment_info.codec_name in trace_headers_parsers:
+		trace_headers_parser = trace_headers_parsers[init_segment_info.codec_name](init_segment_info.codec_name, sei_info)
+	
+	# With --timingparser ffprobe, the frame rate, bitrate and duration are computed from the packets of the stream
+	if stream_processes.stream_timing is not None:
+		stream_timing_info = stream_processes.stream_timing.result()
+		if stream_timing_info.frame_count > 0 and stream_timing_info.duration() > 0:
+			video_detected = True
+			h264_detected = init_segment_info.codec_name == 'h264'
+			h265_detected = init_segment_info.codec_name == 'hevc'
+			file_frame_rate = check_stream_timing(test_content, frame_rate_family, stream_timing_info)
+	
+	# Read the ffmpeg trace_headers output while it runs, as the drain thread reads it from the stderr pipe. Only the
+	# last lines are kept for error reporting. It is also written to a file when the logs are saved with --debug. ffmpeg is not needed when
+	# the headers are decoded natively and the timing comes from ffprobe.
 	ffmpeg_trace_headers_error = False
-	ffmpeg_trace_headers_error_text = []
-	headers_trace_file = open(str(Path(str(tc_matrix.stem)+'_trace_headers_init_'+time_of_analysis+'.txt')), encoding="utf-8")
-	headers_trace = headers_trace_file.readlines()
-	print('Checking ffmpeg trace_headers log...')
-	nb_lines = len(headers_trace)
-	fth_last_lines = collections.deque(''*2, 2)
-	for n, line in enumerate(headers_trace):
-		if h264_detected:
-			# Tier is not applicable
-			test_content.codec_tier[2] = TestResult.NOT_APPLICABLE
-			# Preferred transfer characteristics SEI s not applicable
-			test_content.sei_pref_transfer_characteristics[2] = TestResult.NOT_APPLICABLE
-			# Mastering Display Colour Volume SEI s not applicable
-			test_content.sei_mastering_display_colour_vol[2] = TestResult.NOT_APPLICABLE
-			# Content Light Level Information SEI s not applicable
-			test_content.sei_content_light_level[2] = TestResult.NOT_APPLICABLE
-			
-			if sps_detected and not sps_processed:
-				if line.__contains__(' profile_idc '):
-					file_codec_profile = line.split(' = ')[1][:-1]
-					test_content.codec_profile[1] = h264_profile.get(file_codec_profile, '')
-					if test_content.codec_profile[0] == '':
-						test_content.codec_profile[2] = TestResult.UNKNOWN
-					else:
-						test_content.codec_profile[2] = TestResult.PASS \
-							if (test_content.codec_profile[0].lower() == test_content.codec_profile[1].lower()) \
-							else TestResult.FAIL
-					print('Profile = '+test_content.codec_profile[1])
-					continue
-					
-				if line.__contains__(' level_idc '):
-					file_codec_level = line.split(' = ')[1][:-1]
-					test_content.codec_level[1] = str(eval(file_codec_level+"/10"))
-					if test_content.codec_level[0] == '':
-						test_content.codec_level[2] = TestResult.UNKNOWN
-					else:
-						test_content.codec_level[2] = TestResult.PASS \
-							if (float(test_content.codec_level[0]) == float(test_content.codec_level[1])) \
-							else TestResult.FAIL
-					print('Level = '+test_content.codec_level[1])
-					continue
-					
-				if not vui_detected and line.__contains__(' vui_parameters_present_flag ') and line.endswith('= 1\n'):
-					vui_detected = True
-					print('VUI present')
-					continue
-				if vui_detected:
-					if line.__contains__(' aspect_ratio_info_present_flag '):
-						if int(line.split(' = ')[1]) == 1:
-							aspect_ratio_info_detected = True
-							print('Aspect ratio info present')
-						continue
-					if aspect_ratio_info_detected:
-						if line.__contains__(' aspect_ratio_idc '):
-							sar = int(line.split(' = ')[1])
-							if sar != 255:
-								test_content.pixel_aspect_ratio[1] = sar_values.get(sar, 0)
-								if sar == 0 and test_content.pixel_aspect_ratio[0] == '':
-									test_content.pixel_aspect_ratio[2] = TestResult.NOT_APPLICABLE
-								else:
-									# When defined in the bitstream, default 1:1 SAR expected unless otherwise defined in test expected results
-									if test_content.pixel_aspect_ratio[0] == '':
-										test_content.pixel_aspect_ratio[0] = C_DEFAULT_SAR
-									test_content.pixel_aspect_ratio[2] = TestResult.PASS \
-										if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
-										eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
-										else TestResult.FAIL
-							continue
-						if sar == 255 and line.__contains__(' sar_width '):
-							sar_width = int(line.split(' = ')[1])
-							if sar_height != 0:
-								test_content.pixel_aspect_ratio[1] = str(sar_width) + ":" + str(sar_height)
-								test_content.pixel_aspect_ratio[2] = TestResult.PASS \
-									if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
-									eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
-									else TestResult.FAIL
-							continue
-						if sar == 255 and line.__contains__(' sar_height '):
-							sar_height = int(line.split(' = ')[1])
-							if sar_width != 0:
-								test_content.pixel_aspect_ratio[1] = str(sar_width) + ":" + str(sar_height)
-								test_content.pixel_aspect_ratio[2] = TestResult.PASS \
-									if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
-									eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
-									else TestResult.FAIL
-							continue
-					
-					if line.__contains__(' colour_description_present_flag '):
-						if int(line.split(' = ')[1]) == 1:
-							colour_description_detected = True
-							print('Colour primaries, transfer characteristics, and matrix coeffs present')
-						continue
-					if colour_description_detected:
-						if line.__contains__(' colour_primaries '):
-							colour_primaries = int(line.split(' = ')[1])
-							test_content.vui_primaries_mcoeffs[1] = colour_primaries
-							# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
-							if test_content.vui_primaries_mcoeffs[0] == '':
-								test_content.vui_primaries_mcoeffs[0] = C_DEFAULT_VUI_PRIMARIES_MCOEFFS
-							if matrix_coeffs != 0:
-								if colour_primaries != matrix_coeffs:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.FAIL
-								else:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.PASS \
-										if test_content.vui_primaries_mcoeffs[0] == test_content.vui_primaries_mcoeffs[1] \
-										else TestResult.FAIL
-							continue
-						if line.__contains__(' matrix_coefficients '):
-							matrix_coeffs = int(line.split(' = ')[1])
-							test_content.vui_primaries_mcoeffs[1] = matrix_coeffs
-							# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
-							if test_content.vui_primaries_mcoeffs[0] == '':
-								test_content.vui_primaries_mcoeffs[0] = C_DEFAULT_VUI_PRIMARIES_MCOEFFS
-							if colour_primaries != 0:
-								if matrix_coeffs != colour_primaries:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.FAIL
-								else:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.PASS \
-										if test_content.vui_primaries_mcoeffs[0] == test_content.vui_primaries_mcoeffs[1] \
-										else TestResult.FAIL
-							continue
-						if line.__contains__(' transfer_characteristics '):
-							test_content.vui_transfer_characteristics[1] = int(line.split(' = ')[1])
-							# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
-							if test_content.vui_transfer_characteristics[0] == '':
-								test_content.vui_transfer_characteristics[0] = C_DEFAULT_VUI_TRANSFER_CHARACTERISTICS
-							test_content.vui_transfer_characteristics[2] = TestResult.PASS \
-								if test_content.vui_transfer_characteristics[0] == test_content.vui_transfer_characteristics[1] \
-								else TestResult.FAIL
-							continue
-					
-					if line.__contains__(' timing_info_present_flag ') and line.endswith('= 1\n'):
-						test_content.vui_timing_present[1] = True
-						if test_content.vui_timing_present[0] == '':
-							test_content.vui_timing_present[2] = TestResult.UNKNOWN
-						else:
-							test_content.vui_timing_present[2] = TestResult.PASS \
-								if (test_content.vui_timing_present[0] is test_content.vui_timing_present[1]) \
-								else TestResult.FAIL
-						continue
-					if line.__contains__(' timing_info_present_flag ') and line.endswith('= 0\n'):
-						test_content.vui_timing_present[1] = False
-						if test_content.vui_timing_present[0] == '':
-							test_content.vui_timing_present[2] = TestResult.UNKNOWN
-						else:
-							test_content.vui_timing_present[2] = TestResult.PASS \
-								if (test_content.vui_timing_present[0] is test_content.vui_timing_present[1]) \
-								else TestResult.FAIL
-						sps_processed = True
-						continue
-						
-					if test_content.vui_timing_present[1] and line.__contains__(' num_units_in_tick '):
-						file_vui_timing_num_units_in_tick = int(line.split(' = ')[1])
-						continue
-					if test_content.vui_timing_present[1] and line.__contains__(' time_scale '):
-						file_vui_timing_time_scale = int(line.split(' = ')[1])
-						print('VUI timing present')
-						vui_file_frame_rate = float(Decimal(file_vui_timing_time_scale/file_vui_timing_num_units_in_tick/2).quantize(Decimal('.001'), rounding=ROUND_DOWN))
-						if frame_rate_group.get(vui_file_frame_rate):
-							if str(vui_file_frame_rate)[-2:] == '.0':
-								vui_file_frame_rate = int(vui_file_frame_rate)
-							test_content.frame_rate[1] = vui_file_frame_rate
-						else:
-							test_content.frame_rate[1] = \
-								'invalid VUI timing data (fps='+str(vui_file_frame_rate)+') | ffmpeg detected frame rate = ' \
-								+ str(file_frame_rate)+'('+str(frame_rate_group.get(file_frame_rate, '?')) + ')'
-						# The frame rate is already adapted based on the frame rate family when this log occurs
-						# Determine the test result for the frame rate
-						if test_content.frame_rate[0] == 0:
-							test_content.frame_rate[2] = TestResult.UNKNOWN
-						else:
-							test_content.frame_rate[2] = TestResult.PASS \
-								if (test_content.frame_rate[0] == test_content.frame_rate[1]) \
-								else TestResult.FAIL
-						print('VUI frame rate = '+str(vui_file_frame_rate))
-						sps_processed = True
-						continue
-			
-			if sei_detected:
-				if pic_timing_sei_detected:
-					if line.__contains__(' pic_struct '):
-						print('Picture timing SEI pic_struct='+(line.split(' = ')[1]))
-						continue
-				elif line.startswith('[trace_headers') and line.endswith('] Picture Timing\n'):
-					pic_timing_sei_detected = True
-					print('Picture timing SEI present')
-					test_content.picture_timing_sei_present[1] = True
-					if test_content.picture_timing_sei_present[0] == '':
-						test_content.picture_timing_sei_present[2] = TestResult.UNKNOWN
-					else:
-						test_content.picture_timing_sei_present[2] = TestResult.PASS \
-							if (test_content.picture_timing_sei_present[0] is
-								test_content.picture_timing_sei_present[1]) \
-							else TestResult.FAIL
-					continue
-				
-				if test_content.sei_pref_transfer_characteristics[1] == '':
-					if line.__contains__(' preferred_transfer_characteristics '):
-						test_content.sei_pref_transfer_characteristics[1] = int(line.split(' = ')[1])
-						test_content.sei_pref_transfer_characteristics[2] = TestResult.PASS \
-							if (test_content.sei_pref_transfer_characteristics[0] == test_content.sei_pref_transfer_characteristics[1]) \
-							else TestResult.FAIL
-			
-			if line.__contains__(' nal_unit_type '):
-				last_nal_unit_type = int(line.split(' = ')[1][:-1])
-				continue
-			if line.__contains__(' slice_type '):
-				nal_slice_types.append([last_nal_unit_type, int(line.split(' = ')[1][:-1])])
-				continue
-			if line.startswith('[trace_headers'):
-				if line.endswith('] Sequence Parameter Set\n'):
-					file_sps_count += 1
-					if not sps_processed:
-						sps_detected = True
-				elif line.endswith('] Picture Parameter Set\n'):
-					file_pps_count += 1
-				elif line.endswith('] Supplemental Enhancement Information\n'):
-					sei_detected = True
-		
-		elif h265_detected:
-			if sps_detected and not sps_processed:
-				if line.__contains__(' general_tier_flag '):
-					file_codec_tier = line.split(' = ')[1][:-1]
-					test_content.codec_tier[1] = h265_tier.get(file_codec_tier, '')
-					if test_content.codec_tier[0] == '':
-						test_content.codec_tier[2] = TestResult.UNKNOWN
-					else:
-						test_content.codec_tier[2] = TestResult.PASS \
-							if (test_content.codec_tier[0].lower() == test_content.codec_tier[1].lower()) \
-							else TestResult.FAIL
-					print('Tier = '+h265_tier.get(file_codec_tier, ''))
-					continue
-					
-				if line.__contains__(' general_profile_idc '):
-					file_codec_profile = line.split(' = ')[1][:-1]
-					test_content.codec_profile[1] = h265_profile.get(file_codec_profile, '')
-					if test_content.codec_profile[0] == '':
-						test_content.codec_profile[2] = TestResult.UNKNOWN
-					else:
-						test_content.codec_profile[2] = TestResult.PASS \
-							if (test_content.codec_profile[0].lower() == test_content.codec_profile[1].lower()) \
-							else TestResult.FAIL
-					print('Profile = '+test_content.codec_profile[1])
-					continue
-					
-				if line.__contains__(' general_level_idc '):
-					file_codec_level = line.split(' = ')[1][:-1]
-					test_content.codec_level[1] = str(eval(file_codec_level+"/30"))
-					if test_content.codec_level[0] == '':
-						test_content.codec_level[2] = TestResult.UNKNOWN
-					else:
-						test_content.codec_level[2] = TestResult.PASS \
-							if (float(test_content.codec_level[0]) == float(test_content.codec_level[1])) \
-							else TestResult.FAIL
-					print('Level = '+test_content.codec_level[1])
-					continue
-					
-				if not vui_detected and line.__contains__(' vui_parameters_present_flag ') and line.endswith('= 1\n'):
-					vui_detected = True
-					print('VUI present')
-					continue
-				if vui_detected:
-					if line.__contains__(' aspect_ratio_info_present_flag '):
-						if int(line.split(' = ')[1]) == 1:
-							aspect_ratio_info_detected = True
-							print('Aspect ratio info present')
-						continue
-					if aspect_ratio_info_detected:
-						if line.__contains__(' aspect_ratio_idc '):
-							sar = int(line.split(' = ')[1])
-							if sar != 255:
-								test_content.pixel_aspect_ratio[1] = sar_values.get(sar, 0)
-								if sar == 0 and test_content.pixel_aspect_ratio[0] == '':
-									test_content.pixel_aspect_ratio[2] = TestResult.NOT_APPLICABLE
-								else:
-									# When defined in the bitstream, default 1:1 SAR expected unless otherwise defined in test expected results
-									if test_content.pixel_aspect_ratio[0] == '':
-										test_content.pixel_aspect_ratio[0] = C_DEFAULT_SAR
-									test_content.pixel_aspect_ratio[2] = TestResult.PASS \
-										if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
-										eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
-										else TestResult.FAIL
-							continue
-						if sar == 255 and line.__contains__(' sar_width '):
-							sar_width = int(line.split(' = ')[1])
-							if sar_height != 0:
-								test_content.pixel_aspect_ratio[1] = str(sar_width) + ":" + str(sar_height)
-								test_content.pixel_aspect_ratio[2] = TestResult.PASS \
-									if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
-									eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
-									else TestResult.FAIL
-							continue
-						if sar == 255 and line.__contains__(' sar_height '):
-							sar_height = int(line.split(' = ')[1])
-							if sar_width != 0:
-								test_content.pixel_aspect_ratio[1] = str(sar_width) + ":" + str(sar_height)
-								test_content.pixel_aspect_ratio[2] = TestResult.PASS \
-									if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
-									eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
-									else TestResult.FAIL
-							continue
-					
-					if line.__contains__(' colour_description_present_flag '):
-						if int(line.split(' = ')[1]) == 1:
-							colour_description_detected = True
-							print('Colour primaries, transfer characteristics, and matrix coeffs present')
-						continue
-					if colour_description_detected:
-						if line.__contains__(' colour_primaries '):
-							colour_primaries = int(line.split(' = ')[1])
-							test_content.vui_primaries_mcoeffs[1] = colour_primaries
-							# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
-							if test_content.vui_primaries_mcoeffs[0] == '':
-								test_content.vui_primaries_mcoeffs[0] = C_DEFAULT_VUI_PRIMARIES_MCOEFFS
-							if matrix_coeffs != 0:
-								if colour_primaries != matrix_coeffs:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.FAIL
-								else:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.PASS \
-										if test_content.vui_primaries_mcoeffs[0] == test_content.vui_primaries_mcoeffs[1] \
-										else TestResult.FAIL
-							continue
-						if line.__contains__(' matrix_coefficients '):
-							matrix_coeffs = int(line.split(' = ')[1])
-							test_content.vui_primaries_mcoeffs[1] = matrix_coeffs
-							# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
-							if test_content.vui_primaries_mcoeffs[0] == '':
-								test_content.vui_primaries_mcoeffs[0] = C_DEFAULT_VUI_PRIMARIES_MCOEFFS
-							if colour_primaries != 0:
-								if matrix_coeffs != colour_primaries:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.FAIL
-								else:
-									test_content.vui_primaries_mcoeffs[2] = TestResult.PASS \
-										if test_content.vui_primaries_mcoeffs[0] == test_content.vui_primaries_mcoeffs[1] \
-										else TestResult.FAIL
-							continue
-						if line.__contains__(' transfer_characteristics '):
-							test_content.vui_transfer_characteristics[1] = int(line.split(' = ')[1])
-							# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
-							if test_content.vui_transfer_characteristics[0] == '':
-								test_content.vui_transfer_characteristics[0] = C_DEFAULT_VUI_TRANSFER_CHARACTERISTICS
-							test_content.vui_transfer_characteristics[2] = TestResult.PASS \
-								if test_content.vui_transfer_characteristics[0] == \
-								   test_content.vui_transfer_characteristics[1] \
-								else TestResult.FAIL
-							continue
-							
-					if line.__contains__(' vui_timing_info_present_flag ') and line.endswith('= 1\n'):
-						test_content.vui_timing_present[1] = True
-						if test_content.vui_timing_present[0] == '':
-							test_content.vui_timing_present[2] = TestResult.UNKNOWN
-						else:
-							test_content.vui_timing_present[2] = TestResult.PASS \
-								if (test_content.vui_timing_present[0] is test_content.vui_timing_present[1]) \
-								else TestResult.FAIL
-						continue
-					if line.__contains__(' vui_timing_info_present_flag ') and line.endswith('= 0\n'):
-						test_content.vui_timing_present[1] = False
-						if test_content.vui_timing_present[0] == '':
-							test_content.vui_timing_present[2] = TestResult.UNKNOWN
-						else:
-							test_content.vui_timing_present[2] = TestResult.PASS \
-								if (test_content.vui_timing_present[0] is test_content.vui_timing_present[1]) \
-								else TestResult.FAIL
-						sps_processed = True
-						continue
-						
-					if test_content.vui_timing_present[1] and line.__contains__(' vui_num_units_in_tick '):
-						file_vui_timing_num_units_in_tick = int(line.split(' = ')[1])
-						continue
-					if test_content.vui_timing_present[1] and line.__contains__(' vui_time_scale '):
-						file_vui_timing_time_scale = int(line.split(' = ')[1])
-						print('VUI timing present')
-						vui_file_frame_rate = float(Decimal(file_vui_timing_time_scale/file_vui_timing_num_units_in_tick).quantize(Decimal('.001'), rounding=ROUND_DOWN))
-						if frame_rate_group.get(vui_file_frame_rate):
-							if str(vui_file_frame_rate)[-2:] == '.0':
-								vui_file_frame_rate = int(vui_file_frame_rate)
-							test_content.frame_rate[1] = vui_file_frame_rate
-						else:
-							test_content.frame_rate[1] = \
-								'invalid VUI timing data (fps='+str(vui_file_frame_rate)+') | ffmpeg detected frame rate = ' \
-								+ str(file_frame_rate)+'('+str(frame_rate_group.get(file_frame_rate, '?')) + ')'
-						# The frame rate is already adapted based on the frame rate family when this log occurs
-						# Determine the test result for the frame rate
-						if test_content.frame_rate[0] == 0:
-							test_content.frame_rate[2] = TestResult.UNKNOWN
-						else:
-							test_content.frame_rate[2] = TestResult.PASS \
-								if (test_content.frame_rate[0] == test_content.frame_rate[1]) \
-								else TestResult.FAIL
-						print('VUI frame rate = '+str(vui_file_frame_rate))
-						sps_processed = True
-						continue
-				
-			if sei_detected:
-				if pic_timing_sei_detected:
-					if line.__contains__(' pic_struct '):
-						print('Picture timing SEI pic_struct=' + (line.split(' = ')[1]))
-						continue
-				elif line.startswith('[trace_headers') and line.endswith('] Picture Timing\n'):
-					pic_timing_sei_detected = True
-					print('Picture timing SEI present')
-					test_content.picture_timing_sei_present[1] = True
-					if test_content.picture_timing_sei_present[0] == '':
-						test_content.picture_timing_sei_present[2] = TestResult.UNKNOWN
-					else:
-						test_content.picture_timing_sei_present[2] = TestResult.PASS \
-							if (test_content.picture_timing_sei_present[0] is
-								test_content.picture_timing_sei_present[1]) \
-							else TestResult.FAIL
-					continue
-				
-				if test_content.sei_pref_transfer_characteristics[1] == '':
-					if line.__contains__(' preferred_transfer_characteristics '):
-						test_content.sei_pref_transfer_characteristics[1] = int(line.split(' = ')[1])
-						test_content.sei_pref_transfer_characteristics[2] = TestResult.PASS \
-							if (test_content.sei_pref_transfer_characteristics[0] == test_content.sei_pref_transfer_characteristics[1]) \
-							else TestResult.FAIL
-					
-				# Content Light Level Information
-				if test_content.sei_content_light_level[1] == '':
-					if line.__contains__(' max_content_light_level '):
-						sei_content_light_level_max_cll = int(line.split(' = ')[1])
-					if line.__contains__(' max_pic_average_light_level '):
-						sei_content_light_level_max_fall = int(line.split(' = ')[1])
-					if line.__contains__(' max_content_light_level ') or line.__contains__(' max_pic_average_light_level '):
-						if sei_content_light_level_max_cll is not None and sei_content_light_level_max_fall is not None:
-							print('MaxFALL = '+str(sei_content_light_level_max_fall))
-							print('MaxCLL = '+str(sei_content_light_level_max_cll))
-							test_content.sei_content_light_level [1] = (sei_content_light_level_max_cll,sei_content_light_level_max_fall)
-							if test_content.vui_transfer_characteristics[0] == transfer_characteristics_values.get("PQ10"):
-								test_content.sei_content_light_level [2] = TestResult.PASS
-							else:
-								test_content.sei_content_light_level [2] = TestResult.FAIL
-				
-				# Mastering Display Colour Volume
-				if test_content.sei_mastering_display_colour_vol [1] == '':
-					if line.__contains__(' display_primaries_x[0] '):
-						sei_display_mastering_px0 = int(line.split(' = ')[1])
-					if line.__contains__(' display_primaries_y[0] '):
-						sei_display_mastering_py0 = int(line.split(' = ')[1])
-					if line.__contains__(' display_primaries_x[1] '):
-						sei_display_mastering_px1 = int(line.split(' = ')[1])
-					if line.__contains__(' display_primaries_y[1] '):
-						sei_display_mastering_py1 = int(line.split(' = ')[1])
-					if line.__contains__(' display_primaries_x[2] '):
-						sei_display_mastering_px2 = int(line.split(' = ')[1])
-					if line.__contains__(' display_primaries_y[2] '):
-						sei_display_mastering_py2 = int(line.split(' = ')[1])
-					if line.__contains__(' white_point_x '):
-						sei_display_mastering_wpx = int(line.split(' = ')[1])
-					if line.__contains__(' white_point_y '):
-						sei_display_mastering_wpy = int(line.split(' = ')[1])
-					if line.__contains__(' max_display_mastering_luminance '):
-						sei_display_mastering_max_lum = int(line.split(' = ')[1])
-					if line.__contains__(' min_display_mastering_luminance '):
-						sei_display_mastering_min_lum = int(line.split(' = ')[1])
-						if sei_display_mastering_px0 is not None and sei_display_mastering_py0 is not None \
-							and sei_display_mastering_px1 is not None and sei_display_mastering_py1 is not None \
-							and sei_display_mastering_px2 is not None and sei_display_mastering_py2 is not None \
-							and sei_display_mastering_wpx is not None and sei_display_mastering_wpy is not None \
-							and sei_display_mastering_max_lum is not None and sei_display_mastering_min_lum is not None:
-							px = [sei_display_mastering_px0,sei_display_mastering_px1,sei_display_mastering_px2]
-							py = [sei_display_mastering_py0,sei_display_mastering_py1,sei_display_mastering_py2]
-							red_index = px.index(max(px))
-							green_index = py.index(max(py))
-							blue_index = 0
-							for p in range (0,3):
-								if p != red_index and p != green_index:
-									blue_index = p
-							red = (round(px[red_index]*0.00002,5),round(py[red_index]*0.00002,5))
-							green = (round(px[green_index]*0.00002,5),round(py[green_index]*0.00002,5))
-							blue = (round(px[blue_index]*0.00002,5),round(py[blue_index]*0.00002,5))
-							white = (round(sei_display_mastering_wpx*0.00002,5),round(sei_display_mastering_wpy*0.00002,5))
-							max_lum = sei_display_mastering_max_lum*0.0001
-							min_lum = round(sei_display_mastering_min_lum*0.0001,5)
-							mastering_display_cv = 'R='+str(red)+' G='+str(green)+' B='+str(blue)+' W='+str(white)+' Max='+str(max_lum)+' Min='+str(min_lum)
-							print('Mastering Display Colour Volume = '+mastering_display_cv)
-							test_content.sei_mastering_display_colour_vol [1] = mastering_display_cv
-							if test_content.vui_transfer_characteristics[0] == transfer_characteristics_values.get("PQ10"):
-								test_content.sei_mastering_display_colour_vol[2] = TestResult.PASS
-							else:
-								test_content.sei_mastering_display_colour_vol[2] = TestResult.FAIL
-						
-			if line.__contains__(' nal_unit_type '):
-				last_nal_unit_type = int(line.split(' = ')[1][:-1])
-				continue
-			if line.__contains__(' slice_type '):
-				nal_slice_types.append([last_nal_unit_type, int(line.split(' = ')[1][:-1])])
+	ffmpeg_trace_headers_error_text = []
+	ffmpeg_process = stream_processes.ffmpeg_process
+	headers_trace = []
+	if stream_processes.ffmpeg_log is not None:
+		headers_trace = io.TextIOWrapper(io.BufferedReader(stream_processes.ffmpeg_log), encoding="utf-8")
+		print('Checking ffmpeg trace_headers log...')
+	trace_headers_copy = open(trace_headers_filepath, "w", encoding="utf-8") if save_trace_headers else None
+	fth_last_lines = collections.deque(''*2, 2)
+	last_frame_line = None
+	n = -1
+	for n, line in enumerate(headers_trace):
+		if trace_headers_copy is not None:
+			trace_headers_copy.write(line)
+		if trace_headers_parser is not None and line.startswith('[trace_headers'):
+			if trace_headers_parser.read_line(line):
+				fth_last_lines.appendleft(line)
 				continue
-			elif line.startswith('[trace_headers'):
-				if line.endswith('] Sequence Parameter Set\n'):
-					file_sps_count += 1
-					if not sps_processed:
-						sps_detected = True
-				elif line.endswith('] Picture Parameter Set\n'):
-					file_pps_count += 1
-					sei_detected = True
-				elif line.endswith('] Prefix Supplemental Enhancement Information\n'):
-					sei_detected = True
 		
 		if line.startswith('frame='):
-			if n > nb_lines-3:
-				# Update test results for SEI messages
-				if not pic_timing_sei_detected:
-					test_content.picture_timing_sei_present[1] = False
-					if test_content.picture_timing_sei_present[0] == '':
-						test_content.picture_timing_sei_present[2] = TestResult.UNKNOWN
-					else:
-						test_content.picture_timing_sei_present[2] = TestResult.PASS \
-							if (test_content.picture_timing_sei_present[0] is
-								test_content.picture_timing_sei_present[1]) \
-							else TestResult.FAIL
-				
-				# Check duration detected by ffmpeg based on total frames (as the time reported never matches total duration)
-				file_duration = round(eval(line.split('=')[1].lstrip().split(' ')[0]+'*1/'+str(file_frame_rate)), 3)
-				if str(file_duration)[-2:] == '.0':
-					file_duration = int(file_duration)
-				test_content.duration[1] = file_duration
-				if test_content.duration[0] == 0:
-					test_content.duration[2] = TestResult.UNKNOWN
-				else:
-					# Check duration matches target or is less than 1 frame lower than target duration (for fractional frame rates)
-					test_content.duration[2] = TestResult.PASS \
-						if (test_content.duration[0] >= test_content.duration[1] > (test_content.duration[0] - (1 / file_frame_rate))) \
-						else TestResult.FAIL
-				print('Duration = '+str(test_content.duration[1])+'s')
+			# The frame count is final in the last lines of the log only, it is checked once ffmpeg completed
+			last_frame_line = (n, line)
 			continue
 			
-		if not h264_detected and not h265_detected and line.__contains__('Stream #0:0'):
+		if not video_detected and line.__contains__('Stream #0:0'):
 			if line.__contains__('/s,'):
 				line_data_array = line[:line.find('kb/s,')].split(',')
 				if line.__contains__('fps'):
 					file_frame_rate = float(line[line.find('kb/s,'):].split(',')[1][:-3])
 				if file_frame_rate == 14.99:
 					file_frame_rate = 14.985  # Compensate for ffmpeg rounding fps
-				if frame_rate_group.get(file_frame_rate):
-					if str(file_frame_rate)[-2:] == '.0':
-						file_frame_rate = int(file_frame_rate)
-					test_content.frame_rate[1] = file_frame_rate
-				else:
-					test_content.frame_rate[1] = 'ínvalid ffmpeg detected frame rate = ' + str(file_frame_rate)
-				# Adapt the frame rate now that we know the frame rate family
-				if frame_rate_family == TS_LOCATION_FRAME_RATES_50:
-					test_content.frame_rate[0] = frame_rate_value_50.get(test_content.frame_rate[0], 0)
-				elif frame_rate_family == TS_LOCATION_FRAME_RATES_59_94:
-					test_content.frame_rate[0] = frame_rate_value_59_94.get(test_content.frame_rate[0], 0)
-				elif frame_rate_family == TS_LOCATION_FRAME_RATES_60:
-					test_content.frame_rate[0] = frame_rate_value_60.get(test_content.frame_rate[0], 0)
-				# Determine the test result for the frame rate
-				if test_content.frame_rate[0] == 0:
-					test_content.frame_rate[2] = TestResult.UNKNOWN
-				else:
-					test_content.frame_rate[2] = TestResult.PASS \
-						if (test_content.frame_rate[0] == test_content.frame_rate[1]) \
-						else TestResult.FAIL
-				print('ffmpeg detected frame rate = ' + str(file_frame_rate))
-				
-				test_content.bitrate[1] = int(line_data_array[len(line_data_array)-1])
-				if test_content.bitrate[0] == TestResult.NOT_APPLICABLE:
-					test_content.bitrate[2] = TestResult.NOT_APPLICABLE
-				elif test_content.bitrate[0] == 0:
-					test_content.bitrate[2] = TestResult.UNKNOWN
-				else:
-					test_content.bitrate[2] = TestResult.PASS \
-						if (test_content.bitrate[0] == test_content.bitrate[1]) \
-						else TestResult.FAIL
-				print('Bitrate = '+str(test_content.bitrate[1])+'kb/s')
+				file_frame_rate = check_frame_rate(test_content, frame_rate_family, file_frame_rate, 'ffmpeg detected')
+				check_bitrate(test_content, int(line_data_array[len(line_data_array)-1]))
+			if line.__contains__(': Video: '):
+				video_detected = True
 			if line.__contains__(': Video: h264'):
 				h264_detected = True
 			elif line.__contains__(': Video: hevc'):
@@ -1824,7 +2000,42 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 			break
 		fth_last_lines.appendleft(line)
 	
-	headers_trace_file.close()
+	# Read the rest of the log so that ffmpeg completes, to know which lines are the last ones
+	nb_lines = n + 1
+	for line in headers_trace:
+		nb_lines += 1
+		if trace_headers_copy is not None:
+			trace_headers_copy.write(line)
+	if ffmpeg_process is not None:
+		ffmpeg_process.wait()
+	if stream_processes.ffmpeg_log is not None:
+		headers_trace.close()
+	if trace_headers_copy is not None:
+		trace_headers_copy.close()
+	
+	if last_frame_line is not None and last_frame_line[0] > nb_lines-3 and TIMING_PARSER == TIMING_PARSER_FFMPEG:
+		frame_line = last_frame_line[1]
+		# Check duration detected by ffmpeg based on total frames (as the time reported never matches total duration)
+		check_duration(test_content,
+					   round(eval(frame_line.split('=')[1].lstrip().split(' ')[0]+'*1/'+str(file_frame_rate)), 3),
+					   file_frame_rate)
+	
+	if h264_detected:
+		# Tier, preferred transfer characteristics SEI, Mastering Display Colour Volume SEI and Content Light
+		# Level Information SEI are not applicable
+		test_content.codec_tier[2] = TestResult.NOT_APPLICABLE
+		test_content.sei_pref_transfer_characteristics[2] = TestResult.NOT_APPLICABLE
+		test_content.sei_mastering_display_colour_vol[2] = TestResult.NOT_APPLICABLE
+		test_content.sei_content_light_level[2] = TestResult.NOT_APPLICABLE
+	
+	if trace_headers_parser is not None:
+		file_sps_count = trace_headers_parser.sps_count
+		file_pps_count = trace_headers_parser.pps_count
+		nal_slice_types = trace_headers_parser.slice_types
+		if trace_headers_parser.video_header_info.profile_idc is not None:
+			video_header_info = trace_headers_parser.video_header_info
+	if video_header_info is not None and video_detected:
+		check_video_header(test_content, codec_analyser, video_header_info, file_frame_rate)
 	
 	# Init variables for temp data from file
 	mpd_media_presentation_duration = 0
@@ -2065,42 +2276,16 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 		test_content.mpd_bitstream_mismatch[1] += 'Representation@sar='+str(mpd_representation.get('sar'))+';'
 		test_content.mpd_bitstream_mismatch[0] += 'Representation@sar='+test_content.pixel_aspect_ratio[1]+';'
 	
-	# Use MP4Box to dump IsoMedia file box metadata for analysis
-	MP4Box_cl = ['MP4Box',
-		str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME)),
-		'-diso']
-
-	print('Running MP4Box to dump IsoMedia file box metadata from init and first segments to XML...')
-	subprocess.run(MP4Box_cl)
-	
-	print('Checking IsoMedia file box XML data...')
-	mp4_frag_info = etree.parse(str(Path(
-		test_content.test_file_path + sep + '1' + sep + TS_INIT_SEGMENT_NAME.split('.')[0] + TS_METADATA_POSTFIX)))
-	mp4_frag_info_root = mp4_frag_info.getroot()
-	
-	mdhd_timescale = [element.get("TimeScale") for element in mp4_frag_info_root.iter('{*}MediaHeaderBox')]
-	if mdhd_timescale:
-		if mdhd_timescale[0] is not None:
-			file_timescale = int(mdhd_timescale[0])
+	# IsoMedia file box metadata of the init segment
+	print('Checking IsoMedia file box data...')
+	if init_segment_info.timescale is not None:
+		file_timescale = init_segment_info.timescale
 	
 	# Extract default sample duration and flags if defined in trex
-	trex_default_sample_duration = mp4_frag_info_root.findall('.//{*}TrackExtendsBox')[0].get("SampleDuration")
-	trex_dsf = mp4_frag_info_root.findall('.//{*}TrackExtendsBox')[0].findall('.//{*}DefaultSampleFlags')[0]
-	if trex_dsf is not None:
-		trex_default_sample_flags = (
-			trex_dsf.get("SamplePadding")
-			and trex_dsf.get("SampleSync")
-			and trex_dsf.get("SampleDegradationPriority")
-			and trex_dsf.get("IsLeading")
-			and trex_dsf.get("SampleDependsOn")
-			and trex_dsf.get("SampleIsDependedOn")
-			and trex_dsf.get("SampleHasRedundancy")
-		)
-	else:
-		trex_default_sample_flags = False
+	trex_default_sample_duration = init_segment_info.trex_default_sample_duration
+	trex_default_sample_flags = init_segment_info.trex_default_sample_flags_present
 	
-	file_stream_brands += [element.get("MajorBrand") for element in mp4_frag_info_root.iter('{*}FileTypeBox')]
-	file_stream_brands += [element.get("AlternateBrand") for element in mp4_frag_info_root.iter('{*}BrandEntry')]
+	file_stream_brands += init_segment_info.brands
 	test_content.file_brand[1] = ','.join(file_stream_brands)
 	if test_content.file_brand[0] == '':
 		test_content.file_brand[2] = TestResult.UNKNOWN
@@ -2110,29 +2295,7 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 			else TestResult.FAIL
 	print('File brands = ' + test_content.file_brand[1])
 	
-	parameter_sets_present = False
-	if h264_detected:
-		if [element.get("content") for element in mp4_frag_info_root.iter('{*}SequenceParameterSet')]:
-			if [element.get("content") for element in mp4_frag_info_root.iter('{*}SequenceParameterSet')][0]\
-				.startswith('data:application/octet-string,' + hex(int('11' + bin(7)[2:].zfill(5), 2))[2:]) \
-				or [element.get("content") for element in mp4_frag_info_root.iter('{*}SequenceParameterSet')][0]\
-				.startswith('data:application/octet-string,' + hex(int('01' + bin(7)[2:].zfill(5), 2))[2:]):
-				parameter_sets_present = True
-		if [element.get("content") for element in mp4_frag_info_root.iter('{*}PictureParameterSet')]:
-			if [element.get("content") for element in mp4_frag_info_root.iter('{*}PictureParameterSet')][0] \
-					.startswith('data:application/octet-string,' + hex(int('11' + bin(8)[2:].zfill(5), 2))[2:]) \
-					or [element.get("content") for element in mp4_frag_info_root.iter('{*}PictureParameterSet')][0] \
-					.startswith('data:application/octet-string,' + hex(int('01' + bin(8)[2:].zfill(5), 2))[2:]):
-				parameter_sets_present = True
-	elif h265_detected:
-		if ('33' and '34') in [element.get("nalu_type") for element in mp4_frag_info_root.iter('{*}ParameterSetArray')]:
-			sps_index =	[element.get("nalu_type") for element in mp4_frag_info_root.iter('{*}ParameterSetArray')].index('33')
-			pps_index = [element.get("nalu_type") for element in mp4_frag_info_root.iter('{*}ParameterSetArray')].index('34')
-			if [element[0].get("content") for element in mp4_frag_info_root.iter('{*}ParameterSetArray')][sps_index].startswith(
-					'data:application/octet-string,' + hex(int('0' + bin(33)[2:] + '0', 2))[2:]) \
-				and [element[0].get("content") for element in mp4_frag_info_root.iter('{*}ParameterSetArray')][pps_index].startswith(
-					'data:application/octet-string,' + hex(int('0' + bin(34)[2:] + '0', 2))[2:]):
-				parameter_sets_present = True
+	parameter_sets_present = codec_analyser is not None and codec_analyser.parameter_sets_in_header()
 	
 	if not parameter_sets_present:
 		test_content.parameter_sets_in_cmaf_header_present[1] = False
@@ -2147,75 +2310,62 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 			else TestResult.FAIL
 	print('Parameter sets in CMAF header = ' + str(test_content.parameter_sets_in_cmaf_header_present[1]))
 	
+	# In-band parameter sets are counted natively in the samples of each fragment, in addition to those of the
+	# decoder configuration record that the ffmpeg trace_headers log lists first
+	if scan_samples:
+		file_sps_count = len(init_segment_info.parameter_sets.get(codec_analyser.parameter_set_types['SPS'], []))
+		file_pps_count = len(init_segment_info.parameter_sets.get(codec_analyser.parameter_set_types.get('PPS'), []))
+	
 	# Verify MPD and segment duration are valid
 	print('Extracting SampleDuration from every TrackFragmentHeaderBox... ')
 	
-	seg_files = sorted(os.listdir(str(Path(test_content.test_file_path + sep + '1' + sep))), key=len)
 	for m4s in seg_files:
 		if m4s.endswith('.m4s'):
 			file_total_fragments += 1
 			file_fragment_duration = 0
-			MP4Box_cl2 = ['MP4Box',
-						  str(Path(test_content.test_file_path + sep + '1' + sep + m4s)),
-						  '-init-seg',
-						  str(Path(test_content.test_file_path + sep + '1' + sep + TS_INIT_SEGMENT_NAME)),
-						  '-diso']
-			# print('Running MP4Box to dump IsoMedia file box metadata from segment to XML...')
-			subprocess.run(MP4Box_cl2)
-			mp4_frag_info = etree.parse(str(Path(
-				test_content.test_file_path + sep + '1' + sep + m4s.split('.')[
-					0] + TS_METADATA_POSTFIX)))
-			mp4_frag_info_root = mp4_frag_info.getroot()
+			m4s_filepath = str(Path(test_content.test_file_path + sep + '1' + sep + m4s))
+			# The boxes and the samples of the segment are read from a single mapping of the file
+			with map_segment_file(m4s_filepath):
+				fragment_info = read_fragment_info(test_content, frame_rate_family, m4s)
+				if scan_samples:
+					fragment_sample_info = scan_fragment_samples(
+						m4s_filepath, fragment_info if BOX_PARSER != BOX_PARSER_MP4BOX else read_fragment_boxes(m4s_filepath),
+						codec_analyser, sei_info)
 			
 			# Variable for counting all sample duration values
 			tfhd_sample_duration = []
 			trun_sample_duration = []
 			trun_trune_sample_duration = []
 			
-			traf_list = mp4_frag_info_root.findall('.//{*}TrackFragmentBox')
-			for i, traf in enumerate(traf_list):
+			for i, traf in enumerate(fragment_info.track_fragments):
 				duration_added = False
-				tfhd = traf.findall('.//{*}TrackFragmentHeaderBox')[0]
 				# check TrackFragmentHeaderBox@SampleDescriptionIndex=1
-				if tfhd.get("SampleDescriptionIndex"):
-					file_tfhd_sample_description_index_present.append(bool(int(tfhd.get("SampleDescriptionIndex"))==1))
+				if traf.sample_description_index is not None:
+					file_tfhd_sample_description_index_present.append(bool(traf.sample_description_index==1))
 				# check TrackFragmentHeaderBox@SampleDuration
-				if tfhd.get("SampleDuration"):
-					file_tfhd_sample_duration_present.append(bool(tfhd.get("SampleDuration")))
-					tfhd_sample_duration.append(tfhd.get("SampleDuration"))
+				if traf.default_sample_duration is not None:
+					file_tfhd_sample_duration_present.append(True)
+					tfhd_sample_duration.append(traf.default_sample_duration)
 				# check TrackFragmentHeaderBox@SampleSize
-				file_tfhd_sample_size_present.append(bool(tfhd.get("SampleSize")))
+				file_tfhd_sample_size_present.append(traf.default_sample_size is not None)
 				# check flags (SamplePadding Sync DegradationPriority IsLeading DependsOn IsDependedOn HasRedundancy)
-				file_tfhd_default_sample_flags_present.append(bool(
-					tfhd.get("SamplePadding") and tfhd.get("Sync") and tfhd.get("DegradationPriority")
-					and tfhd.get("IsLeading") and tfhd.get("DependsOn") and tfhd.get("IsDependedOn")
-					and tfhd.get("HasRedundancy")))
+				file_tfhd_default_sample_flags_present.append(traf.default_sample_flags_present)
 				
-				trun = traf.findall('.//{*}TrackRunBox')[0]
+				trun = traf.track_runs[0]
 				# check TrackRunBox@Version=1 for video CMAF Tracks not contained in Track Files
-				if trun.get("Version"):
-					file_trun_version.append(bool(int(trun.get("Version"))==1))
+				if trun.version is not None:
+					file_trun_version.append(bool(trun.version==1))
 				# check TrackRunBox@SampleDuration
-				if trun.get("SampleDuration"):
-					file_trun_sample_duration_present.append(bool(trun.get("SampleDuration")))
-					trun_sample_duration.append(trun.get("SampleDuration"))
+				if trun.sample_duration is not None:
+					file_trun_sample_duration_present.append(True)
+					trun_sample_duration.append(trun.sample_duration)
 				# check flags (SamplePadding Sync DegradationPriority IsLeading DependsOn IsDependedOn HasRedundancy)
-				file_trun_sample_flags_present.append(bool(
-					trun.get("SamplePadding") and trun.get("Sync") and trun.get("DegradationPriority")
-					and trun.get("IsLeading") and trun.get("DependsOn") and trun.get("IsDependedOn")
-					and trun.get("HasRedundancy")))
+				file_trun_sample_flags_present.append(trun.sample_flags_present)
 				
-				trun_first_sample_flags = trun.findall('.//{*}FirstSampleFlags')
-				if trun_first_sample_flags:
+				if trun.first_sample_flags_present is not None:
 					# check flags (IsLeading SampleDependsOn SampleIsDependedOn SampleHasRedundancy SamplePadding SampleSync SampleDegradationPriority)
-					file_trun_first_sample_flags_present.append(bool(
-						trun_first_sample_flags[0].get("SamplePadding") and trun_first_sample_flags[0].get("SampleSync")
-						and trun_first_sample_flags[0].get("SampleDegradationPriority")
-						and trun_first_sample_flags[0].get("IsLeading") and trun_first_sample_flags[0].get("SampleDependsOn")
-						and trun_first_sample_flags[0].get("SampleIsDependedOn")
-						and trun_first_sample_flags[0].get("SampleHasRedundancy")))
+					file_trun_first_sample_flags_present.append(trun.first_sample_flags_present)
 				
-				trune_list = trun.findall('.//{*}TrackRunEntry')
 				trun_trune_sample_duration_present = []
 				trune_sample_duration = []
 				trun_trune_sample_size_present = []
@@ -2224,34 +2374,31 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 				# check TrackRunBoxEntry@SampleDuration,Size and flags
 				# and calculate total sample duration
 				duration_added = False
-				for j, trune in enumerate(trune_list):
+				for j, trune in enumerate(trun.entries):
 					# check TrackRunEntry@SampleDuration
-					if trune.get("SampleDuration"):
-						trun_trune_sample_duration_present.append(bool(trune.get("SampleDuration")))
-						trune_sample_duration.append(trune.get("SampleDuration"))
-						tmp_duration = int(trune.get("SampleDuration")) / int(file_timescale)
+					if trune.duration is not None:
+						trun_trune_sample_duration_present.append(True)
+						trune_sample_duration.append(trune.duration)
+						tmp_duration = trune.duration / int(file_timescale)
 						file_tot_sample_duration += tmp_duration
 						file_fragment_duration += tmp_duration
 						duration_added = True
 					# check TrackRunEntry@Size
-					trun_trune_sample_size_present.append(bool(trune.get("Size")))
+					trun_trune_sample_size_present.append(trune.size is not None)
 					# check TrackRunEntry flags (SamplePadding Sync DegradationPriority IsLeading DependsOn IsDependedOn HasRedundancy)
-					trun_trune_sample_flags_present.append(bool(
-						trune.get("SamplePadding") and trune.get("Sync") and trune.get("DegradationPriority")
-						and trune.get("IsLeading") and trune.get("DependsOn") and trune.get("IsDependedOn")
-						and trune.get("HasRedundancy")))
+					trun_trune_sample_flags_present.append(trune.flags_present)
 				if not duration_added:
-					s_count = trun.get("SampleCount")
-					if trun.get("SampleDuration"):
-						tmp_duration = int(trun.get("SampleDuration")) * int(s_count) / int(file_timescale)
+					s_count = trun.sample_count
+					if trun.sample_duration is not None:
+						tmp_duration = trun.sample_duration * s_count / int(file_timescale)
 						file_tot_sample_duration += tmp_duration
 						file_fragment_duration += tmp_duration
-					elif tfhd.get("SampleDuration"):
-						tmp_duration = int(tfhd.get("SampleDuration")) * int(s_count) / int(file_timescale)
+					elif traf.default_sample_duration is not None:
+						tmp_duration = traf.default_sample_duration * s_count / int(file_timescale)
 						file_tot_sample_duration += tmp_duration
 						file_fragment_duration += tmp_duration
 					elif trex_default_sample_duration:
-						tmp_duration = int(trex_default_sample_duration) * int(s_count) / int(file_timescale)
+						tmp_duration = int(trex_default_sample_duration) * s_count / int(file_timescale)
 						file_tot_sample_duration += tmp_duration
 						file_fragment_duration += tmp_duration
 						
@@ -2308,11 +2455,11 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 					if test_content.cmf2_sample_flags_present[0] == test_content.cmf2_sample_flags_present[1] \
 					else TestResult.FAIL
 					
-			file_samples_per_chunk = [element.get("SampleCount") for element in
-										  mp4_frag_info_root.iter('{*}TrackRunBox')]
-			file_samples_per_fragment = sum(map(int, file_samples_per_chunk))
+			file_samples_per_chunk = [trun.sample_count for traf in fragment_info.track_fragments
+									  for trun in traf.track_runs]
+			file_samples_per_fragment = sum(file_samples_per_chunk)
 			file_total_samples += file_samples_per_fragment
-			file_chunks_per_fragment_mdat = sum(1 for element in mp4_frag_info_root.iter('{*}MediaDataBox'))
+			file_chunks_per_fragment_mdat = fragment_info.media_data_boxes
 			spc_count = Counter(file_samples_per_chunk)
 			print(str(file_samples_per_fragment) + ' samples per fragment, composed of:')
 			for spc_k, spc_v in spc_count.items():
@@ -2347,9 +2494,25 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 				file_chunks_per_fragment_mdat) + ' (' + str(test_content.chunks_per_fragment[1].value) + ')')
 			print('Fragment duration = '+str(file_fragment_duration))
 			file_fragment_durations.append(round(file_fragment_duration, 2))
+			
+			if scan_samples:
+				file_stream_frame_types.update(fragment_sample_info.frame_types)
+				if file_first_fragment_frame_types is None:
+					file_first_fragment_frame_types = fragment_sample_info.frame_types
+				file_sps_count += fragment_sample_info.parameter_set_counts['SPS']
+				file_pps_count += fragment_sample_info.parameter_set_counts['PPS']
+				if fragment_sample_info.parameter_set_samples:
+					print('In-band parameter sets = ' + ' '.join(
+						[name + '=' + str(count) for name, count in sorted(fragment_sample_info.parameter_set_counts.items())])
+						+ ' in sample(s) ' + ','.join([str(sample_index) for sample_index
+													  in fragment_sample_info.parameter_set_samples.keys()])
+						+ ' of ' + str(fragment_sample_info.sample_count))
 	
 	print('Found '+str(file_total_fragments)+' fragment m4s files')
 	
+	if scan_samples or trace_headers_parser is not None:
+		check_sei_messages(test_content, sei_info, init_segment_info.codec_name)
+	
 	print('cmfc = ' + str(bool('cmfc' in test_content.file_brand[1])))
 	print('default sample duration and flags (in trex) = ' + str(bool(not test_content.cmf2_sample_flags_present[1] \
 																	  and trex_default_sample_duration \
@@ -2441,7 +2604,16 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 		test_content.duration[2] = TestResult.NOT_TESTABLE
 		test_content.duration[1] = str(test_content.duration[1]) + str(': ' + '; '.join(ffmpeg_trace_headers_error_text))
 		
-	if nal_slice_types:
+	if scan_samples and file_stream_frame_types:
+		# Frame types of the first slice of each sample, counted while scanning the fragments
+		file_stream_i_frames = file_stream_frame_types['I']
+		file_stream_p_frames = file_stream_frame_types['P']
+		file_stream_b_frames = file_stream_frame_types['B']
+		file_sample_i_frames = file_first_fragment_frame_types['I']
+		file_sample_p_frames = file_first_fragment_frame_types['P']
+		file_sample_b_frames = file_first_fragment_frame_types['B']
+	
+	if nal_slice_types or file_stream_frame_types:
 		for ntype, stype in nal_slice_types:
 			if h264_detected:
 				if stype == 2 or stype == 7:
@@ -2499,7 +2671,8 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 				if (test_content.b_frames_present[0] is test_content.b_frames_present[1]) \
 				else TestResult.FAIL
 	
-		# In-band parameter sets
+	# In-band parameter sets, counted natively even when the codec analyser does not type the frames
+	if nal_slice_types or (scan_samples and file_fragment_durations):
 		print('First fragment in-band parameter sets (SPS) = '
 			+ str(file_sps_count-1)+'/'+str(file_samples_per_fragment)+' frames')
 		print('First fragment in-band parameter sets (PPS) = '
@@ -2557,138 +2730,2206 @@ def analyse_stream(test_content, frame_rate_family, debug_folder):
 		if test_content.vui_transfer_characteristics[0] != transfer_characteristics_values.get("PQ10"):
 			test_content.sei_content_light_level[2] = TestResult.NOT_APPLICABLE
 		else:
-			test_content.sei_pref_transfer_characteristics[2] = TestResult.FAIL
-	if test_content.sei_mastering_display_colour_vol[2] == TestResult.NOT_TESTED:
-		if test_content.vui_transfer_characteristics[0] != transfer_characteristics_values.get("PQ10"):
-			test_content.sei_mastering_display_colour_vol [2] = TestResult.NOT_APPLICABLE
+			test_content.sei_pref_transfer_characteristics[2] = TestResult.FAIL
+	if test_content.sei_mastering_display_colour_vol[2] == TestResult.NOT_TESTED:
+		if test_content.vui_transfer_characteristics[0] != transfer_characteristics_values.get("PQ10"):
+			test_content.sei_mastering_display_colour_vol [2] = TestResult.NOT_APPLICABLE
+		else:
+			test_content.sei_pref_transfer_characteristics[2] = TestResult.FAIL
+	if test_content.cmaf_fragment_duration[2] == TestResult.NOT_TESTED:
+		test_content.cmaf_fragment_duration[2] = TestResult.FAIL
+	if test_content.cmaf_initialisation_constraints[2] == TestResult.NOT_TESTED:
+		test_content.cmaf_initialisation_constraints[2] = TestResult.FAIL
+	if test_content.chunks_per_fragment[2] == TestResult.NOT_TESTED:
+		test_content.chunks_per_fragment[2] = TestResult.FAIL
+	if test_content.b_frames_present[2] == TestResult.NOT_TESTED:
+		test_content.b_frames_present[2] = TestResult.FAIL
+	if test_content.cmf2_sample_flags_present[2] == TestResult.NOT_TESTED:
+		test_content.cmf2_sample_flags_present[2] = TestResult.FAIL
+	if test_content.resolution[2] == TestResult.NOT_TESTED:
+		test_content.resolution[2] = TestResult.FAIL
+	if test_content.pixel_aspect_ratio[2] == TestResult.NOT_TESTED:
+		test_content.pixel_aspect_ratio[2] = TestResult.FAIL
+	if test_content.frame_rate[2] == TestResult.NOT_TESTED:
+		test_content.frame_rate[2] = TestResult.FAIL
+	if test_content.bitrate[2] == TestResult.NOT_TESTED:
+		test_content.bitrate[2] = TestResult.FAIL
+	if test_content.duration[2] == TestResult.NOT_TESTED:
+		test_content.duration[2] = TestResult.FAIL
+	if test_content.mpd_sample_duration_delta[2] == TestResult.NOT_TESTED:
+		test_content.mpd_sample_duration_delta[2] = TestResult.FAIL
+
+
+def finish_stream_logs(test_content, frame_rate_family, debug_folder, seg_files):
+	trace_headers_filepath = trace_headers_filename(test_content, frame_rate_family)
+	
+	# If debug enabled, copy all detailed log files to a folder and zip for analysis
+	if debug_folder != '':
+		with DEBUG_ZIP_LOCK if DEBUG_ZIP_LOCK is not None else contextlib.nullcontext():
+			save_debug_logs(test_content, frame_rate_family, debug_folder, trace_headers_filepath, seg_files)
+	
+	# Remove log files created by ffmpeg and MP4Box
+	try:
+		os.remove(trace_headers_filepath)
+	except OSError as e:
+		if e.errno != errno.ENOENT:		# No such file or directory
+			raise
+	shutil.rmtree(box_dump_folder(test_content, frame_rate_family), ignore_errors=True)
+	
+	print()
+
+
+async def run_stream_tools(test_content, frame_rate_family, seg_files):
+	# With --boxparser mp4box, launch ffprobe and MP4Box at the same time and wait for both of them, so that the time
+	# taken for a stream is that of the slowest tool rather than the sum of all tools. ffmpeg is started before and
+	# keeps running during the checks, which read its output as it comes. Returns the InitSegmentInfo of the stream.
+	init_segment_path = str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME))
+	if BOX_PARSER != BOX_PARSER_MP4BOX:
+		# The init segment is only a few kilobytes, it is read natively
+		return read_init_segment_boxes(init_segment_path)
+	
+	source_videoproperties, _ = await asyncio.gather(probe_init_segment(test_content),
+													 dump_box_metadata(test_content, frame_rate_family, seg_files))
+	return init_segment_info_from_xml(box_dump_filepath(test_content, frame_rate_family, TS_INIT_SEGMENT_NAME),
+									  source_videoproperties)
+
+
+async def probe_init_segment(test_content):
+	# Read initial properties using ffprobe: codec name, sample entry / FourCC, resolution
+	ffprobe_cl = ['ffprobe', '-i', str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME)),
+		'-show_streams', '-select_streams', 'v', '-loglevel', '0', '-print_format', 'json']
+	ffprobe_process = await asyncio.create_subprocess_exec(*ffprobe_cl, stdout=subprocess.PIPE)
+	source_videoproperties, _ = await ffprobe_process.communicate()
+	if ffprobe_process.returncode != 0:
+		raise subprocess.CalledProcessError(ffprobe_process.returncode, ffprobe_cl, source_videoproperties)
+	return source_videoproperties
+
+
+class StreamProcesses:
+	# ffmpeg and ffprobe runs over the full stream, started before the segment tools are awaited so that all of them
+	# run concurrently
+	def __init__(self, ffmpeg_process=None, ffprobe_process=None, stream_timing=None):
+		self.ffmpeg_process = ffmpeg_process  # None when ffmpeg is not needed or already completed
+		self.ffmpeg_log = None  # PipeDrain of the stderr of ffmpeg or saved log file, read by the checks
+		self.ffprobe_process = ffprobe_process
+		self.stream_timing = stream_timing  # Future of the StreamTimingInfo, None without --timingparser ffprobe
+	
+	def kill(self):
+		# Stop the tools still running when the checks did not complete
+		for process in [self.ffmpeg_process, self.ffprobe_process]:
+			if process is not None and process.poll() is None:
+				process.kill()
+				process.wait()
+	
+	def save_output(self, trace_headers_filepath):
+		# Wait for the runs to complete, writing the ffmpeg log to trace_headers_filepath as it comes, so that their
+		# output can be checked by another process. Returns the StreamToolOutput.
+		stream_tool_output = StreamToolOutput()
+		if self.ffmpeg_log is not None:
+			with open(trace_headers_filepath, 'wb') as trace_headers_file:
+				shutil.copyfileobj(io.BufferedReader(self.ffmpeg_log), trace_headers_file)
+			self.ffmpeg_process.wait()
+			stream_tool_output.trace_headers_filepath = trace_headers_filepath
+		if self.stream_timing is not None:
+			stream_tool_output.stream_timing_info = self.stream_timing.result()
+		return stream_tool_output
+
+
+class StreamToolOutput:
+	# Output of the completed ffmpeg and ffprobe runs over the full stream, handed over to the analysis worker
+	# processes of the pipeline
+	def __init__(self, trace_headers_filepath=None, stream_timing_info=None):
+		self.trace_headers_filepath = trace_headers_filepath  # None when ffmpeg was not needed
+		self.stream_timing_info = stream_timing_info  # None without --timingparser ffprobe
+	
+	def stream_processes(self):
+		# StreamProcesses reading the saved output, as check_stream reads that of the running tools
+		stream_processes = StreamProcesses()
+		if self.trace_headers_filepath is not None:
+			stream_processes.ffmpeg_log = open(self.trace_headers_filepath, 'rb', buffering=0)
+		if self.stream_timing_info is not None:
+			stream_processes.stream_timing = concurrent.futures.Future()
+			stream_processes.stream_timing.set_result(self.stream_timing_info)
+		return stream_processes
+
+
+def start_stream_processes(test_content, codec_name=None):
+	# Whether ffmpeg traces the headers depends on the codec. When the init segment was not read yet, the codec is
+	# read natively from its sample entry, the init segment is only a few kilobytes.
+	if codec_name is None and HEADER_PARSER == HEADER_PARSER_NATIVE:
+		codec_name = read_init_segment_boxes(
+			str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME))).codec_name
+	scan_samples = native_header_codec(codec_name)
+	stream_processes = StreamProcesses()
+	if TIMING_PARSER == TIMING_PARSER_FFPROBE:
+		# The packets are read by a thread as they come, so that ffprobe never waits on a full pipe
+		stream_processes.ffprobe_process = start_stream_timing_probe(test_content)
+		timing_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+		stream_processes.stream_timing = timing_executor.submit(read_stream_timing, stream_processes.ffprobe_process)
+		timing_executor.shutdown(wait=False)
+	if not scan_samples or TIMING_PARSER == TIMING_PARSER_FFMPEG:
+		# The log is drained by a thread from the start, so that ffmpeg never waits on a full pipe either
+		stream_processes.ffmpeg_process = start_stream_trace(test_content, not scan_samples)
+		stream_processes.ffmpeg_log = PipeDrain(stream_processes.ffmpeg_process.stderr)
+	return stream_processes
+
+
+class PipeDrain(io.RawIOBase):
+	# Reads a pipe from a thread as the process writes it, and hands the blocks read over in order to the reader of
+	# this file object. Blocks not read yet are kept in memory.
+	def __init__(self, pipe):
+		super().__init__()
+		self.blocks = queue.Queue()
+		self.block = b''
+		self.eof = False
+		self.drain_thread = threading.Thread(target=self.drain, args=(pipe,), daemon=True)
+		self.drain_thread.start()
+	
+	def drain(self, pipe):
+		try:
+			for block in iter(lambda: pipe.read1(PIPE_READ_SIZE), b''):
+				self.blocks.put(block)
+		finally:
+			pipe.close()
+			self.blocks.put(b'')
+	
+	def readable(self):
+		return True
+	
+	def readinto(self, buffer):
+		if not self.block and not self.eof:
+			self.block = self.blocks.get()
+			self.eof = self.block == b''
+		size = min(len(buffer), len(self.block))
+		buffer[:size] = self.block[:size]
+		self.block = self.block[size:]
+		return size
+
+
+def start_stream_trace(test_content, trace_headers=True):
+	# Read detailed properties using ffmpeg, its log is read from the stderr pipe. When the headers are decoded
+	# natively, ffmpeg only reports the stream properties (frame rate, bitrate) and the number of frames.
+	ffmpeg_cl = ['ffmpeg',
+		'-i', str(Path(test_content.test_file_path+sep+TS_MPD_NAME)),
+		'-c', 'copy',
+		'-f', 'null', '-']
+	if trace_headers:
+		ffmpeg_cl[5:5] = ['-bsf:v', 'trace_headers']
+		print('Running ffmpeg trace_headers on full stream...')
+	else:
+		print('Running ffmpeg on full stream...')
+	return subprocess.Popen(ffmpeg_cl, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+class StreamTimingInfo:
+	# Packets of the video stream listed by ffprobe -show_packets. Timestamps are kept in time_base units, so that the
+	# duration, frame rate and bitrates are computed with exact fractions.
+	def __init__(self):
+		self.time_base = Fraction(1, 1)
+		self.frame_count = 0
+		self.start_pts = None
+		self.end_pts = None  # Largest pts + duration
+		self.total_size = 0
+		self.packet_sizes = []  # pts and size of each packet, summed per second once the time base is known
+		self.keyframes = []  # Index of the key frames in decode order
+	
+	def duration(self):
+		# In seconds
+		if self.start_pts is None:
+			return Fraction(0)
+		return (self.end_pts - self.start_pts) * self.time_base
+	
+	def frame_rate(self):
+		return Fraction(self.frame_count) / self.duration()
+	
+	def average_bitrate(self):
+		# In kb/s, as reported by ffmpeg
+		return round(Fraction(self.total_size * 8, 1000) / self.duration())
+	
+	def peak_bitrate(self):
+		# Largest number of kilobits in one second of presentation time
+		second_sizes = Counter()
+		for pts, size in self.packet_sizes:
+			second_sizes[(pts - self.start_pts) * self.time_base.numerator // self.time_base.denominator] += size
+		return round(Fraction(max(second_sizes.values(), default=0) * 8, 1000))
+
+
+def check_stream_timing(test_content, frame_rate_family, stream_timing_info):
+	# Check the frame rate, bitrate and duration computed from the ffprobe packets, returns the frame rate
+	print('ffprobe packets = '+str(stream_timing_info.frame_count)+', time base = '+str(stream_timing_info.time_base))
+	frame_rate = stream_timing_info.frame_rate()
+	file_frame_rate = check_frame_rate(
+		test_content, frame_rate_family,
+		float((Decimal(frame_rate.numerator) / Decimal(frame_rate.denominator)).quantize(Decimal('.001'), rounding=ROUND_DOWN)),
+		'ffprobe detected')
+	check_bitrate(test_content, stream_timing_info.average_bitrate())
+	print('Peak bitrate = '+str(stream_timing_info.peak_bitrate())+'kb/s')
+	print('Key frames = '+str(len(stream_timing_info.keyframes))+' at frame(s) '
+		  + ','.join([str(keyframe) for keyframe in stream_timing_info.keyframes]))
+	check_duration(test_content, round(float(stream_timing_info.duration()), 3), file_frame_rate)
+	return file_frame_rate
+
+
+def start_stream_timing_probe(test_content):
+	# List the pts, duration, size and flags of every packet of the video stream with ffprobe
+	ffprobe_cl = ['ffprobe', '-i', str(Path(test_content.test_file_path+sep+TS_MPD_NAME)),
+		'-select_streams', 'v:0', '-show_entries', 'packet=pts,dts,duration,size,flags:stream=time_base',
+		'-loglevel', 'error', '-print_format', 'compact']
+	print('Running ffprobe -show_packets on full stream...')
+	return subprocess.Popen(ffprobe_cl, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+
+
+def read_stream_timing(ffprobe_process):
+	# Read the packets as they come from the stdout pipe of ffprobe
+	stream_timing_info = StreamTimingInfo()
+	for line in io.TextIOWrapper(ffprobe_process.stdout, encoding="utf-8"):
+		section, _, fields = line.rstrip('\n').partition('|')
+		values = dict(field.split('=', 1) for field in fields.split('|') if '=' in field)
+		if section == 'stream':
+			if values.get('time_base', '').count('/') == 1:
+				stream_timing_info.time_base = Fraction(values['time_base'])
+			continue
+		if section != 'packet':
+			continue
+		if 'K' in values.get('flags', ''):
+			stream_timing_info.keyframes.append(stream_timing_info.frame_count)
+		stream_timing_info.frame_count += 1
+		size = int(values['size']) if values.get('size', 'N/A') != 'N/A' else 0
+		stream_timing_info.total_size += size
+		pts = values.get('pts', 'N/A') if values.get('pts', 'N/A') != 'N/A' else values.get('dts', 'N/A')
+		if pts == 'N/A':
+			continue
+		pts = int(pts)
+		end_pts = pts + (int(values['duration']) if values.get('duration', 'N/A') != 'N/A' else 0)
+		if stream_timing_info.start_pts is None or pts < stream_timing_info.start_pts:
+			stream_timing_info.start_pts = pts
+		if stream_timing_info.end_pts is None or end_pts > stream_timing_info.end_pts:
+			stream_timing_info.end_pts = end_pts
+		stream_timing_info.packet_sizes.append((pts, size))
+	ffprobe_process.wait()
+	if ffprobe_process.returncode != 0:
+		raise subprocess.CalledProcessError(ffprobe_process.returncode, ffprobe_process.args)
+	return stream_timing_info
+
+
+async def dump_box_metadata(test_content, frame_rate_family, seg_files):
+	# Use MP4Box to dump IsoMedia file box metadata for analysis. The XML is written to stdout (-std), which is
+	# redirected to the scratch folder of the stream.
+	os.makedirs(box_dump_folder(test_content, frame_rate_family), exist_ok=True)
+	if MP4BOX_BATCH:
+		await dump_stream_box_metadata(test_content, frame_rate_family, seg_files)
+		return
+	
+	MP4Box_cl = ['MP4Box',
+		str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME)),
+		'-diso', '-std']
+	
+	print('Running MP4Box to dump IsoMedia file box metadata from init and first segments to XML...')
+	with open(box_dump_filepath(test_content, frame_rate_family, TS_INIT_SEGMENT_NAME), 'wb') as box_dump_file:
+		MP4Box_process = await asyncio.create_subprocess_exec(*MP4Box_cl, stdout=box_dump_file)
+		await MP4Box_process.wait()
+	
+	# Dump every segment, with at most SEGMENT_DUMP_WORKERS MP4Box processes running at the same time
+	segment_dump_slots = asyncio.Semaphore(SEGMENT_DUMP_WORKERS)
+	await asyncio.gather(*[dump_segment_box_metadata(test_content, frame_rate_family, m4s, segment_dump_slots)
+						   for m4s in seg_files if m4s.endswith('.m4s')])
+
+
+async def dump_stream_box_metadata(test_content, frame_rate_family, seg_files):
+	# Dump the init segment followed by all the segments of the stream in a single MP4Box run, on a scratch copy of
+	# their concatenation, then split the XML back into the usual dump of each segment
+	segment_names = [TS_INIT_SEGMENT_NAME] + [m4s for m4s in seg_files if m4s.endswith('.m4s')]
+	stream_filepath = str(Path(box_dump_folder(test_content, frame_rate_family)+sep+TS_STREAM_DUMP_NAME))
+	segment_ends = []
+	with open(stream_filepath, 'wb') as stream_file:
+		for segment_name in segment_names:
+			with open(str(Path(test_content.test_file_path+sep+'1'+sep+segment_name)), 'rb') as segment_file:
+				shutil.copyfileobj(segment_file, stream_file)
+			segment_ends.append(stream_file.tell())
+	
+	MP4Box_cl = ['MP4Box', stream_filepath, '-diso', '-std']
+	print('Running MP4Box to dump IsoMedia file box metadata from init and all segments to XML...')
+	try:
+		with open(box_dump_filepath(test_content, frame_rate_family, TS_STREAM_DUMP_NAME), 'wb') as box_dump_file:
+			MP4Box_process = await asyncio.create_subprocess_exec(*MP4Box_cl, stdout=box_dump_file)
+			await MP4Box_process.wait()
+	finally:
+		os.remove(stream_filepath)
+	split_box_dump(box_dump_filepath(test_content, frame_rate_family, TS_STREAM_DUMP_NAME), segment_ends,
+				   [box_dump_filepath(test_content, frame_rate_family, segment_name) for segment_name in segment_names])
+	os.remove(box_dump_filepath(test_content, frame_rate_family, TS_STREAM_DUMP_NAME))
+
+
+def split_box_dump(xml_filepath, segment_ends, segment_xml_filepaths):
+	# Write each top level box of an MP4Box -diso dump of concatenated segments to the dump of the segment it comes
+	# from, found from the cumulative box Size and the end offset of each segment in the concatenation. The XML is
+	# parsed incrementally and each box is cleared once written.
+	segment_index = -1
+	segment_xml_file = None
+	root_start = b''
+	root_end = b''
+	box_offset = 0
+	depth = 0
+	try:
+		for event, element in etree.iterparse(xml_filepath, events=('start', 'end')):
+			if event == 'start':
+				if depth == 0:
+					root_qname = etree.QName(element)
+					root_start = ('<' + root_qname.localname
+								  + (' xmlns="' + root_qname.namespace + '"' if root_qname.namespace else '')
+								  + '>\n').encode()
+					root_end = ('</' + root_qname.localname + '>\n').encode()
+				depth += 1
+				continue
+			depth -= 1
+			if depth != 1:
+				continue
+			if element.get("Size") is not None:
+				while segment_index < len(segment_ends) - 1 \
+						and (segment_index < 0 or box_offset >= segment_ends[segment_index]):
+					if segment_xml_file is not None:
+						segment_xml_file.write(root_end)
+						segment_xml_file.close()
+					segment_index += 1
+					segment_xml_file = open(segment_xml_filepaths[segment_index], 'wb')
+					segment_xml_file.write(b'<?xml version="1.0" encoding="UTF-8"?>\n' + root_start)
+				segment_xml_file.write(etree.tostring(element))
+				box_offset += int(element.get("Size"))
+			element.clear()
+			while element.getprevious() is not None:
+				del element.getparent()[0]
+	finally:
+		if segment_xml_file is not None:
+			segment_xml_file.write(root_end)
+			segment_xml_file.close()
+
+
+async def dump_segment_box_metadata(test_content, frame_rate_family, m4s, segment_dump_slots):
+	MP4Box_cl2 = ['MP4Box',
+				  str(Path(test_content.test_file_path + sep + '1' + sep + m4s)),
+				  '-init-seg',
+				  str(Path(test_content.test_file_path + sep + '1' + sep + TS_INIT_SEGMENT_NAME)),
+				  '-diso', '-std']
+	async with segment_dump_slots:
+		# print('Running MP4Box to dump IsoMedia file box metadata from segment to XML...')
+		with open(box_dump_filepath(test_content, frame_rate_family, m4s), 'wb') as box_dump_file:
+			MP4Box_process = await asyncio.create_subprocess_exec(*MP4Box_cl2, stdout=box_dump_file)
+			await MP4Box_process.wait()
+
+
+class TrackRunEntryInfo:
+	# Fields of a TrackRunBox (trun) sample entry used by the fragment checks
+	def __init__(self, duration=None, size=None, flags_present=False):
+		self.duration = duration
+		self.size = size
+		self.flags_present = flags_present
+
+
+class TrackRunInfo:
+	# Fields of a TrackRunBox (trun) used by the fragment checks
+	def __init__(self):
+		self.version = None
+		self.sample_count = 0
+		self.sample_duration = None  # Only set from an MP4Box dump that has TrackRunBox@SampleDuration
+		self.sample_flags_present = False  # Idem for the sample flags attributes of TrackRunBox
+		self.first_sample_flags_present = None  # None when the trun has no first sample flags
+		self.data_offset = None  # Offset of the sample data from the base data offset of the traf
+		self.entries = []
+
+
+class TrackFragmentInfo:
+	# Fields of a TrackFragmentBox (traf) and its tfhd, tfdt and trun boxes used by the fragment checks
+	def __init__(self):
+		self.sample_description_index = None
+		self.default_sample_duration = None
+		self.default_sample_size = None
+		self.default_sample_flags_present = False
+		self.base_media_decode_time = None
+		self.base_data_offset = None  # File offset of the sample data base, the moof unless set in tfhd
+		self.track_runs = []
+
+
+class FragmentInfo:
+	# Track fragments and number of MediaDataBox (mdat) of one segment file, one moof/mdat pair per CMAF chunk
+	def __init__(self):
+		self.track_fragments = []
+		self.media_data_boxes = 0
+
+
+def read_fragment_info(test_content, frame_rate_family, m4s):
+	if BOX_PARSER == BOX_PARSER_MP4BOX:
+		return fragment_info_from_xml(box_dump_filepath(test_content, frame_rate_family, m4s))
+	return read_fragment_boxes(str(Path(test_content.test_file_path + sep + '1' + sep + m4s)))
+
+
+def fragment_info_from_xml(xml_filepath):
+	# Read the fragment fields from the XML written by MP4Box -diso. The XML is parsed incrementally and each traf,
+	# moof and mdat element is cleared once read, so that memory does not grow with the size of the segment.
+	fragment_info = FragmentInfo()
+	for _, element in etree.iterparse(xml_filepath, events=('end',),
+									  tag=('{*}TrackFragmentBox', '{*}MovieFragmentBox', '{*}MediaDataBox')):
+		if etree.QName(element).localname == 'TrackFragmentBox':
+			fragment_info.track_fragments.append(track_fragment_from_xml(element))
+			element.clear()
+			continue
+		if etree.QName(element).localname == 'MediaDataBox':
+			fragment_info.media_data_boxes += 1
+		element.clear()
+		while element.getprevious() is not None:
+			del element.getparent()[0]
+	return fragment_info
+
+
+def track_fragment_from_xml(traf):
+	track_fragment = TrackFragmentInfo()
+	tfhd = traf.findall('.//{*}TrackFragmentHeaderBox')[0]
+	if tfhd.get("SampleDescriptionIndex"):
+		track_fragment.sample_description_index = int(tfhd.get("SampleDescriptionIndex"))
+	if tfhd.get("SampleDuration"):
+		track_fragment.default_sample_duration = int(tfhd.get("SampleDuration"))
+	if tfhd.get("SampleSize"):
+		track_fragment.default_sample_size = int(tfhd.get("SampleSize"))
+	track_fragment.default_sample_flags_present = bool(
+		tfhd.get("SamplePadding") and tfhd.get("Sync") and tfhd.get("DegradationPriority")
+		and tfhd.get("IsLeading") and tfhd.get("DependsOn") and tfhd.get("IsDependedOn")
+		and tfhd.get("HasRedundancy"))
+	tfdt = traf.findall('.//{*}TrackFragmentBaseMediaDecodeTimeBox')
+	if tfdt and tfdt[0].get("baseMediaDecodeTime"):
+		track_fragment.base_media_decode_time = int(tfdt[0].get("baseMediaDecodeTime"))
+	
+	for trun in traf.findall('.//{*}TrackRunBox'):
+		track_run = TrackRunInfo()
+		if trun.get("Version"):
+			track_run.version = int(trun.get("Version"))
+		track_run.sample_count = int(trun.get("SampleCount"))
+		if trun.get("SampleDuration"):
+			track_run.sample_duration = int(trun.get("SampleDuration"))
+		track_run.sample_flags_present = bool(
+			trun.get("SamplePadding") and trun.get("Sync") and trun.get("DegradationPriority")
+			and trun.get("IsLeading") and trun.get("DependsOn") and trun.get("IsDependedOn")
+			and trun.get("HasRedundancy"))
+		trun_first_sample_flags = trun.findall('.//{*}FirstSampleFlags')
+		if trun_first_sample_flags:
+			track_run.first_sample_flags_present = bool(
+				trun_first_sample_flags[0].get("SamplePadding") and trun_first_sample_flags[0].get("SampleSync")
+				and trun_first_sample_flags[0].get("SampleDegradationPriority")
+				and trun_first_sample_flags[0].get("IsLeading") and trun_first_sample_flags[0].get("SampleDependsOn")
+				and trun_first_sample_flags[0].get("SampleIsDependedOn")
+				and trun_first_sample_flags[0].get("SampleHasRedundancy"))
+		for trune in trun.findall('.//{*}TrackRunEntry'):
+			# Depending on the GPAC version, the sample duration of a TrackRunEntry is SampleDuration or Duration
+			trune_duration = trune.get("SampleDuration") or trune.get("Duration")
+			track_run.entries.append(TrackRunEntryInfo(
+				int(trune_duration) if trune_duration else None,
+				int(trune.get("Size")) if trune.get("Size") else None,
+				bool(trune.get("SamplePadding") and trune.get("Sync") and trune.get("DegradationPriority")
+					 and trune.get("IsLeading") and trune.get("DependsOn") and trune.get("IsDependedOn")
+					 and trune.get("HasRedundancy"))))
+		track_fragment.track_runs.append(track_run)
+	return track_fragment
+
+
+class SegmentFile:
+	# Read only memory mapping of a segment or init segment file. data is a memoryview of the whole file, the box,
+	# NAL unit and OBU readers take slices of it so that segments are never copied in full.
+	def __init__(self, filepath):
+		self.filepath = filepath
+		self.users = 1
+		self.mapping = None
+		with open(filepath, 'rb') as segment_file:
+			if os.fstat(segment_file.fileno()).st_size > 0:
+				self.mapping = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+		self.data = memoryview(self.mapping) if self.mapping is not None else memoryview(b'')
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, exc_type, exc_value, exc_traceback):
+		self.close()
+	
+	def close(self):
+		# Unmap the file once the last reader sharing the mapping is done with it
+		with mapped_segment_files_lock:
+			self.users -= 1
+			if self.users > 0:
+				return
+			del mapped_segment_files[self.filepath]
+		self.data.release()
+		if self.mapping is not None:
+			try:
+				self.mapping.close()
+			except BufferError:
+				pass  # Slices still referenced by a reader keep the mapping until they are freed
+
+
+mapped_segment_files = {}  # SegmentFile per file path, while at least one reader uses it
+mapped_segment_files_lock = threading.Lock()
+
+
+def map_segment_file(filepath):
+	# Returns the mapping of a file, shared with the readers that already mapped it
+	with mapped_segment_files_lock:
+		segment_file = mapped_segment_files.get(filepath)
+		if segment_file is None:
+			segment_file = SegmentFile(filepath)
+			mapped_segment_files[filepath] = segment_file
+		else:
+			segment_file.users += 1
+	return segment_file
+
+
+def iter_boxes(data, start=0, end=None):
+	# Yields the type, payload start and payload end of the boxes contained in data[start:end]
+	if end is None:
+		end = len(data)
+	offset = start
+	while offset + 8 <= end:
+		box_size, box_type = struct.unpack_from('>I4s', data, offset)
+		box_header_size = 8
+		if box_size == 1:
+			box_size = struct.unpack_from('>Q', data, offset + 8)[0]
+			box_header_size = 16
+		elif box_size == 0:
+			box_size = end - offset
+		if box_size < box_header_size or offset + box_size > end:
+			break
+		yield box_type, offset + box_header_size, offset + box_size
+		offset += box_size
+
+
+def read_fragment_boxes(m4s_filepath):
+	# Read the fragment fields straight from the mapped segment file, the mdat payloads are not touched
+	fragment_info = FragmentInfo()
+	with map_segment_file(m4s_filepath) as segment_file:
+		box_offset = 0
+		for box_type, box_start, box_end in iter_boxes(segment_file.data):
+			if box_type == b'moof':
+				for moof_box_type, traf_start, traf_end in iter_boxes(segment_file.data, box_start, box_end):
+					if moof_box_type == b'traf':
+						fragment_info.track_fragments.append(
+							parse_traf(segment_file.data, traf_start, traf_end, box_offset))
+			elif box_type == b'mdat':
+				fragment_info.media_data_boxes += 1
+			box_offset = box_end
+	return fragment_info
+
+
+def parse_traf(data, start, end, moof_offset):
+	track_fragment = TrackFragmentInfo()
+	track_fragment.base_data_offset = moof_offset
+	for box_type, box_start, box_end in iter_boxes(data, start, end):
+		if box_type == b'tfhd':
+			tfhd_flags = struct.unpack_from('>I', data, box_start)[0] & 0xFFFFFF
+			field_offset = box_start + 8  # Version, flags and track_ID
+			if tfhd_flags & 0x000001:  # base-data-offset-present
+				track_fragment.base_data_offset = struct.unpack_from('>Q', data, field_offset)[0]
+				field_offset += 8
+			if tfhd_flags & 0x000002:  # sample-description-index-present
+				track_fragment.sample_description_index = struct.unpack_from('>I', data, field_offset)[0]
+				field_offset += 4
+			if tfhd_flags & 0x000008:  # default-sample-duration-present
+				track_fragment.default_sample_duration = struct.unpack_from('>I', data, field_offset)[0]
+				field_offset += 4
+			if tfhd_flags & 0x000010:  # default-sample-size-present
+				track_fragment.default_sample_size = struct.unpack_from('>I', data, field_offset)[0]
+				field_offset += 4
+			track_fragment.default_sample_flags_present = bool(tfhd_flags & 0x000020)  # default-sample-flags-present
+		elif box_type == b'tfdt':
+			if data[box_start] == 1:
+				track_fragment.base_media_decode_time = struct.unpack_from('>Q', data, box_start + 4)[0]
+			else:
+				track_fragment.base_media_decode_time = struct.unpack_from('>I', data, box_start + 4)[0]
+		elif box_type == b'trun':
+			track_fragment.track_runs.append(parse_trun(data, box_start))
+	return track_fragment
+
+
+def parse_trun(data, start):
+	track_run = TrackRunInfo()
+	trun_version_flags, track_run.sample_count = struct.unpack_from('>II', data, start)
+	track_run.version = trun_version_flags >> 24
+	trun_flags = trun_version_flags & 0xFFFFFF
+	field_offset = start + 8
+	if trun_flags & 0x000001:  # data-offset-present
+		track_run.data_offset = struct.unpack_from('>i', data, field_offset)[0]
+		field_offset += 4
+	if trun_flags & 0x000004:  # first-sample-flags-present
+		track_run.first_sample_flags_present = True
+		field_offset += 4
+	# Like MP4Box, only list sample entries when they carry at least one field
+	if not trun_flags & 0x000F00:
+		return track_run
+	sample_duration_present = bool(trun_flags & 0x000100)
+	sample_size_present = bool(trun_flags & 0x000200)
+	sample_flags_present = bool(trun_flags & 0x000400)
+	sample_cto_present = bool(trun_flags & 0x000800)
+	for i in range(track_run.sample_count):
+		sample_duration = None
+		sample_size = None
+		if sample_duration_present:
+			sample_duration = struct.unpack_from('>I', data, field_offset)[0]
+			field_offset += 4
+		if sample_size_present:
+			sample_size = struct.unpack_from('>I', data, field_offset)[0]
+			field_offset += 4
+		if sample_flags_present:
+			field_offset += 4
+		if sample_cto_present:
+			field_offset += 4
+		track_run.entries.append(TrackRunEntryInfo(sample_duration, sample_size, sample_flags_present))
+	return track_run
+
+
+class InitSegmentInfo:
+	# Fields of the CMAF header (init segment) used by the checks
+	def __init__(self):
+		self.codec_name = ''  # ffprobe codec_name, e.g. h264 or hevc
+		self.sample_entry_type = ''
+		self.width = 0
+		self.height = 0
+		self.timescale = None
+		self.brands = []  # Major brand followed by the compatible brands
+		self.trex_default_sample_duration = None
+		self.trex_default_sample_size = None
+		self.trex_default_sample_flags_present = False
+		self.parameter_sets = {}  # NAL units of the decoder configuration record per nal_unit_type
+		self.nal_length_size = 4  # Size of the NAL unit length field of the samples
+
+
+SLICE_HEADER_READ_SIZE = 32  # Bytes at the start of a slice or PPS needed to decode its first fields
+OBU_PREFIX_READ_SIZE = 10  # Bytes needed to decode an OBU header, its extension and the leb128 obu_size
+# AV1 obu_type values
+OBU_SEQUENCE_HEADER = 1
+OBU_FRAME_HEADER = 3
+OBU_METADATA = 5
+OBU_FRAME = 6
+# AV1 metadata_type values
+METADATA_TYPE_HDR_CLL = 1
+METADATA_TYPE_HDR_MDCV = 2
+# SEI payloadType values
+SEI_PIC_TIMING = 1
+SEI_MASTERING_DISPLAY_COLOUR_VOLUME = 137
+SEI_CONTENT_LIGHT_LEVEL_INFO = 144
+SEI_ALTERNATIVE_TRANSFER_CHARACTERISTICS = 147
+
+# Codec name reported by ffprobe for each sample entry type
+sample_entry_codec_names = {'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc',
+							'av01': 'av1', 'vvc1': 'vvc', 'vvi1': 'vvc'}
+
+
+# Elements of an MP4Box -diso dump of the init segment read into InitSegmentInfo, selected in a single XPath evaluation
+init_segment_xpath = etree.XPath(
+	"//*[local-name()='FileTypeBox' or local-name()='BrandEntry' or local-name()='MediaHeaderBox'"
+	" or local-name()='TrackExtendsBox' or local-name()='SequenceParameterSet' or local-name()='PictureParameterSet'"
+	" or local-name()='ParameterSetArray' or local-name()='AVCDecoderConfigurationRecord'"
+	" or local-name()='HEVCDecoderConfigurationRecord']")
+default_sample_flags_xpath = etree.XPath("descendant::*[local-name()='DefaultSampleFlags']")
+# Parameter set contents are written as data:application/octet-string,<hex>, nal_unit_type per element name
+xml_parameter_set_types = {'SequenceParameterSet': 7, 'PictureParameterSet': 8}
+
+
+def init_segment_info_from_xml(xml_filepath, source_videoproperties):
+	# Read the init segment fields from the ffprobe JSON output and the XML written by MP4Box -diso
+	init_segment_info = InitSegmentInfo()
+	source_videoproperties_json = json.loads(source_videoproperties)
+	init_segment_info.codec_name = source_videoproperties_json['streams'][0]['codec_name']
+	init_segment_info.sample_entry_type = source_videoproperties_json['streams'][0]['codec_tag_string']
+	init_segment_info.width = source_videoproperties_json['streams'][0]['width']
+	init_segment_info.height = source_videoproperties_json['streams'][0]['height']
+	trex_found = False
+	
+	# Single pass over the boxes of the dump, in document order
+	for element in init_segment_xpath(etree.parse(xml_filepath)):
+		box_name = etree.QName(element).localname
+		if box_name == 'MediaHeaderBox':
+			if init_segment_info.timescale is None and element.get("TimeScale") is not None:
+				init_segment_info.timescale = int(element.get("TimeScale"))
+		elif box_name == 'TrackExtendsBox':
+			if trex_found:
+				continue
+			trex_found = True
+			if element.get("SampleDuration"):
+				init_segment_info.trex_default_sample_duration = int(element.get("SampleDuration"))
+			if element.get("SampleSize"):
+				init_segment_info.trex_default_sample_size = int(element.get("SampleSize"))
+			trex_dsf = default_sample_flags_xpath(element)
+			if trex_dsf:
+				init_segment_info.trex_default_sample_flags_present = bool(
+					trex_dsf[0].get("SamplePadding") and trex_dsf[0].get("SampleSync")
+					and trex_dsf[0].get("SampleDegradationPriority") and trex_dsf[0].get("IsLeading")
+					and trex_dsf[0].get("SampleDependsOn") and trex_dsf[0].get("SampleIsDependedOn")
+					and trex_dsf[0].get("SampleHasRedundancy"))
+		elif box_name == 'FileTypeBox':
+			init_segment_info.brands.append(element.get("MajorBrand"))
+		elif box_name == 'BrandEntry':
+			init_segment_info.brands.append(element.get("AlternateBrand"))
+		elif box_name in xml_parameter_set_types:
+			init_segment_info.parameter_sets.setdefault(xml_parameter_set_types[box_name], []).append(
+				bytes.fromhex(element.get("content").split(',')[-1]))
+		elif box_name == 'ParameterSetArray':
+			init_segment_info.parameter_sets.setdefault(int(element.get("nalu_type")), []).extend(
+				[bytes.fromhex(parameter_set.get("content").split(',')[-1]) for parameter_set in element])
+		elif box_name == 'AVCDecoderConfigurationRecord':
+			if element.get("LengthSizeMinusOne"):
+				init_segment_info.nal_length_size = int(element.get("LengthSizeMinusOne")) + 1
+		elif box_name == 'HEVCDecoderConfigurationRecord':
+			if element.get("nal_unit_size"):
+				init_segment_info.nal_length_size = int(element.get("nal_unit_size"))
+	if not trex_found:
+		raise IndexError('No TrackExtendsBox in ' + xml_filepath)
+	return init_segment_info
+
+
+def read_init_segment_boxes(init_filepath):
+	# Read the init segment fields straight from the mapped file, in a single pass over its boxes
+	init_segment_info = InitSegmentInfo()
+	video_track_id = None
+	trex_list = []
+	with map_segment_file(init_filepath) as segment_file:
+		data = segment_file.data
+		for box_type, box_start, box_end in iter_boxes(data):
+			if box_type == b'ftyp':
+				init_segment_info.brands.append(bytes(data[box_start:box_start + 4]).decode('ascii', 'replace'))
+				init_segment_info.brands += [bytes(data[i:i + 4]).decode('ascii', 'replace')
+										 for i in range(box_start + 8, box_end - 3, 4)]
+			elif box_type == b'moov':
+				for moov_box_type, moov_box_start, moov_box_end in iter_boxes(data, box_start, box_end):
+					if moov_box_type == b'trak' and video_track_id is None:
+						video_track_id = parse_video_trak(data, moov_box_start, moov_box_end, init_segment_info)
+					elif moov_box_type == b'mvex':
+						for mvex_box_type, trex_start, trex_end in iter_boxes(data, moov_box_start, moov_box_end):
+							if mvex_box_type == b'trex':
+								# Version and flags, track_ID, default_sample_description_index, default_sample_duration,
+								# default_sample_size, default_sample_flags
+								trex_list.append(struct.unpack_from('>IIIIII', data, trex_start)[1:])
+	
+	# Defaults of the video track, or of the first track extended
+	video_trex_list = [trex for trex in trex_list if trex[0] == video_track_id] or trex_list
+	if video_trex_list:
+		init_segment_info.trex_default_sample_duration = video_trex_list[0][2]
+		init_segment_info.trex_default_sample_size = video_trex_list[0][3]
+		init_segment_info.trex_default_sample_flags_present = True
+	return init_segment_info
+
+
+def parse_video_trak(data, start, end, init_segment_info):
+	# Fills init_segment_info and returns the track_ID when the trak is a video track, None otherwise
+	track_id = None
+	for box_type, box_start, box_end in iter_boxes(data, start, end):
+		if box_type == b'tkhd':
+			track_id = struct.unpack_from('>I', data, box_start + (20 if data[box_start] == 1 else 12))[0]
+		elif box_type == b'mdia':
+			mdia_boxes = {mdia_box_type: (mdia_box_start, mdia_box_end)
+						  for mdia_box_type, mdia_box_start, mdia_box_end in iter_boxes(data, box_start, box_end)}
+			if b'hdlr' not in mdia_boxes or data[mdia_boxes[b'hdlr'][0] + 8:mdia_boxes[b'hdlr'][0] + 12] != b'vide':
+				return None
+			if b'mdhd' in mdia_boxes:
+				mdhd_start = mdia_boxes[b'mdhd'][0]
+				init_segment_info.timescale = struct.unpack_from(
+					'>I', data, mdhd_start + (20 if data[mdhd_start] == 1 else 12))[0]
+			if b'minf' in mdia_boxes:
+				for minf_box_type, stbl_start, stbl_end in iter_boxes(data, *mdia_boxes[b'minf']):
+					if minf_box_type == b'stbl':
+						for stbl_box_type, stsd_start, stsd_end in iter_boxes(data, stbl_start, stbl_end):
+							if stbl_box_type == b'stsd':
+								# Version and flags, entry_count, then the first sample entry
+								for sample_entry_type, sample_entry_start, sample_entry_end in \
+										iter_boxes(data, stsd_start + 8, stsd_end):
+									parse_visual_sample_entry(data, sample_entry_type, sample_entry_start,
+															  sample_entry_end, init_segment_info)
+									break
+	return track_id
+
+
+def parse_visual_sample_entry(data, sample_entry_type, start, end, init_segment_info):
+	init_segment_info.sample_entry_type = sample_entry_type.decode('ascii', 'replace')
+	init_segment_info.codec_name = sample_entry_codec_names.get(
+		init_segment_info.sample_entry_type, init_segment_info.sample_entry_type)
+	# SampleEntry reserved and data_reference_index, VisualSampleEntry pre_defined and reserved, then width and height
+	init_segment_info.width, init_segment_info.height = struct.unpack_from('>HH', data, start + 24)
+	# Child boxes follow the 78 bytes of VisualSampleEntry fields
+	for box_type, box_start, box_end in iter_boxes(data, start + 78, end):
+		if box_type == b'avcC':
+			init_segment_info.nal_length_size = (data[box_start + 4] & 0x03) + 1
+			parse_avc_decoder_configuration(data, box_start, box_end, init_segment_info.parameter_sets)
+		elif box_type == b'hvcC':
+			init_segment_info.nal_length_size = (data[box_start + 21] & 0x03) + 1
+			parse_hevc_decoder_configuration(data, box_start, box_end, init_segment_info.parameter_sets)
+		elif box_type == b'av1C':
+			# marker, version, profile, level, tier and format fields, then the configOBUs
+			for obu in iter_obus(data, box_start + 4, box_end):
+				init_segment_info.parameter_sets.setdefault(obu_type(obu), []).append(bytes(obu))
+		elif box_type == b'vvcC':
+			# Version and flags, then reserved bits, LengthSizeMinusOne and ptl_present_flag
+			init_segment_info.nal_length_size = ((data[box_start + 4] >> 1) & 0x03) + 1
+			parse_vvc_decoder_configuration(data, box_start + 4, box_end, init_segment_info.parameter_sets)
+
+
+def parse_avc_decoder_configuration(data, start, end, parameter_sets):
+	# AVCDecoderConfigurationRecord: 5 bytes of profile, level and length size, then the SPS and PPS lists
+	offset = start + 5
+	for nal_unit_type, count_mask in [(7, 0x1F), (8, 0xFF)]:
+		if offset >= end:
+			break
+		parameter_set_count = data[offset] & count_mask
+		offset += 1
+		for i in range(parameter_set_count):
+			parameter_set_length = struct.unpack_from('>H', data, offset)[0]
+			parameter_sets.setdefault(nal_unit_type, []).append(bytes(data[offset + 2:offset + 2 + parameter_set_length]))
+			offset += 2 + parameter_set_length
+
+
+def parse_hevc_decoder_configuration(data, start, end, parameter_sets):
+	# HEVCDecoderConfigurationRecord: 22 bytes of profile, tier, level and format fields, then the NAL unit arrays
+	offset = start + 22
+	array_count = data[offset]
+	offset += 1
+	for i in range(array_count):
+		nal_unit_type = data[offset] & 0x3F
+		nal_unit_count = struct.unpack_from('>H', data, offset + 1)[0]
+		offset += 3
+		for j in range(nal_unit_count):
+			nal_unit_length = struct.unpack_from('>H', data, offset)[0]
+			parameter_sets.setdefault(nal_unit_type, []).append(bytes(data[offset + 2:offset + 2 + nal_unit_length]))
+			offset += 2 + nal_unit_length
+
+
+def parse_vvc_decoder_configuration(data, start, end, parameter_sets):
+	# VvcDecoderConfigurationRecord: format fields and the optional VvcPTLRecord, then the NAL unit arrays
+	bit_reader = BitReader(data[start:end])
+	bit_reader.skip(7)  # reserved and LengthSizeMinusOne
+	if bit_reader.u(1):  # ptl_present_flag
+		bit_reader.skip(9)  # ols_idx
+		num_sublayers = bit_reader.u(3)
+		bit_reader.skip(2 + 2 + 3 + 5)  # constant_frame_rate, chroma_format_idc, bit_depth_minus8 and reserved
+		bit_reader.skip(2)  # reserved
+		num_bytes_constraint_info = bit_reader.u(6)
+		bit_reader.skip(7 + 1 + 8)  # general_profile_idc, general_tier_flag and general_level_idc
+		bit_reader.skip(8 * num_bytes_constraint_info)  # ptl_frame_only_constraint_flag, ptl_multilayer_enabled_flag and general_constraint_info
+		sublayer_level_present = [bit_reader.u(1) for i in range(num_sublayers - 1)]
+		if num_sublayers > 1:
+			bit_reader.skip(9 - num_sublayers)  # ptl_reserved_zero_bit
+		bit_reader.skip(8 * sum(sublayer_level_present))  # sublayer_level_idc
+		bit_reader.skip(32 * bit_reader.u(8))  # ptl_num_sub_profiles and general_sub_profile_idc
+		bit_reader.skip(16 + 16 + 16)  # max_picture_width, max_picture_height and avg_frame_rate
+	offset = start + bit_reader.position // 8
+	array_count = data[offset]
+	offset += 1
+	for i in range(array_count):
+		nal_unit_type = data[offset] & 0x1F
+		# DCI and OPI arrays have a single NAL unit and no num_nalus
+		if nal_unit_type in (12, 13):
+			nal_unit_count = 1
+			offset += 1
+		else:
+			nal_unit_count = struct.unpack_from('>H', data, offset + 1)[0]
+			offset += 3
+		for j in range(nal_unit_count):
+			nal_unit_length = struct.unpack_from('>H', data, offset)[0]
+			parameter_sets.setdefault(nal_unit_type, []).append(bytes(data[offset + 2:offset + 2 + nal_unit_length]))
+			offset += 2 + nal_unit_length
+
+
+def first_media_data(data):
+	# Returns the payload of the first MediaDataBox (mdat) of a segment file
+	for box_type, box_start, box_end in iter_boxes(data):
+		if box_type == b'mdat':
+			return data[box_start:box_end]
+	return data[0:0]
+
+
+def iter_nal_units(data, nal_length_size, start=0, end=None):
+	# Yields the NAL units of length prefixed samples, as stored in the mdat of AVC and HEVC tracks
+	if end is None:
+		end = len(data)
+	offset = start
+	while offset + nal_length_size <= end:
+		nal_unit_length = int.from_bytes(data[offset:offset + nal_length_size], 'big')
+		offset += nal_length_size
+		if nal_unit_length == 0 or offset + nal_unit_length > end:
+			break
+		yield data[offset:offset + nal_unit_length]
+		offset += nal_unit_length
+
+
+def iter_obus(data, start=0, end=None):
+	# Yields the OBUs of AV1 samples or configOBUs, in the low overhead bitstream format
+	if end is None:
+		end = len(data)
+	offset = start
+	while offset < end:
+		try:
+			obu_payload_offset, obu_size = read_obu_header(data[offset:offset + OBU_PREFIX_READ_SIZE], end - offset)
+		except (ValueError, IndexError):
+			break
+		if offset + obu_payload_offset + obu_size > end:
+			break
+		yield data[offset:offset + obu_payload_offset + obu_size]
+		offset += obu_payload_offset + obu_size
+
+
+def read_obu_header(obu_prefix, obu_available):
+	# Returns the offset of the OBU payload after its header and obu_size, and the size of the payload. Without
+	# obu_has_size_field, the OBU lasts until the end of the data available.
+	obu_payload_offset = 2 if obu_prefix[0] & 0x04 else 1  # obu_extension_flag
+	if not obu_prefix[0] & 0x02:  # obu_has_size_field
+		return obu_payload_offset, obu_available - obu_payload_offset
+	obu_size = 0
+	for i in range(8):
+		leb128_byte = obu_prefix[obu_payload_offset]
+		obu_payload_offset += 1
+		obu_size |= (leb128_byte & 0x7F) << (i * 7)
+		if not leb128_byte & 0x80:
+			return obu_payload_offset, obu_size
+	raise ValueError('Invalid leb128 obu_size')
+
+
+def obu_type(obu):
+	# obu_type of the OBU header, 4 bits after the obu_forbidden_bit
+	return (obu[0] >> 3) & 0x0F
+
+
+class FragmentSampleInfo:
+	# Parameter sets and frame types found in the samples of one segment file
+	def __init__(self):
+		self.sample_count = 0
+		self.parameter_set_counts = Counter()  # Parameter sets of the fragment per name, e.g. SPS
+		self.parameter_set_samples = OrderedDict()  # Parameter sets per index in the fragment of the samples that have some
+		self.frame_types = Counter()  # Samples per frame type (I, P or B) of their first slice or frame header
+	
+	def add_parameter_set(self, name):
+		self.parameter_set_counts[name] += 1
+		self.parameter_set_samples.setdefault(self.sample_count, Counter())[name] += 1
+
+
+def scan_fragment_samples(m4s_filepath, fragment_info, codec_analyser, sei_info):
+	# Walk every sample of a segment file using the trun sample sizes, each sample is scanned by the codec analyser.
+	# sei_info is updated with the SEI or metadata messages of the samples.
+	fragment_sample_info = FragmentSampleInfo()
+	init_segment_info = codec_analyser.init_segment_info
+	with map_segment_file(m4s_filepath) as segment_file:
+		for traf in fragment_info.track_fragments:
+			sample_position = traf.base_data_offset
+			for trun in traf.track_runs:
+				if trun.data_offset is not None:
+					sample_position = traf.base_data_offset + trun.data_offset
+				for i in range(trun.sample_count):
+					sample_size = trun.entries[i].size if i < len(trun.entries) else None
+					if sample_size is None:
+						sample_size = traf.default_sample_size if traf.default_sample_size is not None \
+							else init_segment_info.trex_default_sample_size
+					if not sample_size:
+						break
+					codec_analyser.scan_sample(segment_file.data, sample_position, sample_size, fragment_sample_info, sei_info)
+					sample_position += sample_size
+					fragment_sample_info.sample_count += 1
+	return fragment_sample_info
+
+
+class SeiInfo:
+	# SEI messages found in the samples of a stream, the first occurrence of each is kept
+	def __init__(self, expected_payload_types, video_header_info):
+		self.expected_payload_types = set(expected_payload_types)
+		self.video_header_info = video_header_info  # Needed to decode the picture timing SEI
+		self.payload_types = set()
+		self.pic_struct = None
+		self.preferred_transfer_characteristics = None
+		self.mastering_display_colour_volume = None  # Primaries x and y of 3 colours, white point x and y, max and min luminance
+		self.content_light_level = None  # max_content_light_level and max_pic_average_light_level
+	
+	def complete(self):
+		# All expected SEI messages were seen, the remaining SEI NAL units need not be read
+		return self.expected_payload_types.issubset(self.payload_types)
+
+
+def read_sei_messages(nal_unit, nal_unit_header_size, sei_info):
+	# sei_rbsp() of ITU-T H.264, H.265 and H.266
+	rbsp = remove_emulation_prevention(nal_unit)
+	offset = nal_unit_header_size
+	while offset < len(rbsp) and rbsp[offset:] != b'\x80':
+		payload_type = 0
+		while offset < len(rbsp) and rbsp[offset] == 0xFF:
+			payload_type += 255
+			offset += 1
+		if offset >= len(rbsp):
+			break
+		payload_type += rbsp[offset]
+		offset += 1
+		payload_size = 0
+		while offset < len(rbsp) and rbsp[offset] == 0xFF:
+			payload_size += 255
+			offset += 1
+		if offset >= len(rbsp):
+			break
+		payload_size += rbsp[offset]
+		offset += 1
+		payload = rbsp[offset:offset + payload_size]
+		offset += payload_size
+		if payload_type in sei_info.payload_types:
+			continue
+		try:
+			read_sei_payload(payload_type, payload, sei_info)
+		except (ValueError, IndexError, struct.error):
+			continue
+		sei_info.payload_types.add(payload_type)
+
+
+def read_sei_payload(payload_type, payload, sei_info):
+	if payload_type == SEI_PIC_TIMING:
+		video_header_info = sei_info.video_header_info
+		if video_header_info is not None and video_header_info.pic_struct_present:
+			bit_reader = BitReader(payload)
+			if video_header_info.codec_name == 'h264' and video_header_info.cpb_dpb_delays_present:
+				bit_reader.skip(video_header_info.cpb_removal_delay_length + video_header_info.dpb_output_delay_length)
+			sei_info.pic_struct = bit_reader.u(4)
+	elif payload_type == SEI_ALTERNATIVE_TRANSFER_CHARACTERISTICS:
+		sei_info.preferred_transfer_characteristics = payload[0]
+	elif payload_type == SEI_MASTERING_DISPLAY_COLOUR_VOLUME:
+		sei_info.mastering_display_colour_volume = struct.unpack('>HHHHHHHHII', payload[:24])
+	elif payload_type == SEI_CONTENT_LIGHT_LEVEL_INFO:
+		sei_info.content_light_level = struct.unpack('>HH', payload[:4])
+
+
+def read_av1_metadata(obu_payload, sei_info):
+	# metadata_obu() of AV1, the HDR metadata is stored in sei_info with the units of the equivalent SEI messages
+	payload_offset, metadata_type = 0, 0
+	for i in range(8):
+		payload_offset += 1
+		metadata_type |= (obu_payload[i] & 0x7F) << (i * 7)
+		if not obu_payload[i] & 0x80:
+			break
+	payload = obu_payload[payload_offset:]
+	if metadata_type == METADATA_TYPE_HDR_CLL and SEI_CONTENT_LIGHT_LEVEL_INFO not in sei_info.payload_types:
+		sei_info.content_light_level = struct.unpack('>HH', payload[:4])
+		sei_info.payload_types.add(SEI_CONTENT_LIGHT_LEVEL_INFO)
+	elif metadata_type == METADATA_TYPE_HDR_MDCV and SEI_MASTERING_DISPLAY_COLOUR_VOLUME not in sei_info.payload_types:
+		mdcv = struct.unpack('>HHHHHHHHII', payload[:24])
+		# Chromaticities are 0.16 fixed point (SEI 0.00002 units), luminance_max 24.8 and luminance_min 18.14 fixed
+		# point (SEI 0.0001 cd/m2 units)
+		sei_info.mastering_display_colour_volume = tuple([round(chromaticity * 50000 / 65536) for chromaticity in mdcv[:8]]) \
+			+ (round(mdcv[8] * 10000 / 256), round(mdcv[9] * 10000 / 16384))
+		sei_info.payload_types.add(SEI_MASTERING_DISPLAY_COLOUR_VOLUME)
+
+
+def read_hevc_pps_extra_slice_header_bits(nal_unit, pps_extra_slice_header_bits):
+	# num_extra_slice_header_bits of an HEVC PPS, needed to locate slice_type in the slice headers that refer to it
+	try:
+		bit_reader = BitReader(remove_emulation_prevention(nal_unit), 16)
+		pps_pic_parameter_set_id = bit_reader.ue()
+		bit_reader.ue()  # pps_seq_parameter_set_id
+		bit_reader.skip(2)  # dependent_slice_segments_enabled_flag and output_flag_present_flag
+		pps_extra_slice_header_bits[pps_pic_parameter_set_id] = bit_reader.u(3)
+	except ValueError:
+		pass
+
+
+def remove_emulation_prevention(nal_unit):
+	# Removes the emulation_prevention_three_byte of every 0x000003 sequence to get the RBSP
+	return bytes(nal_unit).replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+class BitReader:
+	# Reads fixed length and Exp-Golomb coded fields from an RBSP
+	def __init__(self, data, position=0):
+		self.value = int.from_bytes(data, 'big')
+		self.size = len(data) * 8
+		self.position = position
+	
+	def u(self, bits):
+		if self.position + bits > self.size:
+			raise ValueError('Read past the end of the RBSP')
+		self.position += bits
+		return (self.value >> (self.size - self.position)) & ((1 << bits) - 1)
+	
+	def skip(self, bits):
+		self.position += bits
+	
+	def ue(self):
+		leading_zero_bits = 0
+		while self.u(1) == 0:
+			leading_zero_bits += 1
+		return (1 << leading_zero_bits) - 1 + self.u(leading_zero_bits)
+	
+	def se(self):
+		code_num = self.ue()
+		return (code_num + 1) // 2 if code_num % 2 else -(code_num // 2)
+
+
+class VideoHeaderInfo:
+	# Fields of the first sequence parameter set and its VUI, or AV1 sequence header, used by the checks
+	def __init__(self, codec_name):
+		self.codec_name = codec_name
+		self.profile_idc = None
+		self.tier_flag = None
+		self.level_idc = None
+		self.vui_parameters_present = False
+		self.aspect_ratio_info_present = False
+		self.aspect_ratio_idc = 0
+		self.sar_width = 0
+		self.sar_height = 0
+		self.colour_description_present = False
+		self.colour_primaries = 0
+		self.transfer_characteristics = 0
+		self.matrix_coefficients = 0
+		self.timing_info_present = False
+		self.num_units_in_tick = 0
+		self.time_scale = 0
+		self.ticks_per_frame = 1  # Two in H.264 (field based timing)
+		self.reduced_still_picture_header = False  # AV1 sequences without frame headers
+		self.pic_struct_present = False  # H.264 pic_struct_present_flag or H.265 frame_field_info_present_flag
+		self.cpb_dpb_delays_present = False  # H.264 picture timing SEI delays, when HRD parameters are present
+		self.cpb_removal_delay_length = 24
+		self.dpb_output_delay_length = 24
+
+
+def native_header_codec(codec_name):
+	# Parameter sets, frame types and SEI messages of the codec are decoded natively instead of traced by ffmpeg
+	return HEADER_PARSER == HEADER_PARSER_NATIVE and codec_name in codec_analysers
+
+
+def check_sei_messages(test_content, sei_info, codec_name):
+	# SEI messages read natively or from the ffmpeg trace_headers log
+	test_content.picture_timing_sei_present[1] = SEI_PIC_TIMING in sei_info.payload_types
+	if test_content.picture_timing_sei_present[1]:
+		print('Picture timing SEI present')
+		if sei_info.pic_struct is not None:
+			print('Picture timing SEI pic_struct='+str(sei_info.pic_struct))
+	if test_content.picture_timing_sei_present[0] == '':
+		test_content.picture_timing_sei_present[2] = TestResult.UNKNOWN
+	else:
+		test_content.picture_timing_sei_present[2] = TestResult.PASS \
+			if (test_content.picture_timing_sei_present[0] is test_content.picture_timing_sei_present[1]) \
+			else TestResult.FAIL
+	
+	if sei_info.preferred_transfer_characteristics is not None and test_content.sei_pref_transfer_characteristics[1] == '':
+		test_content.sei_pref_transfer_characteristics[1] = sei_info.preferred_transfer_characteristics
+		# The preferred transfer characteristics SEI is not applicable to AVC
+		if codec_name != 'h264':
+			test_content.sei_pref_transfer_characteristics[2] = TestResult.PASS \
+				if (test_content.sei_pref_transfer_characteristics[0] == test_content.sei_pref_transfer_characteristics[1]) \
+				else TestResult.FAIL
+	if codec_name == 'h264':
+		return
+	
+	# Content Light Level Information
+	if sei_info.content_light_level is not None and test_content.sei_content_light_level[1] == '':
+		print('MaxFALL = '+str(sei_info.content_light_level[1]))
+		print('MaxCLL = '+str(sei_info.content_light_level[0]))
+		test_content.sei_content_light_level[1] = sei_info.content_light_level
+		if test_content.vui_transfer_characteristics[0] == transfer_characteristics_values.get("PQ10"):
+			test_content.sei_content_light_level[2] = TestResult.PASS
+		else:
+			test_content.sei_content_light_level[2] = TestResult.FAIL
+	
+	# Mastering Display Colour Volume
+	if sei_info.mastering_display_colour_volume is not None and test_content.sei_mastering_display_colour_vol[1] == '':
+		px = list(sei_info.mastering_display_colour_volume[0:6:2])
+		py = list(sei_info.mastering_display_colour_volume[1:6:2])
+		wpx, wpy, max_lum, min_lum = sei_info.mastering_display_colour_volume[6:]
+		red_index = px.index(max(px))
+		green_index = py.index(max(py))
+		blue_index = 0
+		for p in range(0, 3):
+			if p != red_index and p != green_index:
+				blue_index = p
+		red = (round(px[red_index]*0.00002, 5), round(py[red_index]*0.00002, 5))
+		green = (round(px[green_index]*0.00002, 5), round(py[green_index]*0.00002, 5))
+		blue = (round(px[blue_index]*0.00002, 5), round(py[blue_index]*0.00002, 5))
+		white = (round(wpx*0.00002, 5), round(wpy*0.00002, 5))
+		mastering_display_cv = 'R='+str(red)+' G='+str(green)+' B='+str(blue)+' W='+str(white) \
+			+ ' Max='+str(max_lum*0.0001)+' Min='+str(round(min_lum*0.0001, 5))
+		print('Mastering Display Colour Volume = '+mastering_display_cv)
+		test_content.sei_mastering_display_colour_vol[1] = mastering_display_cv
+		if test_content.vui_transfer_characteristics[0] == transfer_characteristics_values.get("PQ10"):
+			test_content.sei_mastering_display_colour_vol[2] = TestResult.PASS
 		else:
-			test_content.sei_pref_transfer_characteristics[2] = TestResult.FAIL
-	if test_content.cmaf_fragment_duration[2] == TestResult.NOT_TESTED:
-		test_content.cmaf_fragment_duration[2] = TestResult.FAIL
-	if test_content.cmaf_initialisation_constraints[2] == TestResult.NOT_TESTED:
-		test_content.cmaf_initialisation_constraints[2] = TestResult.FAIL
-	if test_content.chunks_per_fragment[2] == TestResult.NOT_TESTED:
-		test_content.chunks_per_fragment[2] = TestResult.FAIL
-	if test_content.b_frames_present[2] == TestResult.NOT_TESTED:
-		test_content.b_frames_present[2] = TestResult.FAIL
-	if test_content.cmf2_sample_flags_present[2] == TestResult.NOT_TESTED:
-		test_content.cmf2_sample_flags_present[2] = TestResult.FAIL
-	if test_content.resolution[2] == TestResult.NOT_TESTED:
-		test_content.resolution[2] = TestResult.FAIL
-	if test_content.pixel_aspect_ratio[2] == TestResult.NOT_TESTED:
-		test_content.pixel_aspect_ratio[2] = TestResult.FAIL
-	if test_content.frame_rate[2] == TestResult.NOT_TESTED:
-		test_content.frame_rate[2] = TestResult.FAIL
-	if test_content.bitrate[2] == TestResult.NOT_TESTED:
-		test_content.bitrate[2] = TestResult.FAIL
-	if test_content.duration[2] == TestResult.NOT_TESTED:
-		test_content.duration[2] = TestResult.FAIL
-	if test_content.mpd_sample_duration_delta[2] == TestResult.NOT_TESTED:
-		test_content.mpd_sample_duration_delta[2] = TestResult.FAIL
+			test_content.sei_mastering_display_colour_vol[2] = TestResult.FAIL
+
+
+def parse_avc_sps(rbsp):
+	# seq_parameter_set_data() and vui_parameters() of ITU-T H.264, after the one byte NAL unit header
+	video_header_info = VideoHeaderInfo('h264')
+	video_header_info.ticks_per_frame = 2
+	bit_reader = BitReader(rbsp, 8)
+	video_header_info.profile_idc = bit_reader.u(8)
+	bit_reader.skip(8)  # constraint_set0_flag to constraint_set5_flag and reserved_zero_2bits
+	video_header_info.level_idc = bit_reader.u(8)
+	bit_reader.ue()  # seq_parameter_set_id
+	if video_header_info.profile_idc in (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135):
+		chroma_format_idc = bit_reader.ue()
+		if chroma_format_idc == 3:
+			bit_reader.skip(1)  # separate_colour_plane_flag
+		bit_reader.ue()  # bit_depth_luma_minus8
+		bit_reader.ue()  # bit_depth_chroma_minus8
+		bit_reader.skip(1)  # qpprime_y_zero_transform_bypass_flag
+		if bit_reader.u(1):  # seq_scaling_matrix_present_flag
+			for i in range(8 if chroma_format_idc != 3 else 12):
+				if bit_reader.u(1):  # seq_scaling_list_present_flag
+					last_scale = 8
+					next_scale = 8
+					for j in range(16 if i < 6 else 64):
+						if next_scale != 0:
+							next_scale = (last_scale + bit_reader.se()) % 256
+						last_scale = last_scale if next_scale == 0 else next_scale
+	bit_reader.ue()  # log2_max_frame_num_minus4
+	pic_order_cnt_type = bit_reader.ue()
+	if pic_order_cnt_type == 0:
+		bit_reader.ue()  # log2_max_pic_order_cnt_lsb_minus4
+	elif pic_order_cnt_type == 1:
+		bit_reader.skip(1)  # delta_pic_order_always_zero_flag
+		bit_reader.se()  # offset_for_non_ref_pic
+		bit_reader.se()  # offset_for_top_to_bottom_field
+		for i in range(bit_reader.ue()):  # num_ref_frames_in_pic_order_cnt_cycle
+			bit_reader.se()  # offset_for_ref_frame
+	bit_reader.ue()  # max_num_ref_frames
+	bit_reader.skip(1)  # gaps_in_frame_num_value_allowed_flag
+	bit_reader.ue()  # pic_width_in_mbs_minus1
+	bit_reader.ue()  # pic_height_in_map_units_minus1
+	if not bit_reader.u(1):  # frame_mbs_only_flag
+		bit_reader.skip(1)  # mb_adaptive_frame_field_flag
+	bit_reader.skip(1)  # direct_8x8_inference_flag
+	if bit_reader.u(1):  # frame_cropping_flag
+		for i in range(4):
+			bit_reader.ue()  # frame_crop_left/right/top/bottom_offset
+	video_header_info.vui_parameters_present = bool(bit_reader.u(1))
+	if video_header_info.vui_parameters_present:
+		parse_vui_video_fields(bit_reader, video_header_info)
+		video_header_info.timing_info_present = bool(bit_reader.u(1))
+		if video_header_info.timing_info_present:
+			video_header_info.num_units_in_tick = bit_reader.u(32)
+			video_header_info.time_scale = bit_reader.u(32)
+			bit_reader.skip(1)  # fixed_frame_rate_flag
+		# The picture timing SEI syntax depends on the HRD parameters and pic_struct_present_flag
+		for i in range(2):  # nal_hrd_parameters_present_flag then vcl_hrd_parameters_present_flag
+			if bit_reader.u(1):
+				video_header_info.cpb_dpb_delays_present = True
+				cpb_cnt = bit_reader.ue() + 1
+				bit_reader.skip(8)  # bit_rate_scale and cpb_size_scale
+				for j in range(cpb_cnt):
+					bit_reader.ue()  # bit_rate_value_minus1
+					bit_reader.ue()  # cpb_size_value_minus1
+					bit_reader.skip(1)  # cbr_flag
+				bit_reader.skip(5)  # initial_cpb_removal_delay_length_minus1
+				video_header_info.cpb_removal_delay_length = bit_reader.u(5) + 1
+				video_header_info.dpb_output_delay_length = bit_reader.u(5) + 1
+				bit_reader.skip(5)  # time_offset_length
+		if video_header_info.cpb_dpb_delays_present:
+			bit_reader.skip(1)  # low_delay_hrd_flag
+		video_header_info.pic_struct_present = bool(bit_reader.u(1))
+	return video_header_info
+
+
+def parse_hevc_sps(rbsp):
+	# seq_parameter_set_rbsp() and vui_parameters() of ITU-T H.265, after the two byte NAL unit header
+	video_header_info = VideoHeaderInfo('hevc')
+	bit_reader = BitReader(rbsp, 16)
+	bit_reader.skip(4)  # sps_video_parameter_set_id
+	sps_max_sub_layers_minus1 = bit_reader.u(3)
+	bit_reader.skip(1)  # sps_temporal_id_nesting_flag
+	parse_hevc_profile_tier_level(bit_reader, sps_max_sub_layers_minus1, video_header_info)
+	bit_reader.ue()  # sps_seq_parameter_set_id
+	if bit_reader.ue() == 3:  # chroma_format_idc
+		bit_reader.skip(1)  # separate_colour_plane_flag
+	bit_reader.ue()  # pic_width_in_luma_samples
+	bit_reader.ue()  # pic_height_in_luma_samples
+	if bit_reader.u(1):  # conformance_window_flag
+		for i in range(4):
+			bit_reader.ue()  # conf_win_left/right/top/bottom_offset
+	bit_reader.ue()  # bit_depth_luma_minus8
+	bit_reader.ue()  # bit_depth_chroma_minus8
+	log2_max_pic_order_cnt_lsb = bit_reader.ue() + 4
+	sps_sub_layer_ordering_info_present_flag = bit_reader.u(1)
+	for i in range(0 if sps_sub_layer_ordering_info_present_flag else sps_max_sub_layers_minus1,
+				   sps_max_sub_layers_minus1 + 1):
+		bit_reader.ue()  # sps_max_dec_pic_buffering_minus1
+		bit_reader.ue()  # sps_max_num_reorder_pics
+		bit_reader.ue()  # sps_max_latency_increase_plus1
+	for i in range(6):
+		bit_reader.ue()  # Coding block and transform block sizes and hierarchy depths
+	if bit_reader.u(1):  # scaling_list_enabled_flag
+		if bit_reader.u(1):  # sps_scaling_list_data_present_flag
+			for size_id in range(4):
+				for matrix_id in range(0, 6, 3 if size_id == 3 else 1):
+					if not bit_reader.u(1):  # scaling_list_pred_mode_flag
+						bit_reader.ue()  # scaling_list_pred_matrix_id_delta
+					else:
+						if size_id > 1:
+							bit_reader.se()  # scaling_list_dc_coef_minus8
+						for j in range(min(64, 1 << (4 + (size_id << 1)))):
+							bit_reader.se()  # scaling_list_delta_coef
+	bit_reader.skip(2)  # amp_enabled_flag and sample_adaptive_offset_enabled_flag
+	if bit_reader.u(1):  # pcm_enabled_flag
+		bit_reader.skip(8)  # pcm_sample_bit_depth_luma_minus1 and pcm_sample_bit_depth_chroma_minus1
+		bit_reader.ue()  # log2_min_pcm_luma_coding_block_size_minus3
+		bit_reader.ue()  # log2_diff_max_min_pcm_luma_coding_block_size
+		bit_reader.skip(1)  # pcm_loop_filter_disabled_flag
+	num_short_term_ref_pic_sets = bit_reader.ue()
+	num_delta_pocs = []
+	for st_rps_idx in range(num_short_term_ref_pic_sets):
+		# st_ref_pic_set(), only the number of pictures of each set is needed to parse the next ones
+		if st_rps_idx != 0 and bit_reader.u(1):  # inter_ref_pic_set_prediction_flag
+			bit_reader.skip(1)  # delta_rps_sign
+			bit_reader.ue()  # abs_delta_rps_minus1
+			st_num_delta_pocs = 0
+			for j in range(num_delta_pocs[st_rps_idx - 1] + 1):
+				# use_delta_flag is inferred to be 1 when used_by_curr_pic_flag is 1
+				if bit_reader.u(1) or bit_reader.u(1):  # used_by_curr_pic_flag or use_delta_flag
+					st_num_delta_pocs += 1
+			num_delta_pocs.append(st_num_delta_pocs)
+		else:
+			num_negative_pics = bit_reader.ue()
+			num_positive_pics = bit_reader.ue()
+			for i in range(num_negative_pics + num_positive_pics):
+				bit_reader.ue()  # delta_poc_s0_minus1 or delta_poc_s1_minus1
+				bit_reader.skip(1)  # used_by_curr_pic_s0_flag or used_by_curr_pic_s1_flag
+			num_delta_pocs.append(num_negative_pics + num_positive_pics)
+	if bit_reader.u(1):  # long_term_ref_pics_present_flag
+		for i in range(bit_reader.ue()):  # num_long_term_ref_pics_sps
+			bit_reader.skip(log2_max_pic_order_cnt_lsb + 1)  # lt_ref_pic_poc_lsb_sps and used_by_curr_pic_lt_sps_flag
+	bit_reader.skip(2)  # sps_temporal_mvp_enabled_flag and strong_intra_smoothing_enabled_flag
+	video_header_info.vui_parameters_present = bool(bit_reader.u(1))
+	if video_header_info.vui_parameters_present:
+		parse_vui_video_fields(bit_reader, video_header_info)
+		bit_reader.skip(2)  # neutral_chroma_indication_flag and field_seq_flag
+		video_header_info.pic_struct_present = bool(bit_reader.u(1))  # frame_field_info_present_flag
+		if bit_reader.u(1):  # default_display_window_flag
+			for i in range(4):
+				bit_reader.ue()  # def_disp_win_left/right/top/bottom_offset
+		video_header_info.timing_info_present = bool(bit_reader.u(1))
+		if video_header_info.timing_info_present:
+			video_header_info.num_units_in_tick = bit_reader.u(32)
+			video_header_info.time_scale = bit_reader.u(32)
+	return video_header_info
+
+
+def parse_hevc_profile_tier_level(bit_reader, max_sub_layers_minus1, video_header_info):
+	# profile_tier_level(1, max_sub_layers_minus1) of ITU-T H.265
+	bit_reader.skip(2)  # general_profile_space
+	video_header_info.tier_flag = bit_reader.u(1)
+	video_header_info.profile_idc = bit_reader.u(5)
+	bit_reader.skip(32 + 4 + 43 + 1)  # Compatibility, source and constraint flags
+	video_header_info.level_idc = bit_reader.u(8)
+	sub_layer_profile_present = []
+	sub_layer_level_present = []
+	for i in range(max_sub_layers_minus1):
+		sub_layer_profile_present.append(bit_reader.u(1))
+		sub_layer_level_present.append(bit_reader.u(1))
+	if max_sub_layers_minus1 > 0:
+		bit_reader.skip(2 * (8 - max_sub_layers_minus1))  # reserved_zero_2bits
+	for i in range(max_sub_layers_minus1):
+		if sub_layer_profile_present[i]:
+			bit_reader.skip(88)
+		if sub_layer_level_present[i]:
+			bit_reader.skip(8)
+
+
+def parse_vui_video_fields(bit_reader, video_header_info):
+	# VUI fields up to chroma location, with the same syntax in H.264 and H.265
+	video_header_info.aspect_ratio_info_present = bool(bit_reader.u(1))
+	if video_header_info.aspect_ratio_info_present:
+		video_header_info.aspect_ratio_idc = bit_reader.u(8)
+		if video_header_info.aspect_ratio_idc == 255:
+			video_header_info.sar_width = bit_reader.u(16)
+			video_header_info.sar_height = bit_reader.u(16)
+	if bit_reader.u(1):  # overscan_info_present_flag
+		bit_reader.skip(1)  # overscan_appropriate_flag
+	if bit_reader.u(1):  # video_signal_type_present_flag
+		bit_reader.skip(4)  # video_format and video_full_range_flag
+		video_header_info.colour_description_present = bool(bit_reader.u(1))
+		if video_header_info.colour_description_present:
+			video_header_info.colour_primaries = bit_reader.u(8)
+			video_header_info.transfer_characteristics = bit_reader.u(8)
+			video_header_info.matrix_coefficients = bit_reader.u(8)
+	if bit_reader.u(1):  # chroma_loc_info_present_flag
+		bit_reader.ue()  # chroma_sample_loc_type_top_field
+		bit_reader.ue()  # chroma_sample_loc_type_bottom_field
+
+
+def parse_vvc_sps(rbsp):
+	# seq_parameter_set_rbsp() of ITU-T H.266 up to the general level, after the two byte NAL unit header.
+	# The VUI follows many coding tool fields at the end of the SPS and is not decoded, its checks are left UNKNOWN.
+	video_header_info = VideoHeaderInfo('vvc')
+	bit_reader = BitReader(rbsp, 16)
+	bit_reader.skip(4 + 4)  # sps_seq_parameter_set_id and sps_video_parameter_set_id
+	bit_reader.skip(3 + 2 + 2)  # sps_max_sublayers_minus1, sps_chroma_format_idc and sps_log2_ctu_size_minus5
+	if not bit_reader.u(1):  # sps_ptl_dpb_hrd_params_present_flag
+		raise ValueError('No profile_tier_level in the SPS')
+	# profile_tier_level(1, sps_max_sublayers_minus1)
+	video_header_info.profile_idc = bit_reader.u(7)
+	video_header_info.tier_flag = bit_reader.u(1)
+	video_header_info.level_idc = bit_reader.u(8)
+	return video_header_info
+
+
+def parse_av1_sequence_header(obu_payload):
+	# sequence_header_obu() of AV1 up to color_config(). Its color description and timing info are checked as VUI fields.
+	video_header_info = VideoHeaderInfo('av1')
+	bit_reader = BitReader(obu_payload)
+	video_header_info.profile_idc = bit_reader.u(3)
+	bit_reader.skip(1)  # still_picture
+	video_header_info.reduced_still_picture_header = bool(bit_reader.u(1))
+	if video_header_info.reduced_still_picture_header:
+		video_header_info.level_idc = bit_reader.u(5)
+		video_header_info.tier_flag = 0
+	else:
+		video_header_info.timing_info_present = bool(bit_reader.u(1))
+		decoder_model_info_present = False
+		buffer_delay_length = 0
+		if video_header_info.timing_info_present:
+			video_header_info.num_units_in_tick = bit_reader.u(32)  # num_units_in_display_tick
+			video_header_info.time_scale = bit_reader.u(32)
+			if bit_reader.u(1):  # equal_picture_interval
+				video_header_info.ticks_per_frame = bit_reader.ue() + 1  # num_ticks_per_picture_minus_1
+			decoder_model_info_present = bool(bit_reader.u(1))
+			if decoder_model_info_present:
+				buffer_delay_length = bit_reader.u(5) + 1
+				bit_reader.skip(32 + 5 + 5)  # num_units_in_decoding_tick, buffer_removal_time_length_minus_1 and frame_presentation_time_length_minus_1
+		initial_display_delay_present = bit_reader.u(1)
+		for i in range(bit_reader.u(5) + 1):  # operating_points_cnt_minus_1
+			bit_reader.skip(12)  # operating_point_idc
+			seq_level_idx = bit_reader.u(5)
+			seq_tier = bit_reader.u(1) if seq_level_idx > 7 else 0
+			if i == 0:
+				video_header_info.level_idc = seq_level_idx
+				video_header_info.tier_flag = seq_tier
+			if decoder_model_info_present and bit_reader.u(1):  # decoder_model_present_for_this_op
+				bit_reader.skip(2 * buffer_delay_length + 1)  # decoder_buffer_delay, encoder_buffer_delay and low_delay_mode_flag
+			if initial_display_delay_present and bit_reader.u(1):  # initial_display_delay_present_for_this_op
+				bit_reader.skip(4)  # initial_display_delay_minus_1
+	frame_width_bits = bit_reader.u(4) + 1
+	frame_height_bits = bit_reader.u(4) + 1
+	bit_reader.skip(frame_width_bits + frame_height_bits)  # max_frame_width_minus_1 and max_frame_height_minus_1
+	if not video_header_info.reduced_still_picture_header and bit_reader.u(1):  # frame_id_numbers_present_flag
+		bit_reader.skip(4 + 3)  # delta_frame_id_length_minus_2 and additional_frame_id_length_minus_1
+	bit_reader.skip(3)  # use_128x128_superblock, enable_filter_intra and enable_intra_edge_filter
+	if not video_header_info.reduced_still_picture_header:
+		bit_reader.skip(4)  # enable_interintra_compound, enable_masked_compound, enable_warped_motion and enable_dual_filter
+		enable_order_hint = bit_reader.u(1)
+		if enable_order_hint:
+			bit_reader.skip(2)  # enable_jnt_comp and enable_ref_frame_mvs
+		seq_force_screen_content_tools = 2 if bit_reader.u(1) else bit_reader.u(1)  # seq_choose_screen_content_tools
+		if seq_force_screen_content_tools > 0 and not bit_reader.u(1):  # seq_choose_integer_mv
+			bit_reader.skip(1)  # seq_force_integer_mv
+		if enable_order_hint:
+			bit_reader.skip(3)  # order_hint_bits_minus_1
+	bit_reader.skip(3)  # enable_superres, enable_cdef and enable_restoration
+	# color_config()
+	high_bitdepth = bit_reader.u(1)
+	if video_header_info.profile_idc == 2 and high_bitdepth:
+		bit_reader.skip(1)  # twelve_bit
+	if video_header_info.profile_idc != 1:
+		bit_reader.skip(1)  # mono_chrome
+	# The sequence header takes the place of the VUI
+	video_header_info.vui_parameters_present = True
+	video_header_info.colour_description_present = bool(bit_reader.u(1))
+	if video_header_info.colour_description_present:
+		video_header_info.colour_primaries = bit_reader.u(8)
+		video_header_info.transfer_characteristics = bit_reader.u(8)
+		video_header_info.matrix_coefficients = bit_reader.u(8)
+	return video_header_info
+
+
+def check_frame_rate(test_content, frame_rate_family, file_frame_rate, frame_rate_source):
+	# Returns the frame rate as used by the checks that follow, an int when it is a whole number
+	if frame_rate_group.get(file_frame_rate):
+		if str(file_frame_rate)[-2:] == '.0':
+			file_frame_rate = int(file_frame_rate)
+		test_content.frame_rate[1] = file_frame_rate
+	else:
+		test_content.frame_rate[1] = 'ínvalid '+frame_rate_source+' frame rate = ' + str(file_frame_rate)
+	# Adapt the frame rate now that we know the frame rate family
+	if frame_rate_family == TS_LOCATION_FRAME_RATES_50:
+		test_content.frame_rate[0] = frame_rate_value_50.get(test_content.frame_rate[0], 0)
+	elif frame_rate_family == TS_LOCATION_FRAME_RATES_59_94:
+		test_content.frame_rate[0] = frame_rate_value_59_94.get(test_content.frame_rate[0], 0)
+	elif frame_rate_family == TS_LOCATION_FRAME_RATES_60:
+		test_content.frame_rate[0] = frame_rate_value_60.get(test_content.frame_rate[0], 0)
+	# Determine the test result for the frame rate
+	if test_content.frame_rate[0] == 0:
+		test_content.frame_rate[2] = TestResult.UNKNOWN
+	else:
+		test_content.frame_rate[2] = TestResult.PASS \
+			if (test_content.frame_rate[0] == test_content.frame_rate[1]) \
+			else TestResult.FAIL
+	print(frame_rate_source+' frame rate = ' + str(file_frame_rate))
+	return file_frame_rate
+
+
+def check_bitrate(test_content, file_bitrate):
+	test_content.bitrate[1] = file_bitrate
+	if test_content.bitrate[0] == TestResult.NOT_APPLICABLE:
+		test_content.bitrate[2] = TestResult.NOT_APPLICABLE
+	elif test_content.bitrate[0] == 0:
+		test_content.bitrate[2] = TestResult.UNKNOWN
+	else:
+		test_content.bitrate[2] = TestResult.PASS \
+			if (test_content.bitrate[0] == test_content.bitrate[1]) \
+			else TestResult.FAIL
+	print('Bitrate = '+str(test_content.bitrate[1])+'kb/s')
+
+
+def check_duration(test_content, file_duration, file_frame_rate):
+	if str(file_duration)[-2:] == '.0':
+		file_duration = int(file_duration)
+	test_content.duration[1] = file_duration
+	if test_content.duration[0] == 0:
+		test_content.duration[2] = TestResult.UNKNOWN
+	else:
+		# Check duration matches target or is less than 1 frame lower than target duration (for fractional frame rates)
+		test_content.duration[2] = TestResult.PASS \
+			if (test_content.duration[0] >= test_content.duration[1] > (test_content.duration[0] - (1 / file_frame_rate))) \
+			else TestResult.FAIL
+	print('Duration = '+str(test_content.duration[1])+'s')
+
+
+def check_video_header(test_content, codec_analyser, video_header_info, file_frame_rate):
+	# SPS and VUI fields read natively or from the ffmpeg trace_headers log
+	if codec_analyser.tier_names:
+		test_content.codec_tier[1] = codec_analyser.tier_names.get(str(video_header_info.tier_flag), '')
+		if test_content.codec_tier[0] == '':
+			test_content.codec_tier[2] = TestResult.UNKNOWN
+		else:
+			test_content.codec_tier[2] = TestResult.PASS \
+				if (test_content.codec_tier[0].lower() == test_content.codec_tier[1].lower()) \
+				else TestResult.FAIL
+		print('Tier = '+test_content.codec_tier[1])
 	
-	# If debug enabled, copy all detailed log files to a folder and zip for analysis
-	if debug_folder != '':
-		# Zip
-		debugz_file = str(Path('tcval_logs_' + time_of_analysis + '.zip'))
-		if not os.path.isfile(debugz_file):
-			debugz = zipfile.ZipFile(debugz_file, 'w', zipfile.ZIP_DEFLATED)
+	test_content.codec_profile[1] = codec_analyser.profile_names.get(str(video_header_info.profile_idc), '')
+	if test_content.codec_profile[0] == '':
+		test_content.codec_profile[2] = TestResult.UNKNOWN
+	else:
+		test_content.codec_profile[2] = TestResult.PASS \
+			if (test_content.codec_profile[0].lower() == test_content.codec_profile[1].lower()) \
+			else TestResult.FAIL
+	print('Profile = '+test_content.codec_profile[1])
+	
+	test_content.codec_level[1] = codec_analyser.level_name(video_header_info.level_idc)
+	if test_content.codec_level[0] == '':
+		test_content.codec_level[2] = TestResult.UNKNOWN
+	else:
+		test_content.codec_level[2] = TestResult.PASS \
+			if (float(test_content.codec_level[0]) == float(test_content.codec_level[1])) \
+			else TestResult.FAIL
+	print('Level = '+test_content.codec_level[1])
+	
+	for field_name in codec_analyser.undecoded_fields:
+		getattr(test_content, field_name)[2] = TestResult.UNKNOWN
+	
+	if not video_header_info.vui_parameters_present:
+		return
+	print('VUI present')
+	
+	if video_header_info.aspect_ratio_info_present:
+		print('Aspect ratio info present')
+		if video_header_info.aspect_ratio_idc != 255:
+			test_content.pixel_aspect_ratio[1] = sar_values.get(video_header_info.aspect_ratio_idc, 0)
+			if video_header_info.aspect_ratio_idc == 0 and test_content.pixel_aspect_ratio[0] == '':
+				test_content.pixel_aspect_ratio[2] = TestResult.NOT_APPLICABLE
+			else:
+				# When defined in the bitstream, default 1:1 SAR expected unless otherwise defined in test expected results
+				if test_content.pixel_aspect_ratio[0] == '':
+					test_content.pixel_aspect_ratio[0] = C_DEFAULT_SAR
+				test_content.pixel_aspect_ratio[2] = TestResult.PASS \
+					if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
+					eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
+					else TestResult.FAIL
+		elif video_header_info.sar_width != 0 and video_header_info.sar_height != 0:
+			test_content.pixel_aspect_ratio[1] = str(video_header_info.sar_width) + ":" + str(video_header_info.sar_height)
+			test_content.pixel_aspect_ratio[2] = TestResult.PASS \
+				if eval(test_content.pixel_aspect_ratio[0].replace(':', '/')) == \
+				eval(test_content.pixel_aspect_ratio[1].replace(':', '/')) \
+				else TestResult.FAIL
+	
+	if video_header_info.colour_description_present:
+		print('Colour primaries, transfer characteristics, and matrix coeffs present')
+		# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
+		if test_content.vui_primaries_mcoeffs[0] == '':
+			test_content.vui_primaries_mcoeffs[0] = C_DEFAULT_VUI_PRIMARIES_MCOEFFS
+		test_content.vui_primaries_mcoeffs[1] = video_header_info.matrix_coefficients
+		if video_header_info.colour_primaries != 0:
+			if video_header_info.matrix_coefficients != video_header_info.colour_primaries:
+				test_content.vui_primaries_mcoeffs[2] = TestResult.FAIL
+			else:
+				test_content.vui_primaries_mcoeffs[2] = TestResult.PASS \
+					if test_content.vui_primaries_mcoeffs[0] == test_content.vui_primaries_mcoeffs[1] \
+					else TestResult.FAIL
+		test_content.vui_transfer_characteristics[1] = video_header_info.transfer_characteristics
+		# When defined in the bitstream, default 1 (BT.709) expected unless otherwise defined in test expected results
+		if test_content.vui_transfer_characteristics[0] == '':
+			test_content.vui_transfer_characteristics[0] = C_DEFAULT_VUI_TRANSFER_CHARACTERISTICS
+		test_content.vui_transfer_characteristics[2] = TestResult.PASS \
+			if test_content.vui_transfer_characteristics[0] == test_content.vui_transfer_characteristics[1] \
+			else TestResult.FAIL
+	
+	test_content.vui_timing_present[1] = video_header_info.timing_info_present
+	if test_content.vui_timing_present[0] == '':
+		test_content.vui_timing_present[2] = TestResult.UNKNOWN
+	else:
+		test_content.vui_timing_present[2] = TestResult.PASS \
+			if (test_content.vui_timing_present[0] is test_content.vui_timing_present[1]) \
+			else TestResult.FAIL
+	if not video_header_info.timing_info_present:
+		return
+	print('VUI timing present')
+	vui_file_frame_rate = 0
+	if video_header_info.num_units_in_tick != 0:
+		vui_file_frame_rate = float(Decimal(video_header_info.time_scale/video_header_info.num_units_in_tick
+											/ video_header_info.ticks_per_frame)
+									.quantize(Decimal('.001'), rounding=ROUND_DOWN))
+	if frame_rate_group.get(vui_file_frame_rate):
+		if str(vui_file_frame_rate)[-2:] == '.0':
+			vui_file_frame_rate = int(vui_file_frame_rate)
+		test_content.frame_rate[1] = vui_file_frame_rate
+	else:
+		test_content.frame_rate[1] = \
+			'invalid VUI timing data (fps='+str(vui_file_frame_rate)+') | ffmpeg detected frame rate = ' \
+			+ str(file_frame_rate)+'('+str(frame_rate_group.get(file_frame_rate, '?')) + ')'
+	# The frame rate was already adapted based on the frame rate family from the ffmpeg log
+	# Determine the test result for the frame rate
+	if test_content.frame_rate[0] == 0:
+		test_content.frame_rate[2] = TestResult.UNKNOWN
+	else:
+		test_content.frame_rate[2] = TestResult.PASS \
+			if (test_content.frame_rate[0] == test_content.frame_rate[1]) \
+			else TestResult.FAIL
+	print('VUI frame rate = '+str(vui_file_frame_rate))
+
+
+class CodecAnalyser(ABC):
+	# Native analysis of the bitstream headers of one codec, created for each stream from its InitSegmentInfo.
+	# Subclasses are registered in codec_analysers under the ffprobe codec_name. They decode the sequence header,
+	# count the parameter sets, type the frames and read the SEI or metadata messages of the samples.
+	parameter_set_types = {}  # Unit type of the parameter sets per name, the sequence header is named SPS
+	vcl_unit_types = ()  # Unit types of which the first one of each sample is read to type the frame
+	sei_unit_type = None
+	sei_payload_types = []  # SEI messages checked, as SEI payloadType values
+	profile_names = {}
+	tier_names = {}  # Empty when the codec has no tier
+	undecoded_fields = ()  # TestContent fields the stream does not carry or that are not decoded, left UNKNOWN
+	nal_unit_header_size = 1
+	
+	def __init__(self, init_segment_info):
+		self.init_segment_info = init_segment_info
+		self.parameter_set_names = {unit_type: name for name, unit_type in self.parameter_set_types.items()}
+		self.video_header_info = None
+	
+	def iter_units(self, data):
+		# Yields the units of a MediaDataBox payload
+		return iter_nal_units(data, self.init_segment_info.nal_length_size)
+	
+	@abstractmethod
+	def unit_type(self, unit):
+		pass
+	
+	@abstractmethod
+	def parse_sequence_header(self, unit):
+		# Returns the VideoHeaderInfo of an SPS or sequence header, raises ValueError when it cannot be decoded
+		pass
+	
+	@abstractmethod
+	def level_name(self, level_idc):
+		pass
+	
+	def read_frame_type(self, unit):
+		# I, P or B from the start of the first VCL unit of a sample, None when it cannot be decoded
+		return None
+	
+	def read_parameter_set(self, unit):
+		# Called with the start of each in-band parameter set
+		pass
+	
+	def parameter_sets_in_header(self):
+		# The decoder configuration record carries the sequence header
+		return bool(self.init_segment_info.parameter_sets.get(self.parameter_set_types['SPS']))
+	
+	def read_video_header_info(self, test_content, seg_files):
+		# Decode the first SPS of the decoder configuration record, or of the first segment when it is only in-band.
+		# Returns None when there is none or it cannot be decoded, so that the ffmpeg trace_headers log is used instead.
+		sps_unit_type = self.parameter_set_types['SPS']
+		sps = None
+		if self.init_segment_info.parameter_sets.get(sps_unit_type):
+			sps = self.init_segment_info.parameter_sets[sps_unit_type][0]
 		else:
-			debugz = zipfile.ZipFile(debugz_file, 'a', zipfile.ZIP_DEFLATED)
-		
-		try:
-			tc_file_path_parts = Path(test_content.test_file_path).parts
-			path2filename = str(Path("_".join(tc_file_path_parts[len(tc_file_path_parts)-4:]) + '_trace_headers_init_' + time_of_analysis + '.txt'))
-			debug_filename = str(Path(debug_folder+sep+path2filename))
-			shutil.copy2(str(Path(str(tc_matrix.stem) + '_trace_headers_init_' + time_of_analysis + '.txt')), debug_filename)
-			debugz.write(debug_filename, path2filename)
-		except OSError as e:
-			if e.errno != errno.ENOENT:  # No such file or directory
-				raise
+			for m4s in seg_files:
+				if m4s.endswith('.m4s'):
+					with map_segment_file(str(Path(test_content.test_file_path + sep + '1' + sep + m4s))) as segment_file:
+						for unit in self.iter_units(first_media_data(segment_file.data)):
+							if self.unit_type(unit) == sps_unit_type:
+								sps = bytes(unit)
+								break
+					break
+		if sps is None:
+			return None
 		try:
-			tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
-			path2filename = str(Path("_".join(tc_file_path_parts[len(tc_file_path_parts)-5:]) + '_' + TS_INIT_SEGMENT_NAME.split('.')[0] + TS_METADATA_POSTFIX))
-			debug_filename = str(Path(debug_folder + sep + path2filename))
-			shutil.copy2(str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME.split('.')[0]+TS_METADATA_POSTFIX)), debug_filename)
-			debugz.write(debug_filename, path2filename)
-		except OSError as e:
-			if e.errno != errno.ENOENT:  # No such file or directory
-				raise
-		
-		for m4s in seg_files:
-			if m4s.endswith('.m4s'):
-				try:
-					tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
-					path2filename = str(Path(
-						"_".join(tc_file_path_parts[len(tc_file_path_parts)-5:]) + '_' + m4s.split('.')[0] + TS_METADATA_POSTFIX))
-					debug_filename = str(Path(debug_folder + sep + path2filename))
-					shutil.copy2(str(Path(test_content.test_file_path+sep+'1'+sep+m4s.split('.')[0]+TS_METADATA_POSTFIX)), debug_filename)
-					debugz.write(debug_filename, path2filename)
-				except OSError as e:
-					if e.errno != errno.ENOENT:  # No such file or directory
-						raise
-		debugz.close()
-		
-		# Remove detailed logs now that the zip has been created
+			self.video_header_info = self.parse_sequence_header(sps)
+		except ValueError as e:
+			print('Native SPS parsing failed ('+str(e)+')')
+		return self.video_header_info
+	
+	def scan_sample(self, data, sample_position, sample_size, fragment_sample_info, sei_info):
+		# Walk the length prefixed NAL units of a sample in the mapped segment file. Only the length field and the NAL
+		# unit header are read, the rest of each NAL unit is skipped, except for the start of the first slice, of the
+		# parameter sets and of the SEI NAL units until all expected SEI messages were seen.
+		nal_length_size = self.init_segment_info.nal_length_size
+		sample_end = min(sample_position + sample_size, len(data))
+		nal_unit_position = sample_position
+		frame_type_detected = False
+		while nal_unit_position + nal_length_size + self.nal_unit_header_size <= sample_end:
+			nal_unit_start = nal_unit_position + nal_length_size
+			nal_unit_length = int.from_bytes(data[nal_unit_position:nal_unit_start], 'big')
+			nal_unit = data[nal_unit_start:nal_unit_start + nal_unit_length]
+			nal_type = self.unit_type(data[nal_unit_start:nal_unit_start + self.nal_unit_header_size])
+			if nal_type in self.parameter_set_names:
+				fragment_sample_info.add_parameter_set(self.parameter_set_names[nal_type])
+				self.read_parameter_set(nal_unit[:SLICE_HEADER_READ_SIZE])
+			elif nal_type == self.sei_unit_type:
+				if not sei_info.complete():
+					read_sei_messages(nal_unit, self.nal_unit_header_size, sei_info)
+			elif not frame_type_detected and nal_type in self.vcl_unit_types:
+				frame_type_detected = True
+				frame_type = self.read_frame_type(nal_unit[:SLICE_HEADER_READ_SIZE])
+				if frame_type is not None:
+					fragment_sample_info.frame_types[frame_type] += 1
+			nal_unit_position = nal_unit_start + nal_unit_length
+
+
+class AvcAnalyser(CodecAnalyser):
+	# ITU-T H.264
+	parameter_set_types = {'SPS': 7, 'PPS': 8}
+	vcl_unit_types = range(1, 6)
+	sei_unit_type = 6
+	sei_payload_types = [SEI_PIC_TIMING, SEI_ALTERNATIVE_TRANSFER_CHARACTERISTICS]
+	profile_names = h264_profile
+	slice_frame_types = {2: 'I', 7: 'I', 0: 'P', 5: 'P', 1: 'B', 6: 'B'}
+	
+	def unit_type(self, unit):
+		# nal_unit_type, 5 bits after the forbidden_zero_bit and nal_ref_idc
+		return unit[0] & 0x1F
+	
+	def parse_sequence_header(self, unit):
+		return parse_avc_sps(remove_emulation_prevention(unit))
+	
+	def level_name(self, level_idc):
+		return str(level_idc/10)
+	
+	def read_frame_type(self, unit):
 		try:
-			tc_file_path_parts = Path(test_content.test_file_path).parts
-			path2filename = str(Path("_".join(tc_file_path_parts[len(tc_file_path_parts) - 4:]) + '_trace_headers_init_' + time_of_analysis + '.txt'))
-			os.remove(str(Path(debug_folder + sep + path2filename)))
-		except OSError as e:
-			if e.errno != errno.ENOENT:  # No such file or directory
-				raise
+			bit_reader = BitReader(remove_emulation_prevention(unit), 8)
+			bit_reader.ue()  # first_mb_in_slice
+			return self.slice_frame_types.get(bit_reader.ue())
+		except ValueError:
+			return None
+	
+	def parameter_sets_in_header(self):
+		# First SPS or PPS of the avcC has a NAL unit header with nal_ref_idc 3 or 1
+		parameter_sets = self.init_segment_info.parameter_sets
+		for nal_unit_type in (7, 8):
+			if parameter_sets.get(nal_unit_type):
+				if parameter_sets[nal_unit_type][0][:1] in (bytes([int('11' + bin(nal_unit_type)[2:].zfill(5), 2)]),
+															bytes([int('01' + bin(nal_unit_type)[2:].zfill(5), 2)])):
+					return True
+		return False
+
+
+class HevcAnalyser(CodecAnalyser):
+	# ITU-T H.265
+	parameter_set_types = {'VPS': 32, 'SPS': 33, 'PPS': 34}
+	vcl_unit_types = range(0, 32)
+	sei_unit_type = 39
+	sei_payload_types = [SEI_PIC_TIMING, SEI_ALTERNATIVE_TRANSFER_CHARACTERISTICS,
+						 SEI_MASTERING_DISPLAY_COLOUR_VOLUME, SEI_CONTENT_LIGHT_LEVEL_INFO]
+	profile_names = h265_profile
+	tier_names = h265_tier
+	nal_unit_header_size = 2
+	slice_frame_types = {2: 'I', 1: 'P', 0: 'B'}
+	
+	def __init__(self, init_segment_info):
+		CodecAnalyser.__init__(self, init_segment_info)
+		self.pps_extra_slice_header_bits = {}  # Per pps_pic_parameter_set_id of the hvcC and in-band PPS
+		for pps in init_segment_info.parameter_sets.get(34, []):
+			self.read_parameter_set(pps)
+	
+	def unit_type(self, unit):
+		# nal_unit_type, 6 bits after the forbidden_zero_bit
+		return (unit[0] >> 1) & 0x3F
+	
+	def parse_sequence_header(self, unit):
+		return parse_hevc_sps(remove_emulation_prevention(unit))
+	
+	def level_name(self, level_idc):
+		return str(level_idc/30)
+	
+	def read_parameter_set(self, unit):
+		if self.unit_type(unit) == 34:
+			read_hevc_pps_extra_slice_header_bits(unit, self.pps_extra_slice_header_bits)
+	
+	def read_frame_type(self, unit):
 		try:
-			tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
-			path2filename = str(Path(
-				"_".join(tc_file_path_parts[len(tc_file_path_parts) - 5:]) + '_' + TS_INIT_SEGMENT_NAME.split('.')[
-					0] + TS_METADATA_POSTFIX))
-			os.remove(str(Path(debug_folder + sep + path2filename)))
-		except OSError as e:
-			if e.errno != errno.ENOENT:  # No such file or directory
-				raise
-		for m4s in seg_files:
-			if m4s.endswith('.m4s'):
-				try:
-					tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
-					path2filename = str(Path(
-						"_".join(tc_file_path_parts[len(tc_file_path_parts) - 5:]) + '_' + m4s.split('.')[
-							0] + TS_METADATA_POSTFIX))
-					os.remove(str(Path(debug_folder + sep + path2filename)))
-				except OSError as e:
-					if e.errno != errno.ENOENT:  # No such file or directory
-						raise
+			bit_reader = BitReader(remove_emulation_prevention(unit), 16)
+			if not bit_reader.u(1):  # first_slice_segment_in_pic_flag
+				return None
+			if 16 <= self.unit_type(unit) <= 23:  # IRAP pictures
+				bit_reader.skip(1)  # no_output_of_prior_pics_flag
+			slice_pic_parameter_set_id = bit_reader.ue()
+			bit_reader.skip(self.pps_extra_slice_header_bits.get(slice_pic_parameter_set_id, 0))  # slice_reserved_flag
+			return self.slice_frame_types.get(bit_reader.ue())
+		except ValueError:
+			return None
+	
+	def parameter_sets_in_header(self):
+		# hvcC has both SPS and PPS arrays, each starting with a NAL unit of the array type
+		parameter_sets = self.init_segment_info.parameter_sets
+		return bool(parameter_sets.get(33) and parameter_sets.get(34)
+					and parameter_sets[33][0][:1] == bytes([int('0' + bin(33)[2:] + '0', 2)])
+					and parameter_sets[34][0][:1] == bytes([int('0' + bin(34)[2:] + '0', 2)]))
+
+
+class VvcAnalyser(CodecAnalyser):
+	# ITU-T H.266. Frames are not typed: slice_type follows picture header fields that depend on the whole SPS and PPS.
+	parameter_set_types = {'VPS': 14, 'SPS': 15, 'PPS': 16}
+	sei_unit_type = 23
+	sei_payload_types = [SEI_PIC_TIMING, SEI_ALTERNATIVE_TRANSFER_CHARACTERISTICS,
+						 SEI_MASTERING_DISPLAY_COLOUR_VOLUME, SEI_CONTENT_LIGHT_LEVEL_INFO]
+	profile_names = h266_profile
+	tier_names = h266_tier
+	undecoded_fields = ('pixel_aspect_ratio', 'vui_primaries_mcoeffs', 'vui_transfer_characteristics', 'vui_timing_present',
+						'b_frames_present')
+	nal_unit_header_size = 2
+	
+	def unit_type(self, unit):
+		# nal_unit_type, 5 bits after the forbidden_zero_bit, nuh_reserved_zero_bit and nuh_layer_id
+		return (unit[1] >> 3) & 0x1F
+	
+	def parse_sequence_header(self, unit):
+		return parse_vvc_sps(remove_emulation_prevention(unit))
+	
+	def level_name(self, level_idc):
+		# general_level_idc is 16 times the major level plus 3 times the minor level
+		return str(level_idc // 16 + (level_idc % 16) // 3 / 10)
+	
+	def parameter_sets_in_header(self):
+		# vvcC has both SPS and PPS arrays
+		return bool(self.init_segment_info.parameter_sets.get(15) and self.init_segment_info.parameter_sets.get(16))
+
+
+class Av1Analyser(CodecAnalyser):
+	# AV1. The units are OBUs, the sequence header OBU is counted as SPS and the HDR metadata OBUs as SEI messages.
+	parameter_set_types = {'SPS': OBU_SEQUENCE_HEADER}
+	sei_unit_type = OBU_METADATA
+	sei_payload_types = [SEI_MASTERING_DISPLAY_COLOUR_VOLUME, SEI_CONTENT_LIGHT_LEVEL_INFO]
+	profile_names = av1_profile
+	tier_names = av1_tier
+	undecoded_fields = ('pixel_aspect_ratio',)  # AV1 does not signal a sample aspect ratio
+	frame_types = {0: 'I', 1: 'P', 2: 'I', 3: 'P'}  # KEY_FRAME, INTER_FRAME, INTRA_ONLY_FRAME and SWITCH_FRAME
+	
+	def iter_units(self, data):
+		return iter_obus(data)
+	
+	def unit_type(self, unit):
+		return obu_type(unit)
+	
+	def parse_sequence_header(self, unit):
+		obu_payload_offset, obu_size = read_obu_header(unit[:OBU_PREFIX_READ_SIZE], len(unit))
+		return parse_av1_sequence_header(unit[obu_payload_offset:obu_payload_offset + obu_size])
+	
+	def level_name(self, level_idc):
+		# seq_level_idx is 4 times (major level - 2) plus the minor level
+		return str(2 + (level_idc >> 2) + (level_idc & 3) / 10)
+	
+	def read_frame_type(self, obu_payload):
+		# frame_type of uncompressed_header(), None for a shown existing frame
+		if self.video_header_info is not None and self.video_header_info.reduced_still_picture_header:
+			return 'I'
+		if not obu_payload or obu_payload[0] & 0x80:  # show_existing_frame
+			return None
+		return self.frame_types[(obu_payload[0] >> 5) & 0x03]
+	
+	def scan_sample(self, data, sample_position, sample_size, fragment_sample_info, sei_info):
+		# Walk the OBUs of a temporal unit in the mapped segment file. Only the OBU header and obu_size are read, the
+		# rest of each OBU is skipped, except for the first byte of the frame headers until one is typed and for the
+		# metadata OBUs until all expected metadata were seen.
+		sample_end = min(sample_position + sample_size, len(data))
+		obu_position = sample_position
+		frame_type_detected = False
+		while obu_position < sample_end:
+			try:
+				obu_payload_offset, obu_size = read_obu_header(
+					data[obu_position:obu_position + OBU_PREFIX_READ_SIZE], sample_end - obu_position)
+			except (ValueError, IndexError):
+				break
+			obu_payload = data[obu_position + obu_payload_offset:obu_position + obu_payload_offset + obu_size]
+			unit_type = obu_type(data[obu_position:obu_position + 1])
+			if unit_type == OBU_SEQUENCE_HEADER:
+				fragment_sample_info.add_parameter_set('SPS')
+			elif unit_type == OBU_METADATA:
+				if not sei_info.complete():
+					try:
+						read_av1_metadata(obu_payload, sei_info)
+					except (IndexError, struct.error):
+						pass
+			elif not frame_type_detected and unit_type in (OBU_FRAME_HEADER, OBU_FRAME):
+				frame_type = self.read_frame_type(obu_payload[:1])
+				if frame_type is not None:
+					frame_type_detected = True
+					fragment_sample_info.frame_types[frame_type] += 1
+			obu_position += obu_payload_offset + obu_size
+
+
+# Native codec analysers per ffprobe codec_name
+codec_analysers = {'h264': AvcAnalyser, 'hevc': HevcAnalyser, 'vvc': VvcAnalyser, 'av1': Av1Analyser}
+
+
+TRACE_CONTEXT_SPS = 'SPS'
+TRACE_CONTEXT_VUI = 'VUI'
+TRACE_CONTEXT_SEI = 'SEI'
+TRACE_CONTEXT_SLICE = 'slice'
+
+
+class TraceHeadersParser:
+	# Reads the SPS, VUI, SEI and slice header fields of the ffmpeg trace_headers log of one stream into a
+	# VideoHeaderInfo and a SeiInfo, checked afterwards as when they are decoded natively. The field name of each line
+	# is extracted once and dispatched through the handler table of the codec, keyed by header context and field name.
+	# The handler of a field is removed once it has a value, only the slice header handlers are kept for every slice.
+	header_contexts = {}  # Context entered at each NAL unit header line, other header lines do not change it
+	field_handlers = {}  # Handler method and its argument per field name (or SEI message header line) per context
+	ticks_per_frame = 1
+
+	def __init__(self, codec_name, sei_info):
+		self.video_header_info = VideoHeaderInfo(codec_name)
+		self.video_header_info.ticks_per_frame = self.ticks_per_frame
+		self.sei_info = sei_info
+		self.handlers = {context: {name: (getattr(self, method), argument) for name, (method, argument) in handlers.items()}
+						 for context, handlers in self.field_handlers.items()}
+		self.context = None
+		self.context_handlers = {}
+		self.sps_count = 0
+		self.pps_count = 0
+		self.nal_unit_type = 0
+		self.slice_types = []  # [nal_unit_type, slice_type] of each slice
+		self.mastering_display_colour_volume = [None] * 10
+		self.content_light_level = [None] * 2
+
+	def read_line(self, line):
+		# Returns False for the lines that are not a field of a header, such as errors logged by trace_headers
+		text = line[line.index('] ')+2:-1]
+		fields = text.split()
+		if len(fields) > 3 and fields[-2] == '=':
+			handler = self.context_handlers.get(fields[1])
+			if handler is not None:
+				if self.context != TRACE_CONTEXT_SLICE:
+					del self.context_handlers[fields[1]]
+				handler[0](handler[1], int(fields[-1]))
+			return True
+		if text in self.header_contexts:
+			self.context = self.header_contexts[text]
+			self.context_handlers = self.handlers.get(self.context, {})
+			if self.context == TRACE_CONTEXT_SPS:
+				self.sps_count += 1
+			elif self.context == 'PPS':
+				self.pps_count += 1
+			return True
+		handler = self.context_handlers.pop(text, None)
+		if handler is not None:
+			handler[0](handler[1], None)
+			return True
+		return False
+
+	def read_video_header_field(self, name, value):
+		setattr(self.video_header_info, name, value)
+
+	def read_video_header_flag(self, name, value):
+		setattr(self.video_header_info, name, value == 1)
+
+	def read_vui_parameters_present_flag(self, name, value):
+		self.video_header_info.vui_parameters_present = value == 1
+		if self.video_header_info.vui_parameters_present:
+			self.context = TRACE_CONTEXT_VUI
+			self.context_handlers = self.handlers.get(TRACE_CONTEXT_VUI, {})
+
+	def read_sei_message(self, payload_type, value):
+		self.sei_info.payload_types.add(payload_type)
+
+	def read_sei_field(self, name, value):
+		setattr(self.sei_info, name, value)
+
+	def read_preferred_transfer_characteristics(self, name, value):
+		self.sei_info.preferred_transfer_characteristics = value
+		self.sei_info.payload_types.add(SEI_ALTERNATIVE_TRANSFER_CHARACTERISTICS)
+
+	def read_mastering_display_colour_volume(self, index, value):
+		# Primaries x and y of 3 colours, white point x and y, max and min luminance, as read natively
+		self.mastering_display_colour_volume[index] = value
+		if None not in self.mastering_display_colour_volume:
+			self.sei_info.mastering_display_colour_volume = tuple(self.mastering_display_colour_volume)
+			self.sei_info.payload_types.add(SEI_MASTERING_DISPLAY_COLOUR_VOLUME)
+
+	def read_content_light_level(self, index, value):
+		self.content_light_level[index] = value
+		if None not in self.content_light_level:
+			self.sei_info.content_light_level = tuple(self.content_light_level)
+			self.sei_info.payload_types.add(SEI_CONTENT_LIGHT_LEVEL_INFO)
+
+	def read_nal_unit_type(self, name, value):
+		self.nal_unit_type = value
+
+	def read_slice_type(self, name, value):
+		self.slice_types.append([self.nal_unit_type, value])
+
+
+class AvcTraceHeadersParser(TraceHeadersParser):
+	# ffmpeg cbs_h264 syntax element names
+	header_contexts = {'Sequence Parameter Set': TRACE_CONTEXT_SPS, 'Picture Parameter Set': 'PPS',
+					   'Supplemental Enhancement Information': TRACE_CONTEXT_SEI, 'Slice Header': TRACE_CONTEXT_SLICE,
+					   'Access Unit Delimiter': None}
+	field_handlers = {
+		TRACE_CONTEXT_SPS: {
+			'profile_idc': ('read_video_header_field', 'profile_idc'),
+			'level_idc': ('read_video_header_field', 'level_idc'),
+			'vui_parameters_present_flag': ('read_vui_parameters_present_flag', None)},
+		TRACE_CONTEXT_VUI: {
+			'aspect_ratio_info_present_flag': ('read_video_header_flag', 'aspect_ratio_info_present'),
+			'aspect_ratio_idc': ('read_video_header_field', 'aspect_ratio_idc'),
+			'sar_width': ('read_video_header_field', 'sar_width'),
+			'sar_height': ('read_video_header_field', 'sar_height'),
+			'colour_description_present_flag': ('read_video_header_flag', 'colour_description_present'),
+			'colour_primaries': ('read_video_header_field', 'colour_primaries'),
+			'transfer_characteristics': ('read_video_header_field', 'transfer_characteristics'),
+			'matrix_coefficients': ('read_video_header_field', 'matrix_coefficients'),
+			'timing_info_present_flag': ('read_video_header_flag', 'timing_info_present'),
+			'num_units_in_tick': ('read_video_header_field', 'num_units_in_tick'),
+			'time_scale': ('read_video_header_field', 'time_scale')},
+		TRACE_CONTEXT_SEI: {
+			'Picture Timing': ('read_sei_message', SEI_PIC_TIMING),
+			'pic_struct': ('read_sei_field', 'pic_struct'),
+			'preferred_transfer_characteristics': ('read_preferred_transfer_characteristics', None)},
+		TRACE_CONTEXT_SLICE: {
+			'nal_unit_type': ('read_nal_unit_type', None),
+			'slice_type': ('read_slice_type', None)}}
+	ticks_per_frame = 2
+
+
+class HevcTraceHeadersParser(TraceHeadersParser):
+	# ffmpeg cbs_h265 syntax element names
+	header_contexts = {'Sequence Parameter Set': TRACE_CONTEXT_SPS, 'Picture Parameter Set': 'PPS',
+					   'Prefix Supplemental Enhancement Information': TRACE_CONTEXT_SEI,
+					   'Suffix Supplemental Enhancement Information': TRACE_CONTEXT_SEI,
+					   'Slice Segment Header': TRACE_CONTEXT_SLICE,
+					   'Video Parameter Set': None, 'Access Unit Delimiter': None}
+	field_handlers = {
+		TRACE_CONTEXT_SPS: {
+			'general_tier_flag': ('read_video_header_field', 'tier_flag'),
+			'general_profile_idc': ('read_video_header_field', 'profile_idc'),
+			'general_level_idc': ('read_video_header_field', 'level_idc'),
+			'vui_parameters_present_flag': ('read_vui_parameters_present_flag', None)},
+		TRACE_CONTEXT_VUI: {
+			'aspect_ratio_info_present_flag': ('read_video_header_flag', 'aspect_ratio_info_present'),
+			'aspect_ratio_idc': ('read_video_header_field', 'aspect_ratio_idc'),
+			'sar_width': ('read_video_header_field', 'sar_width'),
+			'sar_height': ('read_video_header_field', 'sar_height'),
+			'colour_description_present_flag': ('read_video_header_flag', 'colour_description_present'),
+			'colour_primaries': ('read_video_header_field', 'colour_primaries'),
+			'transfer_characteristics': ('read_video_header_field', 'transfer_characteristics'),
+			'matrix_coefficients': ('read_video_header_field', 'matrix_coefficients'),
+			'vui_timing_info_present_flag': ('read_video_header_flag', 'timing_info_present'),
+			'vui_num_units_in_tick': ('read_video_header_field', 'num_units_in_tick'),
+			'vui_time_scale': ('read_video_header_field', 'time_scale')},
+		TRACE_CONTEXT_SEI: {
+			'Picture Timing': ('read_sei_message', SEI_PIC_TIMING),
+			'pic_struct': ('read_sei_field', 'pic_struct'),
+			'preferred_transfer_characteristics': ('read_preferred_transfer_characteristics', None),
+			'max_content_light_level': ('read_content_light_level', 0),
+			'max_pic_average_light_level': ('read_content_light_level', 1),
+			'display_primaries_x[0]': ('read_mastering_display_colour_volume', 0),
+			'display_primaries_y[0]': ('read_mastering_display_colour_volume', 1),
+			'display_primaries_x[1]': ('read_mastering_display_colour_volume', 2),
+			'display_primaries_y[1]': ('read_mastering_display_colour_volume', 3),
+			'display_primaries_x[2]': ('read_mastering_display_colour_volume', 4),
+			'display_primaries_y[2]': ('read_mastering_display_colour_volume', 5),
+			'white_point_x': ('read_mastering_display_colour_volume', 6),
+			'white_point_y': ('read_mastering_display_colour_volume', 7),
+			'max_display_mastering_luminance': ('read_mastering_display_colour_volume', 8),
+			'min_display_mastering_luminance': ('read_mastering_display_colour_volume', 9)},
+		TRACE_CONTEXT_SLICE: {
+			'nal_unit_type': ('read_nal_unit_type', None),
+			'slice_type': ('read_slice_type', None)}}
+
+
+# Parsers of the ffmpeg trace_headers log per ffprobe codec_name, used when the headers are not read natively
+trace_headers_parsers = {'h264': AvcTraceHeadersParser, 'hevc': HevcTraceHeadersParser}
+
+
+def save_debug_logs(test_content, frame_rate_family, debug_folder, trace_headers_filepath, seg_files):
+	# Zip
+	debugz_file = str(Path('tcval_logs_' + time_of_analysis + '.zip'))
+	if not os.path.isfile(debugz_file):
+		debugz = zipfile.ZipFile(debugz_file, 'w', zipfile.ZIP_DEFLATED)
+	else:
+		debugz = zipfile.ZipFile(debugz_file, 'a', zipfile.ZIP_DEFLATED)
 	
-	# Remove log files created by ffmpeg and MP4Box
 	try:
-		os.remove(str(Path(str(tc_matrix.stem)+'_trace_headers_init_'+time_of_analysis+'.txt')))
+		tc_file_path_parts = Path(test_content.test_file_path).parts
+		path2filename = str(Path("_".join(tc_file_path_parts[len(tc_file_path_parts)-4:]) + '_trace_headers_init_' + time_of_analysis + '.txt'))
+		debug_filename = str(Path(debug_folder+sep+path2filename))
+		shutil.copy2(trace_headers_filepath, debug_filename)
+		debugz.write(debug_filename, path2filename)
 	except OSError as e:
-		if e.errno != errno.ENOENT:		# No such file or directory
+		if e.errno != errno.ENOENT:  # No such file or directory
 			raise
 	try:
-		os.remove(str(Path(test_content.test_file_path+sep+'1'+sep+TS_INIT_SEGMENT_NAME.split('.')[0]+TS_METADATA_POSTFIX)))
+		tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
+		path2filename = str(Path("_".join(tc_file_path_parts[len(tc_file_path_parts)-5:]) + '_' + TS_INIT_SEGMENT_NAME.split('.')[0] + TS_METADATA_POSTFIX))
+		debug_filename = str(Path(debug_folder + sep + path2filename))
+		shutil.copy2(box_dump_filepath(test_content, frame_rate_family, TS_INIT_SEGMENT_NAME), debug_filename)
+		debugz.write(debug_filename, path2filename)
 	except OSError as e:
-		if e.errno != errno.ENOENT:		# No such file or directory
+		if e.errno != errno.ENOENT:  # No such file or directory
 			raise
 	
 	for m4s in seg_files:
 		if m4s.endswith('.m4s'):
 			try:
-				os.remove(str(Path(test_content.test_file_path+sep+'1'+sep+m4s.split('.')[0]+TS_METADATA_POSTFIX)))
+				tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
+				path2filename = str(Path(
+					"_".join(tc_file_path_parts[len(tc_file_path_parts)-5:]) + '_' + m4s.split('.')[0] + TS_METADATA_POSTFIX))
+				debug_filename = str(Path(debug_folder + sep + path2filename))
+				shutil.copy2(box_dump_filepath(test_content, frame_rate_family, m4s), debug_filename)
+				debugz.write(debug_filename, path2filename)
 			except OSError as e:
-				if e.errno != errno.ENOENT:		# No such file or directory
+				if e.errno != errno.ENOENT:  # No such file or directory
 					raise
+	debugz.close()
 	
-	print()
+	# Remove detailed logs now that the zip has been created
+	try:
+		tc_file_path_parts = Path(test_content.test_file_path).parts
+		path2filename = str(Path("_".join(tc_file_path_parts[len(tc_file_path_parts) - 4:]) + '_trace_headers_init_' + time_of_analysis + '.txt'))
+		os.remove(str(Path(debug_folder + sep + path2filename)))
+	except OSError as e:
+		if e.errno != errno.ENOENT:  # No such file or directory
+			raise
+	try:
+		tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
+		path2filename = str(Path(
+			"_".join(tc_file_path_parts[len(tc_file_path_parts) - 5:]) + '_' + TS_INIT_SEGMENT_NAME.split('.')[
+				0] + TS_METADATA_POSTFIX))
+		os.remove(str(Path(debug_folder + sep + path2filename)))
+	except OSError as e:
+		if e.errno != errno.ENOENT:  # No such file or directory
+			raise
+	for m4s in seg_files:
+		if m4s.endswith('.m4s'):
+			try:
+				tc_file_path_parts = Path(test_content.test_file_path + sep + '1').parts
+				path2filename = str(Path(
+					"_".join(tc_file_path_parts[len(tc_file_path_parts) - 5:]) + '_' + m4s.split('.')[
+						0] + TS_METADATA_POSTFIX))
+				os.remove(str(Path(debug_folder + sep + path2filename)))
+			except OSError as e:
+				if e.errno != errno.ENOENT:  # No such file or directory
+					raise
 
 
 if __name__ == "__main__":
-	# Check FFMPEG, FFPROBE and GPAC(MP4Box) are installed
-	if shutil.which('ffmpeg') is None:
-		sys.exit("FFMPEG was not found, ensure FFMPEG is added to the system PATH or is in the same folder as this script.")
-	if shutil.which('ffprobe') is None:
-		sys.exit("FFMPEG was not found, ensure FFPROBE is added to the system PATH or is in the same folder as this script.")
-	if shutil.which('MP4Box') is None:
-		sys.exit("MP4Box was not found, ensure MP4Box is added to the system PATH or is in the same folder as this script.")
-	
 	# Attempt to discover IP address (default)
 	DETECTED_IP = socket.gethostbyname(socket.gethostname())
 	
@@ -2709,7 +4950,7 @@ if __name__ == "__main__":
 	
 	parser.add_argument(
 		'-v', '--vectors',
-		required=True,
+		required=False,
 		help="Folder containing subfolders with sets of test vectors for a specific codec e.g. \"cfhd_sets\", "
 			 "that contain subfolders for each frame rate family e.g. \"15_30_60\", "
 			 "that contain subfolders t1 .. tN with the test vectors to validate. "
@@ -2717,7 +4958,7 @@ if __name__ == "__main__":
 	
 	parser.add_argument(
 		'--mezzanineversion',
-		required=True,
+		required=False,
 		help="Mezzanine release version expected to be used as the test vector source. Example: 4")
 	
 	parser.add_argument(
@@ -2731,14 +4972,148 @@ if __name__ == "__main__":
 		required=False,
 		help="ID of Docker container running DASH conformance tool image. Default: disabled")
 	
+	parser.add_argument(
+		'--conformancejobs',
+		required=False,
+		type=int,
+		default=CONFORMANCE_JOBS,
+		help="Number of DASH conformance tool runs executed concurrently in the Docker container. Default: "
+			 + str(CONFORMANCE_JOBS))
+	
 	parser.add_argument(
 		'--debug',
 		required=False,
 		nargs='*',
 		help="Preserves logs from ffmpeg and GPAC for analysis as tcval_logs_<date_time>.zip")
 	
+	parser.add_argument(
+		'-j', '--jobs',
+		required=False,
+		type=int,
+		default=1,
+		help="Number of test streams to analyse in parallel, each in its own process. Default: 1 (serial)")
+	
+	parser.add_argument(
+		'--segmentworkers',
+		required=False,
+		type=int,
+		default=SEGMENT_DUMP_WORKERS,
+		help="Number of MP4Box segment dumps run concurrently for each test stream with --boxparser mp4box. Default: "
+			 + str(SEGMENT_DUMP_WORKERS) + ", 1 dumps one segment at a time")
+	
+	parser.add_argument(
+		'--mp4boxbatch',
+		required=False,
+		action='store_true',
+		help="With --boxparser mp4box, dump the init segment and all segments of each test stream in a single MP4Box "
+			 "run instead of one run per segment")
+	
+	parser.add_argument(
+		'--boxparser',
+		required=False,
+		choices=[BOX_PARSER_NATIVE, BOX_PARSER_MP4BOX],
+		default=BOX_PARSER,
+		help="Read the boxes of the init and media segments natively, or from ffprobe output and XML dumps "
+			 "written by MP4Box -diso. Default: " + BOX_PARSER)
+	
+	parser.add_argument(
+		'--headerparser',
+		required=False,
+		choices=[HEADER_PARSER_NATIVE, HEADER_PARSER_FFMPEG],
+		default=HEADER_PARSER,
+		help="Decode the parameter sets, slice types and SEI messages of AVC and HEVC streams natively, "
+			 "or read them from the ffmpeg trace_headers log. Default: " + HEADER_PARSER)
+	
+	parser.add_argument(
+		'--timingparser',
+		required=False,
+		choices=[TIMING_PARSER_FFMPEG, TIMING_PARSER_FFPROBE],
+		default=TIMING_PARSER,
+		help="Read the frame rate, bitrate and duration from the ffmpeg log, or compute them from the packet timestamps "
+			 "and sizes listed by ffprobe -show_packets. Default: " + TIMING_PARSER)
+	
+	parser.add_argument(
+		'--stageworkers',
+		required=False,
+		help="Number of workers of each analysis pipeline stage used with --jobs, as a comma separated list of "
+			 "<stage>=<workers> with stages discovery, tools, analysis, conformance and report. "
+			 "Default: discovery=1,tools=<jobs>,analysis=<jobs>,conformance=<conformancejobs>,report=1")
+	
+	parser.add_argument(
+		'--pipelinestats',
+		required=False,
+		action='store_true',
+		help="Print the queue depth and utilisation of each analysis pipeline stage used with --jobs")
+	
+	parser.add_argument(
+		'--parallelfamilies',
+		required=False,
+		action='store_true',
+		help="Analyse the 15_30_60, 14.985_29.97_59.94 and 12.5_25_50 frame rate families concurrently, "
+			 "sharing the worker processes set by --jobs. Default: families are analysed one after the other")
+	
+	parser.add_argument(
+		'--shard',
+		required=False,
+		help="Only analyse share i of n of the test streams, as i/n e.g. 1/3, and write partial results files "
+			 "to be combined with --merge. All shards must use the same matrix and vectors folder. Default: disabled")
+	
+	parser.add_argument(
+		'--merge',
+		required=False,
+		nargs='+',
+		help="Combine the partial results files written by all shards into <matrix>_<family>_test_results_<time>.json "
+			 "files, without running any analysis")
+	
+	parser.add_argument(
+		'--queue',
+		required=False,
+		help="SQLite work queue file on storage shared by several machines. The coordinator enqueues all test streams "
+			 "and saves the results, workers analyse the test streams. Default: disabled")
+	
+	parser.add_argument(
+		'--role',
+		required=False,
+		choices=[QUEUE_ROLE_COORDINATOR, QUEUE_ROLE_WORKER],
+		default=QUEUE_ROLE_COORDINATOR,
+		help="Role of this run with --queue. Default: " + QUEUE_ROLE_COORDINATOR)
+	
+	parser.add_argument(
+		'--lease',
+		required=False,
+		type=int,
+		default=QUEUE_LEASE,
+		help="Seconds after which a test stream claimed by a worker that stopped responding is analysed again. "
+			 "Default: " + str(QUEUE_LEASE))
+	
 	args = parser.parse_args()
 	
+	# Combine partial results of shards, nothing else to do
+	if args.merge is not None:
+		merge_shard_results(args.merge)
+		sys.exit()
+	if args.vectors is None:
+		parser.error("the following arguments are required: -v/--vectors")
+	if args.queue is not None:
+		QUEUE_PATH = str(Path(args.queue).resolve())
+		QUEUE_ROLE = args.role
+		if args.lease < 1:
+			sys.exit("Lease of \"" + str(args.lease) + "\" seconds must be 1 or higher.")
+		QUEUE_LEASE = args.lease
+	if args.mezzanineversion is None and QUEUE_ROLE != QUEUE_ROLE_WORKER:
+		parser.error("the following arguments are required: --mezzanineversion")
+	
+	# Check FFMPEG is installed, FFPROBE when boxes are not read natively or with --timingparser ffprobe, and
+	# GPAC(MP4Box) when boxes are not read natively
+	if shutil.which('ffmpeg') is None:
+		sys.exit("FFMPEG was not found, ensure FFMPEG is added to the system PATH or is in the same folder as this script.")
+	if args.boxparser == BOX_PARSER_MP4BOX or args.timingparser == TIMING_PARSER_FFPROBE:
+		if shutil.which('ffprobe') is None:
+			sys.exit("FFMPEG was not found, ensure FFPROBE is added to the system PATH or is in the same folder as this script.")
+	if args.boxparser == BOX_PARSER_MP4BOX:
+		if shutil.which('MP4Box') is None:
+			sys.exit("MP4Box was not found, ensure MP4Box is added to the system PATH or is in the same folder as this script.")
+	
 	if args.codec is not None:
 		if args.codec.lower() not in set(cmaf_brand_codecs.values()):
 			sys.exit("Test vector codec \"" + str(args.codec) + "\" does not have a known WAVE media profile as of "+WAVE_CONTENT_SPEC+".")
@@ -2748,7 +5123,7 @@ if __name__ == "__main__":
 	tc_matrix = ''
 	if args.matrix is not None:
 		tc_matrix = Path(args.matrix).resolve()
-	else:
+	elif QUEUE_ROLE != QUEUE_ROLE_WORKER:
 		http_request = urllib.request.Request(url=MATRIX_AVC, unverifiable=True)
 		req_file = urllib.request.urlopen(http_request, timeout=10)
 		tc_matrix = Path(MATRIX_AVC_FILENAME)
@@ -2766,8 +5141,8 @@ if __name__ == "__main__":
 		else:
 			print("Ignoring Docker container ID because it's not a valid hex string: "+args.docker)
 	
-	# Check CSV matrix file exists
-	if not os.path.isfile(tc_matrix):
+	# Check CSV matrix file exists, workers get the test streams from the work queue
+	if QUEUE_ROLE != QUEUE_ROLE_WORKER and not os.path.isfile(tc_matrix):
 		sys.exit("Test content matrix file \""+str(tc_matrix)+"\" does not exist.")
 	
 	# Check vectors folder exists
@@ -2777,12 +5152,52 @@ if __name__ == "__main__":
 	# Check mezzanine version can be parsed as a positive number
 	mezzanine_version = 1
 	try:
-		mezzanine_version = float(args.mezzanineversion)
+		if QUEUE_ROLE != QUEUE_ROLE_WORKER:
+			mezzanine_version = float(args.mezzanineversion)
 		if mezzanine_version < 1:
 			raise ValueError('Expected a positive mezzanine release version of 1 or higher.')
 	except ValueError:
 		sys.exit("Mezzanine version \"" + str(args.mezzanineversion) + "\" is not a positive number.")
 	
+	# Check number of parallel jobs is valid
+	if args.jobs < 1:
+		sys.exit("Number of parallel jobs \"" + str(args.jobs) + "\" must be 1 or higher.")
+	JOBS = args.jobs
+	if args.segmentworkers < 1:
+		sys.exit("Number of segment workers \"" + str(args.segmentworkers) + "\" must be 1 or higher.")
+	SEGMENT_DUMP_WORKERS = args.segmentworkers
+	MP4BOX_BATCH = args.mp4boxbatch
+	BOX_PARSER = args.boxparser
+	HEADER_PARSER = args.headerparser
+	TIMING_PARSER = args.timingparser
+	if args.conformancejobs < 1:
+		sys.exit("Number of conformance jobs \"" + str(args.conformancejobs) + "\" must be 1 or higher.")
+	CONFORMANCE_JOBS = args.conformancejobs
+	if args.stageworkers is not None:
+		for stage_worker in args.stageworkers.split(','):
+			stage_name, _, stage_worker_count = stage_worker.partition('=')
+			if stage_name.strip() not in [PIPELINE_STAGE_DISCOVERY, PIPELINE_STAGE_TOOLS, PIPELINE_STAGE_ANALYSIS,
+										  PIPELINE_STAGE_CONFORMANCE, PIPELINE_STAGE_REPORT]:
+				sys.exit("Unknown pipeline stage \"" + stage_name + "\".")
+			if not stage_worker_count.strip().isdigit() or int(stage_worker_count) < 1:
+				sys.exit("Number of workers \"" + stage_worker_count + "\" for pipeline stage \"" + stage_name
+						 + "\" must be 1 or higher.")
+			PIPELINE_STAGE_WORKERS[stage_name.strip()] = int(stage_worker_count)
+	PIPELINE_STATS = args.pipelinestats
+	if args.shard is not None:
+		try:
+			shard_index, shard_count = map(int, args.shard.split('/'))
+			if not 1 <= shard_index <= shard_count:
+				raise ValueError('Expected a shard index between 1 and the number of shards.')
+		except ValueError:
+			sys.exit("Shard \"" + str(args.shard) + "\" is not of the form i/n with 1 <= i <= n.")
+		SHARD = (shard_index-1, shard_count)
+	if args.parallelfamilies:
+		if JOBS > 1:
+			PARALLEL_FAMILIES = True
+		else:
+			print("Ignoring --parallelfamilies because it requires --jobs to be higher than 1.")
+	
 	# Check debug folder can be created
 	debug_folder = ''
 	if args.debug is not None:
@@ -2836,6 +5251,18 @@ if __name__ == "__main__":
 			time.sleep(5)
 		else:
 			print("HTTP server already running...")
+	# Workers analyse test streams from the work queue until it is empty
+	if QUEUE_PATH is not None and QUEUE_ROLE == QUEUE_ROLE_WORKER:
+		run_queue_worker(QUEUE_PATH, tc_vectors_folder, debug_folder)
+		
+		# Stop serving test vectors folder
+		if CONFORMANCE_TOOL_DOCKER_CONTAINER_ID != '':
+			if bg_httpd_process:
+				bg_httpd_process.terminate()
+			if bg_httpd_process_err_log:
+				bg_httpd_process_err_log.close()
+		sys.exit()
+	
 	# Read CSV matrix data
 	tc_matrix_data = []
 	with open(tc_matrix, mode='r') as csv_file:
@@ -3187,21 +5614,65 @@ if __name__ == "__main__":
 				print("No switching set tracks detected.")
 			break
 	
-	# Analyse each stream ID and switching set
-	tc_copy = copy.deepcopy(test_content)
-	check_and_analyse_v(tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_60, debug_folder)
-	#ss_tc_copy = copy.deepcopy(ss_test_content)
-	#check_and_analyse_ss(ss_tc_copy, tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_60)
-	
-	tc_copy = copy.deepcopy(test_content)
-	check_and_analyse_v(tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_59_94, debug_folder)
-	# ss_tc_copy = copy.deepcopy(ss_test_content)
-	# check_and_analyse_ss(ss_tc_copy, tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_59_94)
-	
-	tc_copy = copy.deepcopy(test_content)
-	check_and_analyse_v(tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_50, debug_folder)
-	# ss_tc_copy = copy.deepcopy(ss_test_content)
-	# check_and_analyse_ss(ss_tc_copy, tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_50)
+	# Only analyse the share of test streams assigned to this shard
+	if SHARD is not None:
+		print("Assigning test streams to " + str(SHARD[1]) + " shards...")
+		SHARD_STREAMS = set(
+			stream for stream, shard_index in assign_shards(test_content, tc_vectors_folder, SHARD[1]).items()
+			if shard_index == SHARD[0])
+		print("Shard " + str(SHARD[0]+1) + "/" + str(SHARD[1]) + ": " + str(len(SHARD_STREAMS)) + " test streams to analyse")
+	
+	# Analyse streams in a pipeline of parallel stages when requested
+	analysis_pipeline = None
+	if JOBS > 1 and QUEUE_PATH is None:
+		stage_workers = {
+			PIPELINE_STAGE_DISCOVERY: 1,
+			PIPELINE_STAGE_TOOLS: JOBS,
+			PIPELINE_STAGE_ANALYSIS: JOBS,
+			PIPELINE_STAGE_CONFORMANCE: CONFORMANCE_JOBS,
+			PIPELINE_STAGE_REPORT: 1
+		}
+		stage_workers.update(PIPELINE_STAGE_WORKERS)
+		analysis_pipeline = AnalysisPipeline(stage_workers)
+	elif CONFORMANCE_TOOL_DOCKER_CONTAINER_ID != '':
+		# Run the DASH conformance tool alongside the local analysis
+		CONFORMANCE_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=CONFORMANCE_JOBS)
+	
+	# Analyse each stream ID and switching set. The pipeline is shut down and sys.stdout restored on errors too.
+	with analysis_pipeline if analysis_pipeline is not None else contextlib.nullcontext():
+		if QUEUE_PATH is not None:
+			# Workers on any machine mounting the vectors folder analyse the test streams
+			run_queue_coordinator(QUEUE_PATH, test_content, tc_vectors_folder)
+		elif PARALLEL_FAMILIES:
+			# Schedule the streams of all frame rate families at once on the shared worker processes,
+			# then collect the results of each family in the same order as a sequential run
+			analysis_batches = []
+			for frame_rate_family in TS_LOCATION_FRAME_RATES:
+				tc_copy = copy.deepcopy(test_content)
+				analysis_batches.append(
+					submit_analysis_v(tc_copy, tc_vectors_folder, frame_rate_family, debug_folder, analysis_pipeline))
+			for analysis_batch in analysis_batches:
+				complete_analysis_v(analysis_batch)
+		else:
+			tc_copy = copy.deepcopy(test_content)
+			check_and_analyse_v(tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_60, debug_folder, analysis_pipeline)
+			#ss_tc_copy = copy.deepcopy(ss_test_content)
+			#check_and_analyse_ss(ss_tc_copy, tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_60)
+		
+			tc_copy = copy.deepcopy(test_content)
+			check_and_analyse_v(tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_59_94, debug_folder, analysis_pipeline)
+			# ss_tc_copy = copy.deepcopy(ss_test_content)
+			# check_and_analyse_ss(ss_tc_copy, tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_59_94)
+		
+			tc_copy = copy.deepcopy(test_content)
+			check_and_analyse_v(tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_50, debug_folder, analysis_pipeline)
+			# ss_tc_copy = copy.deepcopy(ss_test_content)
+			# check_and_analyse_ss(ss_tc_copy, tc_copy, tc_vectors_folder, TS_LOCATION_FRAME_RATES_50)
+	
+	if analysis_pipeline is not None and PIPELINE_STATS:
+		analysis_pipeline.print_statistics()
+	if CONFORMANCE_EXECUTOR is not None:
+		CONFORMANCE_EXECUTOR.shutdown()
 	
 	# Stop serving test vectors folder
 	if CONFORMANCE_TOOL_DOCKER_CONTAINER_ID != '':
@@ -0,0 +1,74 @@
+import io
+import sys
+import types
+import unittest
+
+from fractions import Fraction
+from pathlib import Path
+
+# lxml, isodate and psutil are not used by the code paths tested, they are replaced by empty modules when they are
+# not installed
+for module_name in ['isodate', 'psutil', 'lxml']:
+	try:
+		__import__(module_name)
+	except ImportError:
+		sys.modules[module_name] = types.ModuleType(module_name)
+if not hasattr(sys.modules['lxml'], 'etree'):
+	etree = types.ModuleType('lxml.etree')
+	etree.XPath = lambda *args, **kwargs: None
+	sys.modules['lxml'].etree = etree
+	sys.modules['lxml.etree'] = etree
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import tcval
+
+
+def ffprobe_packets(frame_count, frame_duration, size, gop_size):
+	# ffprobe -show_entries packet=pts,dts,duration,size,flags:stream=time_base -print_format compact
+	lines = []
+	for frame in range(frame_count):
+		flags = 'K_' if frame % gop_size == 0 else '__'
+		lines.append('packet|pts=' + str(frame * frame_duration) + '|dts=' + str((frame - 1) * frame_duration)
+					 + '|duration=' + str(frame_duration) + '|size=' + str(size) + '|flags=' + flags)
+	lines.append('stream|time_base=1/30000')
+	return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class CannedFfprobeProcess:
+	# Stands in for the ffprobe Popen, its stdout is the canned packet listing
+	def __init__(self, output, returncode=0):
+		self.stdout = io.BytesIO(output)
+		self.returncode = returncode
+		self.args = ['ffprobe']
+
+	def wait(self):
+		return self.returncode
+
+
+class StreamTimingTest(unittest.TestCase):
+	def test_read_stream_timing(self):
+		stream_timing_info = tcval.read_stream_timing(CannedFfprobeProcess(ffprobe_packets(60, 1001, 12500, 30)))
+		self.assertEqual(stream_timing_info.time_base, Fraction(1, 30000))
+		self.assertEqual(stream_timing_info.frame_count, 60)
+		self.assertEqual(stream_timing_info.keyframes, [0, 30])
+		self.assertEqual(stream_timing_info.duration(), Fraction(60 * 1001, 30000))
+		self.assertEqual(stream_timing_info.frame_rate(), Fraction(30000, 1001))
+		self.assertEqual(stream_timing_info.average_bitrate(), 2997)
+
+	def test_check_stream_timing(self):
+		stream_timing_info = tcval.read_stream_timing(CannedFfprobeProcess(ffprobe_packets(60, 1001, 12500, 30)))
+		test_content = tcval.TestContent(frame_rate=0.5, bitrate=2997, duration=2.002)
+		file_frame_rate = tcval.check_stream_timing(test_content, tcval.TS_LOCATION_FRAME_RATES_59_94,
+													stream_timing_info)
+		self.assertEqual(file_frame_rate, 29.97)
+		self.assertEqual(test_content.frame_rate, [29.97, 29.97, tcval.TestResult.PASS])
+		self.assertEqual(test_content.bitrate, [2997, 2997, tcval.TestResult.PASS])
+		self.assertEqual(test_content.duration, [2.002, 2.002, tcval.TestResult.PASS])
+
+	def test_ffprobe_error(self):
+		with self.assertRaises(tcval.subprocess.CalledProcessError):
+			tcval.read_stream_timing(CannedFfprobeProcess(b'', 1))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,28 @@
+import json
+import sys
+import unittest
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import test_stream_timing  # Replaces lxml, isodate and psutil by empty modules when they are not installed
+import tcval
+
+
+class TestContentJsonTest(unittest.TestCase):
+	def test_enum_fields_round_trip(self):
+		# The work queue hands test streams over as TestContentFullEncoder JSON
+		tc = tcval.TestContent(test_stream_id='1', test_file_path='t1',
+							   cmaf_initialisation_constraints=tcval.CmafInitConstraints.SINGLE,
+							   chunks_per_fragment=tcval.CmafChunksPerFragment.MULTIPLE)
+		tc.chunks_per_fragment[1] = tcval.CmafChunksPerFragment.MULTIPLE
+		tc_json = tcval.test_content_from_json(json.loads(json.dumps(tc, cls=tcval.TestContentFullEncoder)))
+		self.assertIs(tc_json.chunks_per_fragment[0], tcval.CmafChunksPerFragment.MULTIPLE)
+		self.assertIs(tc_json.chunks_per_fragment[1], tcval.CmafChunksPerFragment.MULTIPLE)
+		self.assertIs(tc_json.cmaf_initialisation_constraints[0], tcval.CmafInitConstraints.SINGLE)
+		self.assertEqual(tc_json.cmaf_initialisation_constraints[1], '')
+		self.assertEqual(tc_json.cmaf_initialisation_constraints[2], tcval.TestResult.NOT_TESTABLE)
+
+
+if __name__ == '__main__':
+	unittest.main()